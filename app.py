@@ -15,6 +15,9 @@ from datetime import datetime, timedelta
 sys.path.append(str(Path(__file__).parent / "src"))
 
 from orchestrator import ExchangeJourneyOrchestrator
+from journey.analytics import get_analytics_store
+from journey.single_flight import hash_conteudo
+from metrics import get_metrics_registry
 
 # Configuração da página
 st.set_page_config(
@@ -59,6 +62,34 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Métricas de operação
+# CONCEITO - Cached Queries:
+# As consultas agregadas são cacheadas com TTL: o painel abre na hora mesmo
+# com um histórico grande, e os números se atualizam a cada OPS_CACHE_TTL_SECONDS.
+OPS_CACHE_TTL = int(os.getenv("OPS_CACHE_TTL_SECONDS", "60"))
+PERIODOS_OPERACAO = {"Últimas 24h": 1, "Últimos 7 dias": 7, "Últimos 30 dias": 30, "Tudo": None}
+
+
+def _inicio_periodo(dias):
+    return (datetime.now() - timedelta(days=dias)).date().isoformat() if dias else None
+
+
+@st.cache_data(ttl=OPS_CACHE_TTL, show_spinner=False)
+def _metricas_operacao(desde):
+    store = get_analytics_store()
+    return {
+        "decisoes": store.decisoes_por_dia(desde),
+        "latencia": store.latencia_por_etapa(desde),
+        "uso_llm": store.uso_llm(desde),
+        "funil": store.funil_por_etapa(desde)
+    }
+
+
+@st.cache_data(ttl=OPS_CACHE_TTL, show_spinner=False)
+def _histograma_latencia(etapa, desde, largura_ms):
+    return get_analytics_store().histograma_latencia(etapa, desde, largura_ms=largura_ms)
+
+
 # Header
 st.markdown('<p class="main-header">🤖 Jornada Agêntica - Sistema de Trocas</p>', unsafe_allow_html=True)
 st.markdown("**Sistema inteligente para automação de processos de troca de produtos**")
@@ -90,7 +121,7 @@ with st.sidebar:
         st.error("⚠️ Configure GROQ_API_KEY no .env")
 
 # Tabs principais
-tab1, tab2, tab3 = st.tabs(["📝 Nova Solicitação", "🎯 Cenários Pré-definidos", "📊 Sobre"])
+tab1, tab2, tab3 = st.tabs(["📝 Nova Solicitação", "🎯 Cenários Pré-definidos", "📊 Operação"])
 
 with tab1:
     st.subheader("Criar Nova Solicitação de Troca")
@@ -99,7 +130,7 @@ with tab1:
 
     with col1:
         st.markdown("#### 👤 Dados do Cliente")
-        cliente_cpf = st.text_input("CPF", "123.456.789-00", help="CPF do cliente")
+        cliente_cpf = st.text_input("CPF", "123.456.789-09", help="CPF do cliente")
         cliente_nome = st.text_input("Nome Completo", "João Silva Santos")
         cliente_email = st.text_input("Email", "joao.silva@email.com")
 
@@ -141,7 +172,6 @@ with tab1:
         try:
             # Monta protocolo
             protocolo = {
-                "protocolo": f"WEB-{datetime.now().strftime('%Y%m%d%H%M%S')}",
                 "data_abertura": datetime.now().isoformat(),
                 "tipo_solicitacao": "troca_produto",
                 "cliente": {
@@ -168,6 +198,9 @@ with tab1:
                 ],
                 "status": "aguardando_analise"
             }
+            # Número derivado do conteúdo: um duplo clique gera o mesmo protocolo
+            # e reaproveita a jornada em andamento em vez de executar outra
+            protocolo["protocolo"] = f"WEB-{datetime.now().strftime('%Y%m%d')}-{hash_conteudo(protocolo)[:10].upper()}"
 
             # Executa jornada
             with st.spinner("🤖 Agents processando a solicitação..."):
@@ -189,8 +222,25 @@ with tab1:
 
             if decisao_status == "aprovado":
                 st.markdown(f'<div class="status-box status-aprovado"><h3>✅ TROCA APROVADA</h3></div>', unsafe_allow_html=True)
+            elif decisao_status == "adiado":
+                st.markdown(f'<div class="status-box status-processando"><h3>⏸️ JORNADA ADIADA</h3></div>', unsafe_allow_html=True)
+                st.caption(f"Provedor de LLM indisponível. A solicitação foi enfileirada para reprocessamento em ~{resultado.get('reprocessar_apos_segundos', 0):.0f}s.")
+            elif decisao_status == "parcial":
+                st.markdown(f'<div class="status-box status-processando"><h3>⚖️ TROCA PARCIALMENTE APROVADA</h3></div>', unsafe_allow_html=True)
+                for item in resultado.get("itens", []):
+                    icone = "✅" if item["decisao"] == "aprovado" else "❌"
+                    st.caption(f"{icone} Item {item['item']} ({item['produto_original']}): {item['motivo'] or item['decisao']}")
+                for compensacao in resultado.get("compensacoes", []):
+                    if compensacao["tipo"] == "reserva" and compensacao["status"] == "compensado":
+                        st.caption(f"↩️ Reserva {compensacao['reserva_id']} liberada")
             else:
                 st.markdown(f'<div class="status-box status-reprovado"><h3>❌ TROCA REPROVADA</h3></div>', unsafe_allow_html=True)
+                # Rejeições da admissão e da triagem de prazo acontecem antes dos agents
+                if resultado.get("motivo_interrupcao"):
+                    st.caption(resultado["motivo_interrupcao"])
+                for compensacao in resultado.get("compensacoes", []):
+                    if compensacao["tipo"] == "reserva" and compensacao["status"] == "compensado":
+                        st.caption(f"↩️ Reserva {compensacao['reserva_id']} liberada")
 
             st.divider()
 
@@ -272,7 +322,7 @@ with tab2:
                 "data_abertura": "2025-10-01T10:30:00",
                 "tipo_solicitacao": "troca_produto",
                 "cliente": {
-                    "cpf": "123.456.789-00",
+                    "cpf": "123.456.789-09",
                     "nome": "João Silva Santos",
                     "email": "joao.silva@email.com"
                 },
@@ -300,7 +350,7 @@ with tab2:
                 "data_abertura": "2025-10-01T11:00:00",
                 "tipo_solicitacao": "troca_produto",
                 "cliente": {
-                    "cpf": "123.456.789-00",
+                    "cpf": "123.456.789-09",
                     "nome": "João Silva Santos",
                     "email": "joao.silva@email.com"
                 },
@@ -324,7 +374,7 @@ with tab2:
                 "data_abertura": "2025-10-01T12:00:00",
                 "tipo_solicitacao": "troca_produto",
                 "cliente": {
-                    "cpf": "123.456.789-00",
+                    "cpf": "123.456.789-09",
                     "nome": "João Silva Santos",
                     "email": "joao.silva@email.com"
                 },
@@ -400,8 +450,25 @@ with tab2:
 
             if decisao_status == "aprovado":
                 st.markdown(f'<div class="status-box status-aprovado"><h3>✅ TROCA APROVADA</h3></div>', unsafe_allow_html=True)
+            elif decisao_status == "adiado":
+                st.markdown(f'<div class="status-box status-processando"><h3>⏸️ JORNADA ADIADA</h3></div>', unsafe_allow_html=True)
+                st.caption(f"Provedor de LLM indisponível. A solicitação foi enfileirada para reprocessamento em ~{resultado.get('reprocessar_apos_segundos', 0):.0f}s.")
+            elif decisao_status == "parcial":
+                st.markdown(f'<div class="status-box status-processando"><h3>⚖️ TROCA PARCIALMENTE APROVADA</h3></div>', unsafe_allow_html=True)
+                for item in resultado.get("itens", []):
+                    icone = "✅" if item["decisao"] == "aprovado" else "❌"
+                    st.caption(f"{icone} Item {item['item']} ({item['produto_original']}): {item['motivo'] or item['decisao']}")
+                for compensacao in resultado.get("compensacoes", []):
+                    if compensacao["tipo"] == "reserva" and compensacao["status"] == "compensado":
+                        st.caption(f"↩️ Reserva {compensacao['reserva_id']} liberada")
             else:
                 st.markdown(f'<div class="status-box status-reprovado"><h3>❌ TROCA REPROVADA</h3></div>', unsafe_allow_html=True)
+                # Rejeições da admissão e da triagem de prazo acontecem antes dos agents
+                if resultado.get("motivo_interrupcao"):
+                    st.caption(resultado["motivo_interrupcao"])
+                for compensacao in resultado.get("compensacoes", []):
+                    if compensacao["tipo"] == "reserva" and compensacao["status"] == "compensado":
+                        st.caption(f"↩️ Reserva {compensacao['reserva_id']} liberada")
 
             with st.expander("Ver Detalhes Completos"):
                 st.json(resultado)
@@ -415,62 +482,126 @@ with tab2:
             del st.session_state.cenario
 
 with tab3:
-    st.subheader("📊 Sobre o Sistema")
+    st.subheader("📊 Operação")
 
-    col1, col2, col3 = st.columns(3)
+    if not os.getenv("JOURNEY_ANALYTICS_DB"):
+        st.info("Defina `JOURNEY_ANALYTICS_DB` no `.env` para registrar as jornadas e ver as métricas de operação.")
+    else:
+        periodo = st.selectbox("Período", list(PERIODOS_OPERACAO), index=1)
+        desde = _inicio_periodo(PERIODOS_OPERACAO[periodo])
+        dados = _metricas_operacao(desde)
+
+        # Visão geral
+        total = sum(d["total"] for d in dados["decisoes"])
+        aprovadas = sum(d["total"] for d in dados["decisoes"] if d["decisao"] == "aprovado")
+        uso_llm = dados["uso_llm"]
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Jornadas", total)
+        col2.metric("Taxa de Aprovação", f"{aprovadas / total:.0%}" if total else "—")
+        col3.metric("Chamadas LLM / Jornada", f"{uso_llm['chamadas_media']:.1f}" if uso_llm["chamadas_media"] else "—")
+        col4.metric("Tokens / Jornada", f"{uso_llm['tokens_media']:,.0f}" if uso_llm["tokens_media"] else "—",
+                    help=f"Máximo: {uso_llm['tokens_max'] or 0:,} | Total: {uso_llm['tokens_total'] or 0:,}")
+
+        if not total:
+            st.caption("Nenhuma jornada registrada no período.")
+        else:
+            st.divider()
 
-    with col1:
-        st.metric("Agents", "6", help="Agents especializados")
-        st.metric("Tools", "10", help="LangChain Tools")
+            # Latência por etapa
+            st.markdown("#### ⏱️ Latência por Etapa")
+            latencias = dados["latencia"]
+            st.dataframe(
+                [{"Etapa": l["etapa"], "Execuções": l["total"],
+                  "p50 (s)": round(l["p50"] / 1000, 2), "p95 (s)": round(l["p95"] / 1000, 2),
+                  "p99 (s)": round(l["p99"] / 1000, 2)} for l in latencias],
+                use_container_width=True,
+                hide_index=True
+            )
+
+            etapa = st.selectbox("Histograma da etapa", [l["etapa"] for l in latencias])
+            largura_ms = st.select_slider("Largura da faixa (ms)", options=[250, 500, 1000, 2000, 5000], value=1000)
+            histograma = _histograma_latencia(etapa, desde, largura_ms)
+            st.bar_chart({"Jornadas": {f"{h['faixa_ms'] / 1000:g}s": h["total"] for h in histograma}})
 
-    with col2:
-        st.metric("Conceitos", "17", help="Conceitos de AI Engineering")
-        st.metric("Tempo Médio", "15-25s", help="Por jornada completa")
+            st.divider()
 
-    with col3:
-        st.metric("Modelo", "llama-3.3-70b", help="Groq API")
-        st.metric("Pattern", "ReAct", help="Reasoning + Acting")
+            # Funil de rejeição
+            st.markdown("#### 🔻 Funil de Rejeição por Etapa")
+            funil = dados["funil"]
+            st.bar_chart(
+                {
+                    "Aprovadas": {f["etapa"]: f["entradas"] - f["reprovadas"] for f in funil},
+                    "Reprovadas": {f["etapa"]: f["reprovadas"] for f in funil}
+                },
+                color=["#28a745", "#dc3545"]
+            )
 
     st.divider()
 
-    st.markdown("""
-    ### 🎓 Conceitos Aplicados
+    # Caches do processo (lidos direto do registro, sem consulta ao banco)
+    st.markdown("#### 🗃️ Caches")
+    caches = get_metrics_registry().snapshot()
+    if caches:
+        st.dataframe(
+            [{"Cache": nome, "Hits": c["hits"], "Misses": c["misses"], "Hit Rate": f"{c['hit_rate']:.0%}"}
+             for nome, c in caches.items()],
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.caption("Nenhum cache registrou acessos neste processo.")
+
+    # Filtros de pertinência (ex: Bloom de CPFs na frente da base de clientes)
+    filtros = get_metrics_registry().filter_snapshot()
+    if filtros:
+        st.dataframe(
+            [{"Filtro": nome, "Rejeitados sem consulta": f["rejeitados"], "Confirmados": f["confirmados"],
+              "Falsos positivos": f["falsos_positivos"], "Taxa de FP": f"{f['taxa_falsos_positivos']:.2%}"}
+             for nome, f in filtros.items()],
+            use_container_width=True,
+            hide_index=True
+        )
 
-    Este sistema demonstra 17 conceitos de AI Engineering:
+    with st.expander("📚 Sobre o Sistema"):
+        st.markdown("""
+        ### 🎓 Conceitos Aplicados
 
-    - **ReAct Pattern**: Agents que raciocinam antes de agir
-    - **Custom Output Parser**: Parser robusto para JSON
-    - **Early Stopping**: Prevenção de loops infinitos
-    - **Specialized Agents**: Decomposição por responsabilidade
-    - **Orchestration**: Coordenação de múltiplos agents
-    - **RAG**: Retrieval Augmented Generation
-    - **Conditional Workflows**: Lógica condicional
-    - E mais 10 conceitos...
+        Este sistema demonstra 17 conceitos de AI Engineering:
 
-    📚 **Documentação completa**: Ver `CONCEITOS.md`
+        - **ReAct Pattern**: Agents que raciocinam antes de agir
+        - **Custom Output Parser**: Parser robusto para JSON
+        - **Early Stopping**: Prevenção de loops infinitos
+        - **Specialized Agents**: Decomposição por responsabilidade
+        - **Orchestration**: Coordenação de múltiplos agents
+        - **RAG**: Retrieval Augmented Generation
+        - **Conditional Workflows**: Lógica condicional
+        - E mais 10 conceitos...
 
-    ---
+        📚 **Documentação completa**: Ver `CONCEITOS.md`
 
-    ### 🚀 Como Usar
+        ---
 
-    1. **Nova Solicitação**: Preencha os dados e execute
-    2. **Cenários Pré-definidos**: Teste casos específicos
-    3. **Analise os Logs**: Veja o raciocínio dos agents
+        ### 🚀 Como Usar
 
-    ---
+        1. **Nova Solicitação**: Preencha os dados e execute
+        2. **Cenários Pré-definidos**: Teste casos específicos
+        3. **Analise os Logs**: Veja o raciocínio dos agents
 
-    ### 🛠️ Stack Tecnológica
+        ---
 
-    - **LangChain**: Framework de agents
-    - **Groq**: API de LLM (gratuita)
-    - **Streamlit**: Interface web
-    - **Pydantic**: Validação de schemas
-    - **Python 3.9+**: Linguagem base
+        ### 🛠️ Stack Tecnológica
 
-    ---
+        - **LangChain**: Framework de agents
+        - **Groq**: API de LLM (gratuita)
+        - **Streamlit**: Interface web
+        - **Pydantic**: Validação de schemas
+        - **Python 3.9+**: Linguagem base
 
-    **Desenvolvido como MVP educacional para workshop de AI Agents** 🎓
-    """)
+        ---
+
+        **Desenvolvido como MVP educacional para workshop de AI Agents** 🎓
+        """)
 
 # Footer
 st.divider()
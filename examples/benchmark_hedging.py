@@ -0,0 +1,79 @@
+"""
+Benchmark de Hedging contra um LLM local com latência injetada
+
+Compara o p50/p99 de uma "jornada" de 6 chamadas sequenciais ao LLM
+com e sem hedging, usando o LocalStandInLLM (sem rede, sem API key).
+
+Uso:
+    python examples/benchmark_hedging.py --jornadas 200 --lentas 0.05
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from langchain_core.messages import HumanMessage
+
+from llm.guarded_chat_model import GuardedChatModel
+from llm.hedging import HedgeBudget, HedgedCaller
+from mocks.llm_local import LocalStandInLLM
+
+ETAPAS_POR_JORNADA = 6
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(round(p / 100.0 * (len(ordenados) - 1))), len(ordenados) - 1)]
+
+
+def executar(llm: GuardedChatModel, jornadas: int, paralelo: int) -> list:
+    """Executa N jornadas de 6 chamadas sequenciais e retorna as durações"""
+    mensagens = [HumanMessage(content="Protocolo de teste")]
+
+    def jornada(_):
+        inicio = time.perf_counter()
+        for _ in range(ETAPAS_POR_JORNADA):
+            llm.invoke(mensagens)
+        return time.perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=paralelo) as pool:
+        return list(pool.map(jornada, range(jornadas)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jornadas", type=int, default=200)
+    parser.add_argument("--paralelo", type=int, default=8)
+    parser.add_argument("--lentas", type=float, default=0.05, help="Probabilidade de resposta lenta")
+    parser.add_argument("--latencia-lenta", type=float, default=1.0)
+    parser.add_argument("--orcamento", type=float, default=0.1, help="Fração máxima de cópias")
+    args = parser.parse_args()
+
+    def novo_llm():
+        return LocalStandInLLM(
+            base_latency=0.05,
+            jitter=0.02,
+            slow_probability=args.lentas,
+            slow_latency=args.latencia_lenta,
+            seed=42
+        )
+
+    sem_hedge = GuardedChatModel(inner=novo_llm(), agent_name="benchmark")
+    hedger = HedgedCaller(percentile=95, min_samples=20, budget=HedgeBudget(ratio=args.orcamento))
+    com_hedge = GuardedChatModel(inner=novo_llm(), hedger=hedger, agent_name="benchmark")
+
+    print(f"Jornadas: {args.jornadas} x {ETAPAS_POR_JORNADA} chamadas | respostas lentas: {args.lentas:.0%}\n")
+
+    for nome, llm in (("Sem hedging", sem_hedge), ("Com hedging", com_hedge)):
+        duracoes = executar(llm, args.jornadas, args.paralelo)
+        print(f"{nome:12s} p50={percentil(duracoes, 50):.3f}s  p99={percentil(duracoes, 99):.3f}s")
+
+    print(f"\nEstatísticas do hedging: {hedger.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark do parser de NF-e em streaming e do índice de notas
+
+Gera um lote sintético de NF-e num único XML e compara:
+- pico de memória de `ler_nfe_xml` (iterparse) e de carregar a árvore inteira
+- tempo de ingestão do lote no índice
+- consulta de uma nota no índice e leitura da nota no arquivo a cada jornada
+
+Uso:
+    python examples/benchmark_nfe_index.py --notas 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from tools.nota_fiscal import IndiceNotasFiscais, carregar_nota_fiscal, ler_nfe_xml
+
+NS = "http://www.portalfiscal.inf.br/nfe"
+
+NOTA = """<NFe><infNFe Id="NFe{chave}" versao="4.00">
+<ide><serie>1</serie><nNF>{numero}</nNF><dhEmi>2025-09-{dia:02d}T10:00:00-03:00</dhEmi></ide>
+<emit><CNPJ>12345678000199</CNPJ><xNome>Varejo Tech LTDA</xNome></emit>
+<dest><CPF>{cpf}</CPF><xNome>Cliente {numero}</xNome></dest>
+{itens}
+<total><ICMSTot><vProd>{total:.2f}</vProd><vFrete>0.00</vFrete><vDesc>0.00</vDesc><vNF>{total:.2f}</vNF></ICMSTot></total>
+<pag><detPag><tPag>17</tPag><vPag>{total:.2f}</vPag></detPag></pag>
+</infNFe></NFe>
+"""
+
+ITEM = """<det nItem="{n}"><prod><cProd>PROD-{codigo:03d}</cProd><xProd>Produto {codigo}</xProd><NCM>85171231</NCM>
+<uCom>UN</uCom><qCom>1.0000</qCom><vUnCom>{valor:.2f}</vUnCom><vProd>{valor:.2f}</vProd></prod></det>"""
+
+
+def gerar(caminho: str, n: int):
+    """Lote de NF-e sintéticas (1 a 5 itens cada)"""
+    rng = random.Random(42)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<lote xmlns="{NS}">\n')
+        for numero in range(1, n + 1):
+            valores = [round(rng.uniform(50, 3000), 2) for _ in range(rng.randint(1, 5))]
+            itens = "".join(ITEM.format(n=i, codigo=rng.randint(1, 999), valor=v) for i, v in enumerate(valores, 1))
+            f.write(NOTA.format(
+                chave=f"{numero:044d}", numero=numero, dia=rng.randint(1, 30),
+                cpf=f"{rng.randrange(10**10, 10**11):011d}", itens=itens, total=sum(valores)
+            ))
+        f.write("</lote>\n")
+
+
+def pico_mb(funcao) -> float:
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notas", type=int, default=20000)
+    parser.add_argument("--consultas", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = os.path.join(diretorio, "lote.xml")
+        gerar(caminho, args.notas)
+        tamanho = os.path.getsize(caminho) / 2**20
+        print(f"Lote: {args.notas} notas, {tamanho:.1f} MB")
+
+        def contar_streaming():
+            for _ in ler_nfe_xml(caminho):
+                pass
+
+        def contar_arvore():
+            raiz = ET.parse(caminho).getroot()
+            return sum(1 for _ in raiz.iter(f"{{{NS}}}infNFe"))
+
+        print(f"Pico de memória - iterparse: {pico_mb(contar_streaming):8.2f} MB")
+        print(f"Pico de memória - árvore:    {pico_mb(contar_arvore):8.2f} MB")
+
+        indice = IndiceNotasFiscais(nome="benchmark.nfe")
+        inicio = time.perf_counter()
+        novas = indice.ingerir([caminho])
+        ingestao = time.perf_counter() - inicio
+        print(f"Ingestão: {novas} notas em {ingestao:.2f}s ({novas / ingestao:,.0f} notas/s)")
+
+        rng = random.Random(7)
+        numeros = [str(rng.randint(1, args.notas)) for _ in range(args.consultas)]
+        inicio = time.perf_counter()
+        for numero in numeros:
+            indice.buscar(numero)
+        consulta_us = (time.perf_counter() - inicio) / args.consultas * 1e6
+        print(f"Consulta no índice:     {consulta_us:10.1f} µs")
+
+        # Sem índice, a jornada lê o arquivo até a sua nota (metade do lote, em média)
+        amostra = numeros[:20]
+        inicio = time.perf_counter()
+        for numero in amostra:
+            for nota in ler_nfe_xml(caminho):
+                if nota["numero_nota"] == numero:
+                    break
+        leitura_us = (time.perf_counter() - inicio) / len(amostra) * 1e6
+        print(f"Leitura do arquivo:     {leitura_us:10.1f} µs por jornada ({leitura_us / consulta_us:,.0f}x)")
+
+        assert carregar_nota_fiscal(caminho, numeros[0])["numero_nota"] == numeros[0]
+
+
+if __name__ == "__main__":
+    main()
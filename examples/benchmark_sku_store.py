@@ -0,0 +1,105 @@
+"""
+Benchmark do catálogo de SKUs em colunas
+
+Gera um catálogo sintético, grava em .npy e compara:
+- memória de um dict de dicts (medida numa amostra e extrapolada) e do array
+- tempo de abertura e RSS com o arquivo mapeado em memória
+- latência da consulta de um SKU (busca binária na coluna de códigos)
+
+Uso:
+    python examples/benchmark_sku_store.py --skus 1000000
+"""
+
+import argparse
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import numpy as np
+
+from mocks.api_estoque import CENTROS_DISTRIBUICAO
+from mocks.sku_store import SkuStore, _dtype
+
+
+def rss_mb() -> float:
+    """RSS atual do processo (Linux); pico como aproximação em outros sistemas"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def gerar(n: int) -> np.ndarray:
+    """Catálogo sintético montado coluna a coluna (já ordenado por código)"""
+    rng = np.random.default_rng(42)
+    linhas = np.zeros(n, dtype=_dtype(tuple(CENTROS_DISTRIBUICAO)))
+    linhas["codigo"] = np.char.add(b"SKU-", np.char.zfill(np.arange(n).astype("S9"), 9))
+    linhas["nome"] = np.char.add(b"Produto ", linhas["codigo"])
+    linhas["categoria"] = rng.choice(np.array([b"Eletr\xc3\xb4nicos", b"\xc3\x81udio", b"Inform\xc3\xa1tica"]), n)
+    linhas["localizacao"] = b"CD-SP-A01"
+    linhas["preco"] = rng.uniform(10, 5000, n).round(2)
+    linhas["ativo"] = True
+    for cd in CENTROS_DISTRIBUICAO:
+        linhas["estoque"][cd] = rng.integers(0, 50, n)
+    return linhas
+
+
+def bytes_dicts(amostra: int) -> float:
+    """Bytes por SKU de um ESTOQUE_DB em dict de dicts"""
+    tracemalloc.start()
+    db = {
+        f"SKU-{i:09d}": {
+            "codigo": f"SKU-{i:09d}", "nome": f"Produto SKU-{i:09d}", "categoria": "Eletrônicos",
+            "preco": 100.0 + i, "estoque_cd": {cd: i % 50 for cd in CENTROS_DISTRIBUICAO},
+            "localizacao": "CD-SP-A01", "ativo": True
+        }
+        for i in range(amostra)
+    }
+    usados, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del db
+    return usados / amostra
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--skus", type=int, default=1_000_000)
+    parser.add_argument("--consultas", type=int, default=100_000)
+    args = parser.parse_args()
+
+    por_sku_dict = bytes_dicts(min(args.skus, 100_000))
+    linhas = gerar(args.skus)
+    print(f"dict de dicts:  {por_sku_dict * args.skus / 2**20:8.1f} MB ({por_sku_dict:.0f} bytes/SKU)")
+    print(f"array em colunas: {linhas.nbytes / 2**20:6.1f} MB ({linhas.dtype.itemsize} bytes/SKU)")
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "catalogo.npy")
+        SkuStore(linhas).salvar(caminho)
+        del linhas
+
+        antes = rss_mb()
+        inicio = time.perf_counter()
+        catalogo = SkuStore.abrir(caminho, mmap=True)
+        print(f"abertura mmap:  {(time.perf_counter() - inicio) * 1000:8.2f} ms, RSS +{rss_mb() - antes:.1f} MB")
+
+        rng = random.Random(7)
+        codigos = [f"SKU-{rng.randrange(args.skus):09d}" for _ in range(args.consultas)]
+        inicio = time.perf_counter()
+        for codigo in codigos:
+            catalogo.livre(catalogo.linha(codigo), "CD-SP")
+        decorrido = time.perf_counter() - inicio
+        print(f"consulta:       {decorrido / args.consultas * 1e6:8.2f} us/SKU "
+              f"(RSS +{rss_mb() - antes:.1f} MB após {args.consultas} consultas)")
+        del catalogo
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark do tempo de importação do orquestrador
+
+Mede, em processos novos (sem cache de módulos), quanto custa importar
+os pontos de entrada e falha se a mediana passar do orçamento. Também
+verifica que nenhum módulo pesado (LangChain, cliente Groq) foi carregado
+só pela importação.
+
+Uso:
+    python examples/benchmark_startup.py --execucoes 7 --orcamento-ms 300
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).parent.parent / "src"
+
+# Módulos que só devem ser carregados quando um agent é criado
+MODULOS_PESADOS = ("langchain", "langchain_core", "langchain_groq", "groq")
+
+MEDICAO = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+inicio = time.perf_counter()
+import {modulo}
+duracao = time.perf_counter() - inicio
+pesados = sorted({{m.split(".")[0] for m in sys.modules}} & set({pesados!r}))
+print(json.dumps({{"ms": duracao * 1000, "pesados": pesados}}))
+"""
+
+
+def medir(modulo: str) -> dict:
+    """Importa `modulo` num interpretador novo e retorna a duração e os módulos pesados carregados"""
+    codigo = MEDICAO.format(src=str(SRC_DIR), modulo=modulo, pesados=MODULOS_PESADOS)
+    saida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--execucoes", type=int, default=7)
+    parser.add_argument("--orcamento-ms", type=float, default=300.0, help="Mediana máxima por módulo")
+    parser.add_argument("--modulos", nargs="+", default=["orchestrator", "agents", "tools", "llm"])
+    args = parser.parse_args()
+
+    falhas = []
+
+    print(f"{'módulo':<14} {'mediana':>10} {'máximo':>10}  carregados")
+    for modulo in args.modulos:
+        medicoes = [medir(modulo) for _ in range(args.execucoes)]
+        tempos = [m["ms"] for m in medicoes]
+        mediana = statistics.median(tempos)
+        pesados = medicoes[-1]["pesados"]
+
+        print(f"{modulo:<14} {mediana:>8.1f}ms {max(tempos):>8.1f}ms  {', '.join(pesados) or '-'}")
+
+        if mediana > args.orcamento_ms:
+            falhas.append(f"{modulo}: mediana {mediana:.1f}ms acima do orçamento de {args.orcamento_ms:.0f}ms")
+        if pesados:
+            falhas.append(f"{modulo}: importou {', '.join(pesados)} na inicialização")
+
+    if falhas:
+        print("\n❌ Orçamento de inicialização excedido:")
+        for falha in falhas:
+            print(f"  - {falha}")
+        sys.exit(1)
+
+    print(f"\n✅ Todos os módulos dentro do orçamento de {args.orcamento_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
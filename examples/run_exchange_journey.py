@@ -38,7 +38,7 @@ def exemplo_1_troca_aprovada():
         "data_abertura": "2025-10-01T10:30:00",
         "tipo_solicitacao": "troca_produto",
         "cliente": {
-            "cpf": "123.456.789-00",
+            "cpf": "123.456.789-09",
             "nome": "João Silva Santos",
             "email": "joao.silva@email.com",
             "telefone": "(11) 98765-4321"
@@ -101,7 +101,7 @@ def exemplo_2_troca_fora_prazo():
         "data_abertura": "2024-10-01T14:00:00",
         "tipo_solicitacao": "troca_produto",
         "cliente": {
-            "cpf": "123.456.789-00",
+            "cpf": "123.456.789-09",
             "nome": "João Silva Santos",
             "email": "joao.silva@email.com",
             "telefone": "(11) 98765-4321"
@@ -221,7 +221,7 @@ def exemplo_4_dados_invalidos():
         "data_abertura": "2024-10-01T18:00:00",
         "tipo_solicitacao": "troca_produto",
         "cliente": {
-            "cpf": "123.456.789-00",
+            "cpf": "123.456.789-09",
             "nome": "Nome Errado",  # Nome não confere com cadastro
             "email": "email.errado@email.com",  # Email não confere
             "telefone": "(11) 98765-4321"
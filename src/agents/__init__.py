@@ -8,14 +8,30 @@ Esta arquitetura modular permite:
 - Reutilização de agents em outras jornadas
 - Testes isolados de cada etapa
 - Evolução independente de cada agent
+
+CONCEITO - Lazy Loading (PEP 562):
+Cada agent importa LangChain, o cliente do LLM e as suas tools. Os nomes
+abaixo só carregam o módulo do agent no primeiro acesso, então importar
+o pacote (ou o orquestrador) não paga esse custo até um agent ser usado.
 """
 
-from .customer_validator_agent import CustomerValidatorAgent, validar_cliente
-from .document_analyzer_agent import DocumentAnalyzerAgent, analisar_documentos
-from .eligibility_validator_agent import EligibilityValidatorAgent, validar_elegibilidade
-from .exchange_classifier_agent import ExchangeClassifierAgent, classificar_troca
-from .inventory_validator_agent import InventoryValidatorAgent, validar_estoque
-from .decision_agent import DecisionAgent, tomar_decisao
+import importlib
+
+# Nome exportado -> módulo que o define
+_EXPORTS = {
+    'CustomerValidatorAgent': 'customer_validator_agent',
+    'validar_cliente': 'customer_validator_agent',
+    'DocumentAnalyzerAgent': 'document_analyzer_agent',
+    'analisar_documentos': 'document_analyzer_agent',
+    'EligibilityValidatorAgent': 'eligibility_validator_agent',
+    'validar_elegibilidade': 'eligibility_validator_agent',
+    'ExchangeClassifierAgent': 'exchange_classifier_agent',
+    'classificar_troca': 'exchange_classifier_agent',
+    'InventoryValidatorAgent': 'inventory_validator_agent',
+    'validar_estoque': 'inventory_validator_agent',
+    'DecisionAgent': 'decision_agent',
+    'tomar_decisao': 'decision_agent',
+}
 
 __all__ = [
     'CustomerValidatorAgent',
@@ -31,3 +47,15 @@ __all__ = [
     'validar_estoque',
     'tomar_decisao'
 ]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    valor = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = valor  # próximos acessos não passam por aqui
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
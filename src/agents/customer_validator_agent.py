@@ -17,20 +17,25 @@ tomando decisões baseadas em contexto.
 """
 
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 import os
-from dotenv import load_dotenv
 import sys
+from typing import Optional
 
-# Carrega variáveis de ambiente
-load_dotenv()
+# Adiciona path para imports (uma única vez)
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
-# Adiciona path para imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bootstrap import load_env
+
+# Carrega variáveis de ambiente (uma única vez por processo)
+load_env()
 
 from tools.customer_tools import get_customer_tools
 from agents.output_parser_fix import RobustJSONAgentOutputParser
+from llm.factory import create_llm
+from observability import agent_verbose
 
 
 class CustomerValidatorAgent:
@@ -43,13 +48,16 @@ class CustomerValidatorAgent:
     - Garante segurança antes de prosseguir
     """
 
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0):
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0,
+                 max_tokens: Optional[int] = None, verbose: Optional[bool] = None):
         """
         Inicializa o agent
 
         Args:
             model_name: Modelo da Groq a usar (recomendado: llama-3.3-70b-versatile)
             temperature: Temperatura do modelo (0 = mais determinístico)
+            max_tokens: Teto de tokens gerados por chamada (None = perfil do agent em llm/factory.py)
+            verbose: Imprime o raciocínio ReAct (None = AGENT_VERBOSE ou perfil de log)
 
         CONCEITO - Temperature:
         Temperature controla a criatividade/aleatoriedade do modelo:
@@ -57,11 +65,7 @@ class CustomerValidatorAgent:
         - 1.0+: Mais criativo e variado
         Para tarefas críticas como validação, usamos temperatura baixa.
         """
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+        self.llm = create_llm("CustomerValidator", model_name, temperature, max_tokens=max_tokens)
 
         self.tools = get_customer_tools()
 
@@ -99,7 +103,7 @@ TOOL NAMES: {tool_names}
 FORMATO DE RESPOSTA (obrigatório):
 Thought: Preciso validar os dados do cliente
 Action: validar_dados_cliente
-Action Input: {{"cpf": "123.456.789-00", "nome": "João Silva Santos", "email": "joao@email.com"}}
+Action Input: {{"cpf": "123.456.789-09", "nome": "João Silva Santos", "email": "joao@email.com"}}
 Observation: [resultado será preenchido automaticamente]
 Thought: Baseado na validação recebida, [analise o resultado]
 Thought: I now know the final answer
@@ -145,7 +149,8 @@ PROTOCOLO ATUAL:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,  # Mostra o processo de raciocínio
+            # Mostra o processo de raciocínio (padrão: AGENT_VERBOSE ou perfil de log)
+            verbose=verbose if verbose is not None else agent_verbose("CustomerValidator"),
             handle_parsing_errors=True,  # Trata erros de parsing graciosamente
             max_iterations=3,  # 1 tool + Final Answer
             early_stopping_method="force"  # Para evitar loops
@@ -10,17 +10,25 @@ que todas as validações foram consideradas.
 """
 
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 import os
-from dotenv import load_dotenv
 import sys
+from typing import List, Optional
 
-load_dotenv()
+# Adiciona path para imports (uma única vez)
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bootstrap import load_env
 
+# Carrega variáveis de ambiente (uma única vez por processo)
+load_env()
+
+from agents.multi_item import invocar_por_item
 from agents.output_parser_fix import RobustJSONAgentOutputParser
+from llm.factory import create_llm
+from observability import agent_verbose
 
 
 class DecisionAgent:
@@ -34,13 +42,10 @@ class DecisionAgent:
     - Gera justificativa clara da decisão
     """
 
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0):
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0,
+                 max_tokens: Optional[int] = None, verbose: Optional[bool] = None):
         """Inicializa o agent decisor"""
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+        self.llm = create_llm("DecisionAgent", model_name, temperature, max_tokens=max_tokens)
 
         # Agent decisor não precisa de tools, apenas raciocínio
         self.tools = []
@@ -140,7 +145,7 @@ RESULTADOS DAS ETAPAS ANTERIORES:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            verbose=verbose if verbose is not None else agent_verbose("DecisionAgent"),
             handle_parsing_errors=True,
             max_iterations=4
         )
@@ -191,13 +196,74 @@ Seja rigoroso e justifique sua decisão claramente.
         resultado = self.agent_executor.invoke({"input": input_text})
         output = resultado.get("output", "")
 
+        return {
+            "agent": "DecisionAgent",
+            "decisao_final": self._decisao(output),
+            "output": output,
+            "raw_result": resultado
+        }
+
+    @staticmethod
+    def _decisao(output: str) -> str:
         # Determina se foi aprovado
         aprovado = "DECISÃO FINAL: APROVADO" in output
+        return "aprovado" if aprovado else "rejeitado"
+
+    def decide_itens(self, resultados_anteriores: dict, itens: List[dict]) -> dict:
+        """
+        Toma a decisão de vários itens numa única execução
+
+        Args:
+            resultados_anteriores: Resultado da jornada até aqui (etapas compartilhadas)
+            itens: Situação de cada item ainda em análise, com "elegibilidade",
+                "tipo_troca", "requer_estoque", "estoque" e "reserva_id"
+
+        Returns:
+            Resultado do lote, com {"itens": {n: {"decisao_final", "output"}}}
+        """
+        blocos = "".join(f"""
+ITEM {item['item']}:
+- Produto Original: {item.get('produto_original') or 'N/A'}
+- Produto Desejado: {item.get('produto_desejado') or 'N/A'}
+- Elegibilidade: {item.get('elegibilidade', 'N/A')}
+- Tipo de Troca: {item.get('tipo_troca') or 'N/A'}
+- Requer Estoque: {item.get('requer_estoque', 'N/A')}
+- Estoque: {item.get('estoque') or 'N/A - Não aplicável'}
+- Reserva ID: {item.get('reserva_id') or 'N/A'}
+""" for item in itens)
+
+        input_text = f"""
+Protocolo: {resultados_anteriores.get('protocolo', 'N/A')}
+
+=== ETAPAS COMPARTILHADAS PELOS ITENS ===
+
+1. VALIDAÇÃO DE CLIENTE:
+Status: {resultados_anteriores.get('validacao_cliente', {}).get('status', 'N/A')}
+Detalhes: {resultados_anteriores.get('validacao_cliente', {}).get('output', 'N/A')[:300]}
+
+2. ANÁLISE DE DOCUMENTOS:
+Status: {resultados_anteriores.get('analise_documentos', {}).get('status', 'N/A')}
+Data Compra: {resultados_anteriores.get('analise_documentos', {}).get('data_compra', 'N/A')}
+
+=== RESULTADOS POR ITEM ===
+{blocos}
+=== FIM DOS RESULTADOS ===
+
+Com base nos resultados acima, tome a decisão final de CADA item separadamente.
+Seja rigoroso e justifique cada decisão claramente.
+"""
+
+        resultado, saidas = invocar_por_item(
+            self.agent_executor, input_text, [item["item"] for item in itens],
+            max_iterations=self.agent_executor.max_iterations
+        )
+        por_item = {numero: {"decisao_final": self._decisao(saida), "output": saida} for numero, saida in saidas.items()}
 
         return {
             "agent": "DecisionAgent",
-            "decisao_final": "aprovado" if aprovado else "rejeitado",
-            "output": output,
+            "decisao_final": "aprovado" if any(r["decisao_final"] == "aprovado" for r in por_item.values()) else "rejeitado",
+            "itens": por_item,
+            "output": resultado.get("output", ""),
             "raw_result": resultado
         }
 
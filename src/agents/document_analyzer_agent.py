@@ -8,18 +8,27 @@ informações não estruturadas.
 """
 
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 import os
-from dotenv import load_dotenv
 import sys
+from typing import Optional
 
-load_dotenv()
+# Adiciona path para imports (uma única vez)
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bootstrap import load_env
 
+# Carrega variáveis de ambiente (uma única vez por processo)
+load_env()
+
+from journey.itens import itens_do_protocolo, protocolo_multi_item
 from tools.document_tools import get_document_tools
+from tools.nota_fiscal import arquivo_nota_fiscal
 from agents.output_parser_fix import RobustJSONAgentOutputParser
+from llm.factory import create_llm
+from observability import agent_verbose
 
 
 class DocumentAnalyzerAgent:
@@ -33,13 +42,10 @@ class DocumentAnalyzerAgent:
     - Verifica integridade dos documentos
     """
 
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0):
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0,
+                 max_tokens: Optional[int] = None, verbose: Optional[bool] = None):
         """Inicializa o agent de análise de documentos"""
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+        self.llm = create_llm("DocumentAnalyzer", model_name, temperature, max_tokens=max_tokens)
 
         self.tools = get_document_tools()
 
@@ -59,7 +65,8 @@ SUA MISSÃO:
 4. Identificar categoria do produto para próximas validações
 
 PROCEDIMENTO OBRIGATÓRIO:
-1. Use a tool "analisar_nota_fiscal" UMA ÚNICA VEZ para extrair dados
+1. Use a tool "analisar_nota_fiscal" UMA ÚNICA VEZ para extrair dados, informando o arquivo,
+   a "Nota Fiscal Informada" no protocolo (numero_nota) e o "Cliente CPF" do protocolo (cpf)
 2. Após receber a Observation, analise os dados
 3. Compare com o protocolo internamente (use apenas raciocínio, NÃO use tools)
 4. Vá direto para Final Answer com os resultados
@@ -71,6 +78,7 @@ REGRAS IMPORTANTES:
 - Vá direto para "Thought: I now know the final answer" e depois "Final Answer"
 - Se houver divergência entre nota fiscal e protocolo, REJEITE no Final Answer
 - Se a nota fiscal estiver ilegível ou com dados faltando, REJEITE no Final Answer
+- Se a tool responder "NOTA FISCAL NÃO ENCONTRADA" (nota inexistente ou de outro CPF), REJEITE no Final Answer
 
 TOOLS DISPONÍVEIS:
 {tools}
@@ -80,7 +88,7 @@ TOOL NAMES: {tool_names}
 FORMATO DE RESPOSTA (OBRIGATÓRIO - SIGA EXATAMENTE):
 Thought: [seu raciocínio]
 Action: [nome exato da tool]
-Action Input: {{"arquivo_nota": "nota_fiscal_exemplo.json"}}
+Action Input: {{"arquivo_nota": "nota_fiscal_exemplo.json", "numero_nota": "NF-2024-456789", "cpf": "123.456.789-09"}}
 Observation: [será preenchido automaticamente]
 
 IMPORTANTE:
@@ -90,7 +98,7 @@ IMPORTANTE:
 - Exemplo completo:
   Thought: Preciso analisar a nota fiscal
   Action: analisar_nota_fiscal
-  Action Input: {{"arquivo_nota": "nota_fiscal_exemplo.json"}}
+  Action Input: {{"arquivo_nota": "nota_fiscal_exemplo.json", "numero_nota": "NF-2024-456789", "cpf": "123.456.789-09"}}
 
 Após ver a Observation, NÃO USE MAIS TOOLS. Continue assim:
 Thought: Analisando os dados da nota fiscal recebidos...
@@ -133,7 +141,7 @@ PROTOCOLO E DOCUMENTOS:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            verbose=verbose if verbose is not None else agent_verbose("DocumentAnalyzer"),
             handle_parsing_errors=True,
             max_iterations=3,  # Apenas 1 tool + Final Answer
             early_stopping_method="force"  # Para ir direto para Final Answer após usar a tool
@@ -151,23 +159,31 @@ PROTOCOLO E DOCUMENTOS:
         """
         cliente = protocolo_data.get("cliente", {})
         produto_original = protocolo_data.get("produto_original", {})
-        documentos = protocolo_data.get("documentos_anexados", [])
 
         # Identifica arquivo da nota fiscal
-        nota_fiscal = "nota_fiscal_exemplo.json"  # Default
-        for doc in documentos:
-            if doc.get("tipo") == "nota_fiscal":
-                nota_fiscal = doc.get("arquivo", nota_fiscal)
+        nota_fiscal = arquivo_nota_fiscal(protocolo_data)
+
+        if protocolo_multi_item(protocolo_data):
+            # Uma análise da nota para todos os itens; a conferência de cada
+            # item com as linhas da nota é feita pelo orquestrador
+            produtos = "".join(
+                f"\n- Item {item['item']}: {item['produto_original'].get('codigo', 'N/A')} - "
+                f"{item['produto_original'].get('descricao', 'N/A')} "
+                f"(Nota Fiscal Informada: {item['produto_original'].get('numero_nota_fiscal', 'N/A')})"
+                for item in itens_do_protocolo(protocolo_data)
+            )
+        else:
+            produtos = f"""
+- Produto Código: {produto_original.get('codigo', 'N/A')}
+- Produto Descrição: {produto_original.get('descricao', 'N/A')}
+- Nota Fiscal Informada: {produto_original.get('numero_nota_fiscal', 'N/A')}"""
 
         input_text = f"""
 Protocolo: {protocolo_data.get('protocolo', 'N/A')}
 
 Dados do Protocolo:
 - Cliente CPF: {cliente.get('cpf', 'N/A')}
-- Cliente Nome: {cliente.get('nome', 'N/A')}
-- Produto Código: {produto_original.get('codigo', 'N/A')}
-- Produto Descrição: {produto_original.get('descricao', 'N/A')}
-- Nota Fiscal Informada: {produto_original.get('numero_nota_fiscal', 'N/A')}
+- Cliente Nome: {cliente.get('nome', 'N/A')}{produtos}
 
 Documento Anexado:
 - Arquivo da Nota Fiscal: {nota_fiscal}
@@ -7,18 +7,27 @@ consultando políticas da empresa e aplicando-as ao caso específico.
 """
 
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 import os
-from dotenv import load_dotenv
 import sys
+from typing import Dict, List, Optional
 
-load_dotenv()
+# Adiciona path para imports (uma única vez)
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bootstrap import load_env
+
+# Carrega variáveis de ambiente (uma única vez por processo)
+load_env()
 
 from tools.document_tools import get_document_tools
+from tools.prazos import verificar_prazo
+from agents.multi_item import invocar_por_item
 from agents.output_parser_fix import RobustJSONAgentOutputParser
+from llm.factory import create_llm
+from observability import agent_verbose
 
 
 class EligibilityValidatorAgent:
@@ -33,13 +42,10 @@ class EligibilityValidatorAgent:
     - Valida motivo da troca
     """
 
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0):
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0,
+                 max_tokens: Optional[int] = None, verbose: Optional[bool] = None):
         """Inicializa o agent de validação de elegibilidade"""
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+        self.llm = create_llm("EligibilityValidator", model_name, temperature, max_tokens=max_tokens)
 
         self.tools = get_document_tools()
 
@@ -134,7 +140,7 @@ DADOS PARA VALIDAÇÃO:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            verbose=verbose if verbose is not None else agent_verbose("EligibilityValidator"),
             handle_parsing_errors=True,
             max_iterations=5,  # 2 tools + Final Answer
             early_stopping_method="force"  # Para evitar loops
@@ -174,12 +180,86 @@ Seja rigoroso e verifique TODOS os requisitos.
         resultado = self.agent_executor.invoke({"input": input_text})
         output = resultado.get("output", "")
 
+        return {
+            "agent": "EligibilityValidator",
+            "status": self._status(output),
+            "output": output,
+            "raw_result": resultado
+        }
+
+    @staticmethod
+    def _status(output: str) -> str:
         aprovado = "STATUS: APROVADO" in output or "PODE_PROSSEGUIR: SIM" in output
+        return "aprovado" if aprovado else "reprovado"
+
+    def validate_itens(self, protocolo_data: dict, itens: List[dict], dados_documento: dict) -> dict:
+        """
+        Valida a elegibilidade de vários itens do protocolo numa única execução
+
+        CONCEITO - Batched Agent Call (agents/multi_item.py):
+        Os prazos dos itens são calculados aqui (tools/prazos.py) e entram
+        prontos na entrada; o agent só consulta as regras, uma vez por
+        combinação de categoria e tipo de troca.
+
+        Args:
+            protocolo_data: Dados do protocolo
+            itens: Itens a validar (journey/itens.py), com "categoria" e
+                "data_compra" da conferência da nota fiscal
+            dados_documento: Dados extraídos da análise de documentos
+
+        Returns:
+            Resultado do lote, com {"itens": {n: {"status", "output"}}}
+        """
+        blocos = []
+        combinacoes = set()
+        for item in itens:
+            produto_original = item["produto_original"]
+            data_compra = item.get("data_compra") or dados_documento.get("data_compra") or produto_original.get("data_compra")
+            categoria = item.get("categoria") or dados_documento.get("categoria") or "N/A"
+            tipo_troca = item.get("tipo_troca_desejado") or "N/A"
+            combinacoes.add((categoria, tipo_troca))
+
+            try:
+                dias, limite = verificar_prazo(data_compra, categoria, tipo_troca)
+                prazo = f"{'VÁLIDO' if dias <= limite else 'EXPIRADO'} - {dias} dias desde a compra, prazo de {limite} dias"
+            except (TypeError, ValueError):
+                prazo = "NÃO VERIFICADO - data da compra ausente ou inválida"
+
+            blocos.append(f"""
+ITEM {item['item']}:
+- Código: {produto_original.get('codigo', 'N/A')}
+- Descrição: {produto_original.get('descricao', 'N/A')}
+- Data da Compra: {data_compra or 'N/A'}
+- Categoria: {categoria}
+- Tipo de Troca Solicitado: {tipo_troca}
+- Motivo da Troca: {item.get('motivo_troca') or 'N/A'}
+- Descrição do Problema: {item.get('descricao_problema') or 'N/A'}
+- Prazo (já verificado): {prazo}
+""")
+
+        input_text = f"""
+Protocolo: {protocolo_data.get('protocolo', 'N/A')}
+
+Itens do Protocolo:
+{"".join(blocos)}
+Os prazos de todos os itens já foram verificados acima: NÃO use "validar_prazo_troca".
+Use "consultar_regras_elegibilidade" uma vez para cada combinação de categoria e tipo de troca.
+Por favor, valide se cada item atende todos os critérios de elegibilidade.
+"""
+
+        resultado, saidas = invocar_por_item(
+            self.agent_executor, input_text, [item["item"] for item in itens],
+            max_iterations=len(combinacoes) + 2
+        )
+        por_item: Dict[int, dict] = {
+            numero: {"status": self._status(saida), "output": saida} for numero, saida in saidas.items()
+        }
 
         return {
             "agent": "EligibilityValidator",
-            "status": "aprovado" if aprovado else "reprovado",
-            "output": output,
+            "status": "aprovado" if any(r["status"] == "aprovado" for r in por_item.values()) else "reprovado",
+            "itens": por_item,
+            "output": resultado.get("output", ""),
             "raw_result": resultado
         }
 
@@ -7,17 +7,25 @@ onde o LLM analisa contexto e categoriza a solicitação.
 """
 
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 import os
-from dotenv import load_dotenv
 import sys
+from typing import List, Optional
 
-load_dotenv()
+# Adiciona path para imports (uma única vez)
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bootstrap import load_env
 
+# Carrega variáveis de ambiente (uma única vez por processo)
+load_env()
+
+from agents.multi_item import invocar_por_item
 from agents.output_parser_fix import RobustJSONAgentOutputParser
+from llm.factory import create_llm
+from observability import agent_verbose
 
 
 class ExchangeClassifierAgent:
@@ -32,7 +40,8 @@ class ExchangeClassifierAgent:
       * vale_compra
     """
 
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0.1):
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0.1,
+                 max_tokens: Optional[int] = None, verbose: Optional[bool] = None):
         """
         Inicializa o agent classificador
 
@@ -40,11 +49,7 @@ class ExchangeClassifierAgent:
         Usamos temperatura ligeiramente maior (0.1) para permitir
         alguma flexibilidade na interpretação, mas ainda determinístico.
         """
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+        self.llm = create_llm("ExchangeClassifier", model_name, temperature, max_tokens=max_tokens)
 
         # Este agent não precisa de tools, apenas raciocínio
         self.tools = []
@@ -131,7 +136,7 @@ DADOS DA SOLICITAÇÃO:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            verbose=verbose if verbose is not None else agent_verbose("ExchangeClassifier"),
             handle_parsing_errors=True,
             max_iterations=3  # Classificação é simples, poucas iterações
         )
@@ -163,6 +168,15 @@ Por favor, classifique esta troca na categoria apropriada.
         resultado = self.agent_executor.invoke({"input": input_text})
         output = resultado.get("output", "")
 
+        return {
+            "agent": "ExchangeClassifier",
+            **self._classificacao(output),
+            "output": output,
+            "raw_result": resultado
+        }
+
+    @staticmethod
+    def _classificacao(output: str) -> dict:
         # Extrai tipo classificado
         tipo_troca = None
         requer_estoque = False
@@ -173,11 +187,47 @@ Por favor, classifique esta troca na categoria apropriada.
             if "REQUER_ESTOQUE: SIM" in line:
                 requer_estoque = True
 
+        return {"tipo_troca_classificado": tipo_troca, "requer_validacao_estoque": requer_estoque}
+
+    def classify_itens(self, protocolo_data: dict, itens: List[dict]) -> dict:
+        """
+        Classifica o tipo de troca de vários itens numa única execução
+
+        Args:
+            protocolo_data: Dados do protocolo
+            itens: Itens a classificar (journey/itens.py)
+
+        Returns:
+            Resultado do lote, com {"itens": {n: {"tipo_troca_classificado",
+            "requer_validacao_estoque", "output"}}}
+        """
+        blocos = "".join(f"""
+ITEM {item['item']}:
+- Tipo de Troca Solicitado pelo Cliente: {item.get('tipo_troca_desejado') or 'N/A'}
+- Motivo da Troca: {item.get('motivo_troca') or 'N/A'}
+- Descrição do Problema: {item.get('descricao_problema') or 'N/A'}
+- Produto Desejado: {item['produto_desejado'].get('descricao', 'Não especificado')}
+""" for item in itens)
+
+        input_text = f"""
+Protocolo: {protocolo_data.get('protocolo', 'N/A')}
+
+Itens do Protocolo:
+{blocos}
+Por favor, classifique a troca de cada item na categoria apropriada.
+"""
+
+        # Sem tools: a classificação de todos os itens sai de uma só resposta
+        resultado, saidas = invocar_por_item(
+            self.agent_executor, input_text, [item["item"] for item in itens],
+            max_iterations=self.agent_executor.max_iterations
+        )
+
         return {
             "agent": "ExchangeClassifier",
-            "tipo_troca_classificado": tipo_troca,
-            "requer_validacao_estoque": requer_estoque,
-            "output": output,
+            "status": "concluido",
+            "itens": {numero: {**self._classificacao(saida), "output": saida} for numero, saida in saidas.items()},
+            "output": resultado.get("output", ""),
             "raw_result": resultado
         }
 
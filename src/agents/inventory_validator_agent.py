@@ -7,18 +7,26 @@ Demonstra como criar workflows condicionais na jornada agêntica.
 """
 
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain_groq import ChatGroq
 from langchain.prompts import PromptTemplate
 import os
-from dotenv import load_dotenv
 import sys
+from typing import List, Optional
 
-load_dotenv()
+# Adiciona path para imports (uma única vez)
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bootstrap import load_env
 
-from tools.inventory_tools import get_inventory_tools
+# Carrega variáveis de ambiente (uma única vez por processo)
+load_env()
+
+from tools.inventory_tools import get_inventory_tools, uf_entrega
+from agents.multi_item import invocar_por_item
 from agents.output_parser_fix import RobustJSONAgentOutputParser
+from llm.factory import create_llm
+from observability import agent_verbose
 
 
 class InventoryValidatorAgent:
@@ -32,13 +40,10 @@ class InventoryValidatorAgent:
     - Acionado apenas se tipo_troca = troca_outro_produto
     """
 
-    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0):
+    def __init__(self, model_name: str = "llama-3.3-70b-versatile", temperature: float = 0,
+                 max_tokens: Optional[int] = None, verbose: Optional[bool] = None):
         """Inicializa o agent de validação de estoque"""
-        self.llm = ChatGroq(
-            model=model_name,
-            temperature=temperature,
-            groq_api_key=os.getenv("GROQ_API_KEY")
-        )
+        self.llm = create_llm("InventoryValidator", model_name, temperature, max_tokens=max_tokens)
 
         self.tools = get_inventory_tools()
 
@@ -61,7 +66,8 @@ PROCEDIMENTO OBRIGATÓRIO:
 1. Use "consultar_produto" APENAS UMA VEZ para obter detalhes do produto desejado
 2. Após receber o resultado, analise:
    - Se produto NÃO EXISTE: vá direto para Final Answer com STATUS: INDISPONIVEL
-   - Se produto EXISTE: use "verificar_disponibilidade" e depois "reservar_produto"
+   - Se produto EXISTE: use "verificar_disponibilidade" e depois "reservar_produto",
+     sempre com a "uf_entrega" informada no protocolo (a reserva sai do CD mais próximo)
 3. NÃO repita ações já executadas
 4. Após completar (sucesso ou falha), vá para "Thought: I now know the final answer"
 
@@ -109,12 +115,12 @@ Action Input: {{"codigo_produto": "PROD-003"}}
 Observation: Produto encontrado: Fone Bluetooth Premium, Preço: 299.90, Categoria: audio
 Thought: Produto existe, agora verifico disponibilidade
 Action: verificar_disponibilidade
-Action Input: {{"codigo_produto": "PROD-003", "quantidade": 1}}
-Observation: Disponível - 10 unidades livres
+Action Input: {{"codigo_produto": "PROD-003", "quantidade": 1, "uf_entrega": "RJ"}}
+Observation: Disponível - 10 unidades livres, CD mais próximo: CD-RJ
 Thought: Produto disponível, vou reservar
 Action: reservar_produto
-Action Input: {{"codigo_produto": "PROD-003", "quantidade": 1, "protocolo": "TROCA-123"}}
-Observation: Reserva criada - ID: RES-12345
+Action Input: {{"codigo_produto": "PROD-003", "quantidade": 1, "protocolo": "TROCA-123", "uf_entrega": "RJ"}}
+Observation: Reserva criada - ID: RES-12345, CD: CD-RJ
 Thought: I now know the final answer
 Final Answer:
 ---
@@ -134,8 +140,8 @@ PRODUTO_CODIGO: [código do produto]
 PRODUTO_NOME: [nome do produto ou "N/A"]
 QUANTIDADE_LIVRE: [quantidade disponível ou 0]
 RESERVA_ID: [ID da reserva criada, ou "N/A"]
-PODE_PROSSEGUIR: [SIM/NAO]
 MOTIVO: [se indisponível, explique o motivo]
+PODE_PROSSEGUIR: [SIM/NAO]
 OBSERVACOES: [informações adicionais]
 ---
 
@@ -155,7 +161,7 @@ DADOS DO PROTOCOLO:
         self.agent_executor = AgentExecutor(
             agent=self.agent,
             tools=self.tools,
-            verbose=True,
+            verbose=verbose if verbose is not None else agent_verbose("InventoryValidator"),
             handle_parsing_errors=True,
             max_iterations=4,  # Reduzido: 1 consulta + (2 verificação/reserva ou 1 finalização) + 1 final
             early_stopping_method="force"  # Para forçadamente ao atingir max_iterations
@@ -181,6 +187,7 @@ Produto Desejado pelo Cliente:
 - Descrição: {produto_desejado.get('descricao', 'N/A')}
 
 Quantidade Necessária: 1 unidade
+UF de Entrega: {uf_entrega(protocolo_data) or 'não informada'}
 
 Por favor, verifique a disponibilidade e, se possível, reserve o produto.
 """
@@ -188,6 +195,15 @@ Por favor, verifique a disponibilidade e, se possível, reserve o produto.
         resultado = self.agent_executor.invoke({"input": input_text})
         output = resultado.get("output", "")
 
+        return {
+            "agent": "InventoryValidator",
+            **self._estoque(output),
+            "output": output,
+            "raw_result": resultado
+        }
+
+    @staticmethod
+    def _estoque(output: str) -> dict:
         # Verifica status - prioriza marcadores explícitos
         disponivel = False
         indisponivel = False
@@ -216,10 +232,52 @@ Por favor, verifique a disponibilidade e, se possível, reserve o produto.
                         reserva_id = None
 
         return {
-            "agent": "InventoryValidator",
             "status": "disponivel" if disponivel and not indisponivel else "indisponivel",
-            "reserva_id": reserva_id,
-            "output": output,
+            "reserva_id": reserva_id
+        }
+
+    def validate_itens(self, protocolo_data: dict, itens: List[dict]) -> dict:
+        """
+        Valida e reserva o produto desejado de vários itens numa única execução
+
+        Cada item usa só "reservar_produto", que já recusa produto inexistente
+        ou sem estoque no CD: uma iteração por item, em vez de três.
+
+        Args:
+            protocolo_data: Dados do protocolo
+            itens: Itens que requerem estoque (journey/itens.py)
+
+        Returns:
+            Resultado do lote, com {"itens": {n: {"status", "reserva_id", "output"}}}
+        """
+        blocos = "".join(f"""
+ITEM {item['item']}:
+- Código do Produto Desejado: {item['produto_desejado'].get('codigo', 'N/A')}
+- Descrição: {item['produto_desejado'].get('descricao', 'N/A')}
+- Quantidade Necessária: 1 unidade
+""" for item in itens)
+
+        input_text = f"""
+Protocolo: {protocolo_data.get('protocolo', 'N/A')}
+UF de Entrega: {uf_entrega(protocolo_data) or 'não informada'}
+
+Produtos Desejados:
+{blocos}
+Para cada item, use "reservar_produto" UMA VEZ, com a UF de entrega: a reserva já recusa
+produto inexistente ou sem estoque. NÃO use "consultar_produto" nem "verificar_disponibilidade".
+"""
+
+        resultado, saidas = invocar_por_item(
+            self.agent_executor, input_text, [item["item"] for item in itens],
+            max_iterations=len(itens) + 2
+        )
+        por_item = {numero: {**self._estoque(saida), "output": saida} for numero, saida in saidas.items()}
+
+        return {
+            "agent": "InventoryValidator",
+            "status": "disponivel" if any(r["status"] == "disponivel" for r in por_item.values()) else "indisponivel",
+            "itens": por_item,
+            "output": resultado.get("output", ""),
             "raw_result": resultado
         }
 
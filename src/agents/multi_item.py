@@ -0,0 +1,73 @@
+"""
+Uma chamada de agent para todos os itens de um protocolo
+
+CONCEITO - Batched Agent Call:
+Em protocolos com vários itens (journey/itens.py), as etapas por item
+(elegibilidade, classificação, estoque, decisão) recebem todos os itens
+numa única execução do agent. A Final Answer repete o formato de resposta
+do agent uma vez por item, cada bloco aberto pela linha "ITEM: <n>"; cada
+bloco é interpretado pelo mesmo parsing do caso de item único.
+
+Um item sem bloco na resposta recebe texto vazio, e o parsing de cada
+agent o trata como não aprovado (a decisão mais conservadora). Por isso o
+corte antecipado da geração (llm/early_stop.py) é avisado de quantos blocos
+esperar: cortar no fechamento do primeiro descartaria os demais itens.
+"""
+
+import re
+from typing import Dict, Sequence, Tuple
+
+from langchain.agents import AgentExecutor
+
+from llm.early_stop import blocos_esperados
+
+# "ITEM: 2", "- ITEM 2:", "**ITEM: 2**" no início da linha
+ITEM_RE = re.compile(r"^\W*ITEM\W*(\d+)", re.IGNORECASE | re.MULTILINE)
+
+
+def instrucoes_itens(numeros: Sequence[int]) -> str:
+    """Instrução acrescentada à entrada do agent quando há vários itens"""
+    return f"""
+ATENÇÃO - PROTOCOLO COM {len(numeros)} ITENS ({", ".join(str(n) for n in numeros)}):
+Avalie cada item separadamente. Na Final Answer, repita o FORMATO DA RESPOSTA FINAL
+uma vez para cada item, começando cada bloco com a linha "ITEM: <número do item>".
+"""
+
+
+def dividir_por_item(output: str) -> Dict[int, str]:
+    """Blocos da Final Answer por número do item"""
+    marcas = list(ITEM_RE.finditer(output))
+    blocos = {}
+    for i, marca in enumerate(marcas):
+        fim = marcas[i + 1].start() if i + 1 < len(marcas) else len(output)
+        # Um item repetido na resposta fica com o primeiro bloco
+        blocos.setdefault(int(marca.group(1)), output[marca.start():fim])
+    return blocos
+
+
+def invocar_por_item(executor: AgentExecutor, input_text: str, numeros: Sequence[int],
+                     max_iterations: int) -> Tuple[dict, Dict[int, str]]:
+    """
+    Executa o agent uma vez para todos os itens
+
+    Args:
+        executor: AgentExecutor do agent (de onde vêm agent, tools e configuração)
+        input_text: Entrada com os dados de todos os itens
+        numeros: Números dos itens esperados na resposta
+        max_iterations: Limite de iterações para o lote (o do agent vale para um item)
+
+    Returns:
+        (resultado bruto do executor, {número do item: bloco da resposta})
+    """
+    lote = AgentExecutor(
+        agent=executor.agent,
+        tools=executor.tools,
+        verbose=executor.verbose,
+        handle_parsing_errors=executor.handle_parsing_errors,
+        max_iterations=max_iterations,
+        early_stopping_method=executor.early_stopping_method
+    )
+    with blocos_esperados(len(numeros)):
+        resultado = lote.invoke({"input": input_text + instrucoes_itens(numeros)})
+    blocos = dividir_por_item(resultado.get("output", ""))
+    return resultado, {numero: blocos.get(numero, "") for numero in numeros}
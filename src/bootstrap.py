@@ -0,0 +1,42 @@
+"""
+Inicialização do ambiente compartilhada pelos módulos
+
+CONCEITO - One-Time Initialization:
+Antes, cada agent chamava `load_dotenv()` e acrescentava o diretório `src`
+ao `sys.path` ao ser importado: seis leituras do `.env` e seis entradas
+duplicadas no path. Aqui as duas operações acontecem uma única vez por
+processo, não importa quantos módulos as peçam.
+"""
+
+import os
+import sys
+import threading
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_env_loaded = False
+_env_lock = threading.Lock()
+
+
+def ensure_on_path(path: str = SRC_DIR):
+    """Acrescenta `path` ao sys.path apenas se ainda não estiver lá"""
+    if path not in sys.path:
+        sys.path.append(path)
+
+
+def load_env():
+    """
+    Carrega o `.env` uma única vez por processo
+
+    Variáveis já definidas no ambiente não são sobrescritas.
+    """
+    global _env_loaded
+
+    if _env_loaded:
+        return
+
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
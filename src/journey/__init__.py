@@ -0,0 +1,61 @@
+"""
+Módulo de suporte à execução de jornadas
+
+CONCEITO - Journey Infrastructure:
+Componentes usados pelo orquestrador que não são agents nem tools:
+filas, registros e políticas que envolvem a jornada como um todo.
+"""
+
+from .analytics import JourneyAnalyticsStore, get_analytics_store
+from .compensation import JourneySaga, journey_saga, current_saga, liberar_reservas_orfas
+from .deferred_queue import DeferredJourneyQueue, get_deferred_queue
+from .itens import itens_do_protocolo, protocolo_multi_item, protocolo_do_item, decisao_agregada
+from .journey_log import (
+    LogSink,
+    NullLogSink,
+    JsonlLogSink,
+    JourneyLog,
+    JourneyHistory,
+    get_journey_history,
+    get_default_log_sink
+)
+from .report_store import SegmentedReportStore, get_report_store
+from .results import StageResult, JourneyResult, RawRetentionPolicy, resumir_protocolo
+from .single_flight import SingleFlight, get_single_flight, chave_jornada, hash_conteudo
+from .scheduler import PRIORIDADES, SchedulingPolicy, PriorityJourneyScheduler, normalizar_prioridade
+
+__all__ = [
+    'JourneySaga',
+    'journey_saga',
+    'current_saga',
+    'liberar_reservas_orfas',
+    'itens_do_protocolo',
+    'protocolo_multi_item',
+    'protocolo_do_item',
+    'decisao_agregada',
+    'DeferredJourneyQueue',
+    'get_deferred_queue',
+    'LogSink',
+    'NullLogSink',
+    'JsonlLogSink',
+    'JourneyLog',
+    'JourneyHistory',
+    'get_journey_history',
+    'get_default_log_sink',
+    'StageResult',
+    'JourneyResult',
+    'RawRetentionPolicy',
+    'resumir_protocolo',
+    'SegmentedReportStore',
+    'get_report_store',
+    'JourneyAnalyticsStore',
+    'get_analytics_store',
+    'SingleFlight',
+    'get_single_flight',
+    'chave_jornada',
+    'hash_conteudo',
+    'PRIORIDADES',
+    'SchedulingPolicy',
+    'PriorityJourneyScheduler',
+    'normalizar_prioridade'
+]
@@ -0,0 +1,263 @@
+"""
+Admissão de protocolos antes das etapas com LLM
+
+CONCEITO - Admission Gate:
+Protocolos com lixo (CPF malformado, sem `produto_original`, data inválida)
+entravam no CustomerValidatorAgent e gastavam uma chamada de LLM para serem
+rejeitados. Aqui o protocolo é validado contra um schema pydantic, com
+dígitos verificadores do CPF e sintaxe do email, em microssegundos. O
+protocolo inválido é rejeitado com um motivo estruturado (campo + erro) e
+nunca chega aos agents.
+
+CONCEITO - Bulk Validation:
+Para arquivos de lote, `validar_lote` passa cada protocolo pelo mesmo schema
+pydantic, mas sem as duas regras caras por linha: os CPFs viram uma matriz
+de dígitos (n x 11) e os dois dígitos verificadores são calculados para
+todos de uma vez com produtos matriciais; as datas de compra, já convertidas
+pelo schema, são comparadas com a data de referência num único array
+datetime64. Protocolos reprovados pelo schema são revalidados pelo caminho
+escalar, então o lote e `validar_protocolo` aceitam e reprovam exatamente
+os mesmos protocolos, com os mesmos motivos.
+
+Protocolos com vários itens (journey/itens.py) são validados item a item;
+os erros de um item vêm com o prefixo "itens.<n>." no campo.
+
+pydantic e NumPy só são importados na primeira validação.
+"""
+
+import os
+import re
+import sys
+from datetime import date
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from journey.itens import CAMPOS_ITEM, itens_do_protocolo, protocolo_do_item
+
+if TYPE_CHECKING:
+    import numpy as np
+
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[A-Za-z]{2,}$")
+
+# Separadores aceitos na formatação do CPF (123.456.789-09)
+_SEPARADORES_CPF = str.maketrans("", "", ".-/ ")
+
+_PESOS_DV1 = tuple(range(10, 1, -1))
+_PESOS_DV2 = tuple(range(11, 1, -1))
+
+
+def cpf_valido(cpf: str) -> bool:
+    """CPF com 11 dígitos, não repetidos e com os dois dígitos verificadores corretos"""
+    digitos = [int(c) for c in str(cpf or "") if c.isdigit()]
+    if len(digitos) != 11 or len(set(digitos)) == 1:
+        return False
+    for posicao, pesos in ((9, _PESOS_DV1), (10, _PESOS_DV2)):
+        resto = sum(d * p for d, p in zip(digitos, pesos)) * 10 % 11
+        if resto % 10 != digitos[posicao]:
+            return False
+    return True
+
+
+def email_valido(email: str) -> bool:
+    return bool(EMAIL_RE.match(str(email or "").strip()))
+
+
+_schema = None
+
+# Contexto de validação em que CPF e data da compra ficam para o lote
+_CONTEXTO_LOTE = {"lote": True}
+
+
+def _em_lote(info) -> bool:
+    return bool(info.context and info.context.get("lote"))
+
+
+def _protocolo_schema():
+    """Modelos pydantic, criados na primeira validação"""
+    global _schema
+
+    if _schema is not None:
+        return _schema
+
+    from pydantic import BaseModel, ConfigDict, Field, ValidationInfo, field_validator
+
+    class ClienteSchema(BaseModel):
+        model_config = ConfigDict(extra="allow")
+
+        cpf: str
+        nome: str = Field(min_length=3)
+        email: str
+
+        @field_validator("cpf")
+        @classmethod
+        def _cpf(cls, valor: str, info: ValidationInfo) -> str:
+            # No lote os dígitos verificadores são conferidos em cpfs_validos
+            if not _em_lote(info) and not cpf_valido(valor):
+                raise ValueError("CPF inválido (dígitos verificadores não conferem)")
+            return valor
+
+        @field_validator("email")
+        @classmethod
+        def _email(cls, valor: str) -> str:
+            if not email_valido(valor):
+                raise ValueError("email com formato inválido")
+            return valor
+
+    class ProdutoOriginalSchema(BaseModel):
+        model_config = ConfigDict(extra="allow")
+
+        codigo: str = Field(min_length=1)
+        data_compra: date
+        valor_pago: Optional[float] = Field(default=None, ge=0)
+
+        @field_validator("data_compra")
+        @classmethod
+        def _data(cls, valor: date, info: ValidationInfo) -> date:
+            if not _em_lote(info) and valor > date.today():
+                raise ValueError("data da compra no futuro")
+            return valor
+
+    class ProtocoloSchema(BaseModel):
+        model_config = ConfigDict(extra="allow")
+
+        protocolo: str = Field(min_length=1)
+        cliente: ClienteSchema
+        produto_original: ProdutoOriginalSchema
+        motivo_troca: str = Field(min_length=1)
+        tipo_troca_desejado: str = Field(min_length=1)
+
+    _schema = ProtocoloSchema
+    return _schema
+
+
+def _motivo(erros: List[Dict[str, str]]) -> str:
+    return "Protocolo inválido: " + "; ".join(f"{e['campo']}: {e['erro']}" for e in erros)
+
+
+def _erros_schema(protocolo_data: Any, contexto: Optional[dict] = None) -> List[Dict[str, str]]:
+    return _validar_schema(protocolo_data, contexto)[1]
+
+
+def _validar_schema(protocolo_data: Any, contexto: Optional[dict] = None) -> tuple:
+    """(modelo ou None, erros) do protocolo no schema pydantic"""
+    from pydantic import ValidationError
+
+    try:
+        return _protocolo_schema().model_validate(protocolo_data, context=contexto), []
+    except ValidationError as e:
+        return None, [
+            {
+                "campo": ".".join(str(parte) for parte in erro["loc"]) or "protocolo",
+                # Mensagens dos nossos validadores vêm com o prefixo "Value error, "
+                "erro": erro["msg"].replace("Value error, ", "")
+            }
+            for erro in e.errors()
+        ]
+
+
+def _erros_itens(protocolo_data: dict) -> List[Dict[str, str]]:
+    """Cada item validado como um protocolo de item único"""
+    erros: List[Dict[str, str]] = []
+    for item, bruto in zip(itens_do_protocolo(protocolo_data), protocolo_data["itens"]):
+        if not isinstance(bruto, dict):
+            erros.append({"campo": f"itens.{item['item']}", "erro": "item deve ser um objeto"})
+            continue
+        for erro in _erros_schema(protocolo_do_item(protocolo_data, item)):
+            if erro["campo"].split(".")[0] in CAMPOS_ITEM:
+                erro["campo"] = f"itens.{item['item']}.{erro['campo']}"
+            # Erros fora dos itens (ex: CPF) se repetiriam em todos eles
+            if erro not in erros:
+                erros.append(erro)
+    return erros
+
+
+def validar_protocolo(protocolo_data: Any) -> Optional[Dict[str, Any]]:
+    """
+    Valida um protocolo antes da jornada
+
+    Returns:
+        None se válido, ou {"motivo": str, "erros": [{"campo", "erro"}]}
+    """
+    if isinstance(protocolo_data, dict) and isinstance(protocolo_data.get("itens"), list) and protocolo_data["itens"]:
+        erros = _erros_itens(protocolo_data)
+    else:
+        erros = _erros_schema(protocolo_data)
+    return {"motivo": _motivo(erros), "erros": erros} if erros else None
+
+
+# ----------------------------------------------------------------------
+# Validação em lote
+# ----------------------------------------------------------------------
+
+def cpfs_validos(cpfs: Sequence[Optional[str]]) -> "np.ndarray":
+    """Dígitos verificadores de muitos CPFs de uma vez (array bool, mesmas regras de `cpf_valido`)"""
+    import numpy as np
+
+    digitos_cpf = [[int(c) for c in str(cpf or "") if c.isdigit()] for cpf in cpfs]
+    tamanho_ok = np.array([len(d) == 11 for d in digitos_cpf], dtype=bool)
+    if not len(digitos_cpf):
+        return tamanho_ok
+
+    # Matriz n x 11 de dígitos (CPFs malformados viram zeros e já estão reprovados)
+    digitos = np.array([d if ok else [0] * 11 for d, ok in zip(digitos_cpf, tamanho_ok)], dtype=np.int32)
+
+    dv1 = (digitos[:, :9] @ np.array(_PESOS_DV1)) * 10 % 11 % 10
+    dv2 = (digitos[:, :10] @ np.array(_PESOS_DV2)) * 10 % 11 % 10
+    repetidos = (digitos == digitos[:, :1]).all(axis=1)
+
+    return tamanho_ok & ~repetidos & (dv1 == digitos[:, 9]) & (dv2 == digitos[:, 10])
+
+
+def validar_lote(protocolos: Sequence[dict], hoje: Optional[date] = None) -> Dict[str, "np.ndarray"]:
+    """
+    Validação de um lote de protocolos
+
+    Cada protocolo passa pelo schema de `validar_protocolo`; os dígitos
+    verificadores do CPF e a data da compra no futuro são verificados
+    para o lote inteiro em arrays NumPy.
+
+    Returns:
+        {"valido": array bool, "campo", "erro" e "motivo": arrays de str ("" nos válidos),
+         "erros": lista com os erros de cada protocolo, como em `validar_protocolo`}
+    """
+    import numpy as np
+
+    n = len(protocolos)
+    erros: List[List[Dict[str, str]]] = [[] for _ in range(n)]
+
+    # Linhas aprovadas pelo schema sem as regras vetorizadas
+    aprovados: List[int] = []
+    cpfs: List[str] = []
+    datas: List[date] = []
+    for i, protocolo_data in enumerate(protocolos):
+        if isinstance(protocolo_data, dict) and isinstance(protocolo_data.get("itens"), list) and protocolo_data["itens"]:
+            # Protocolos com vários itens (raros nos lotes) são validados item a item
+            erros[i] = _erros_itens(protocolo_data)
+            continue
+        modelo, erros_linha = _validar_schema(protocolo_data, _CONTEXTO_LOTE)
+        if modelo is None:
+            # Reprovado: o caminho escalar reporta todos os erros, inclusive CPF e data
+            erros[i] = _erros_schema(protocolo_data)
+            continue
+        aprovados.append(i)
+        cpfs.append(modelo.cliente.cpf)
+        datas.append(modelo.produto_original.data_compra)
+
+    if aprovados:
+        cpf_ok = cpfs_validos(cpfs)
+        futuro = np.array(datas, dtype="datetime64[D]") > np.datetime64(hoje or date.today(), "D")
+        for i, ok, no_futuro in zip(aprovados, cpf_ok, futuro):
+            # Mesma ordem dos campos no schema
+            if not ok:
+                erros[i].append({"campo": "cliente.cpf", "erro": "CPF inválido (dígitos verificadores não conferem)"})
+            if no_futuro:
+                erros[i].append({"campo": "produto_original.data_compra", "erro": "data da compra no futuro"})
+
+    valido = np.array([not e for e in erros], dtype=bool)
+    campo = np.array([e[0]["campo"] if e else "" for e in erros], dtype=object)
+    erro = np.array([e[0]["erro"] if e else "" for e in erros], dtype=object)
+    motivo = np.array([_motivo(e) if e else "" for e in erros], dtype=object)
+    return {"valido": valido, "campo": campo, "erro": erro, "motivo": motivo, "erros": erros}
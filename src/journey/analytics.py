@@ -0,0 +1,533 @@
+"""
+Base analítica das jornadas em SQLite
+
+CONCEITO - Normalized Analytics Store:
+Os relatórios JSON são ótimos para auditoria de uma jornada, mas péssimos
+para perguntas agregadas ("taxa de rejeição por categoria na última semana",
+"qual etapa mais rejeita"). Cada jornada concluída é gravada em tabelas
+normalizadas:
+- jornadas: uma linha por jornada (protocolo, CPF, categoria, decisão, dia)
+- etapas: uma linha por etapa executada (status, duração, saída do agent)
+- reservas: reservas de estoque criadas durante a jornada (SKU)
+
+CONCEITO - Covering Indexes:
+Os índices cobrem os filtros e agrupamentos das consultas (dia, categoria,
+decisão, etapa de interrupção), então os agregados são respondidos lendo
+só o índice, em milissegundos mesmo com milhões de jornadas.
+
+CONCEITO - Pre-Aggregated Histogram:
+Percentis de latência não saem de um índice sem ordenar todas as durações
+do período. Cada etapa gravada incrementa também um contador em
+`latencia_etapas` (dia, etapa, faixa logarítmica de 2%): o percentil é
+lido de algumas centenas de contadores por etapa, qualquer que seja o
+número de jornadas, com erro de no máximo 1% do valor.
+
+CONCEITO - Full-Text Search:
+Uma tabela FTS5 indexa as saídas dos agents, permitindo buscas como
+"tela quebrada" ou "fora do prazo" sem varrer os textos.
+
+CONCEITO - Schema Migrations:
+Colunas novas entram como migrações numeradas (PRAGMA user_version), então
+bancos criados por versões anteriores são atualizados ao abrir.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jornadas (
+    id INTEGER PRIMARY KEY,
+    protocolo TEXT NOT NULL,
+    cpf TEXT,
+    categoria TEXT,
+    tipo_troca TEXT,
+    motivo_troca TEXT,
+    produto_original TEXT,
+    produto_desejado TEXT,
+    prioridade TEXT,
+    decisao TEXT,
+    etapa_interrupcao TEXT,
+    motivo_interrupcao TEXT,
+    erro TEXT,
+    data_inicio TEXT,
+    data_fim TEXT,
+    dia TEXT,
+    duracao_ms REAL
+);
+
+CREATE TABLE IF NOT EXISTS etapas (
+    id INTEGER PRIMARY KEY,
+    jornada_id INTEGER NOT NULL REFERENCES jornadas(id),
+    ordem INTEGER NOT NULL,
+    etapa TEXT NOT NULL,
+    agent TEXT,
+    status TEXT,
+    duracao_ms REAL,
+    output TEXT
+);
+
+CREATE TABLE IF NOT EXISTS reservas (
+    id INTEGER PRIMARY KEY,
+    jornada_id INTEGER NOT NULL REFERENCES jornadas(id),
+    reserva_id TEXT NOT NULL,
+    sku TEXT,
+    dia TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_jornadas_protocolo ON jornadas(protocolo);
+CREATE INDEX IF NOT EXISTS idx_jornadas_cpf ON jornadas(cpf, dia);
+CREATE INDEX IF NOT EXISTS idx_jornadas_decisao ON jornadas(decisao, dia);
+CREATE INDEX IF NOT EXISTS idx_jornadas_dia ON jornadas(dia, categoria, decisao);
+CREATE INDEX IF NOT EXISTS idx_jornadas_interrupcao ON jornadas(dia, etapa_interrupcao);
+CREATE INDEX IF NOT EXISTS idx_etapas_jornada ON etapas(jornada_id, ordem);
+CREATE INDEX IF NOT EXISTS idx_etapas_status ON etapas(etapa, status);
+CREATE INDEX IF NOT EXISTS idx_reservas_sku ON reservas(sku, dia);
+CREATE INDEX IF NOT EXISTS idx_reservas_id ON reservas(reserva_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS etapas_fts
+USING fts5(output, content='etapas', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+"""
+
+# Migrações aplicadas sobre o schema base, em ordem (versão, SQL)
+MIGRATIONS = [
+    (1, """
+        ALTER TABLE jornadas ADD COLUMN llm_chamadas INTEGER;
+        ALTER TABLE jornadas ADD COLUMN llm_tokens INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_etapas_latencia ON etapas(etapa, duracao_ms);
+    """),
+    (2, """
+        CREATE TABLE IF NOT EXISTS latencia_etapas (
+            dia TEXT NOT NULL,
+            etapa TEXT NOT NULL,
+            faixa INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            ordem INTEGER NOT NULL,
+            PRIMARY KEY (dia, etapa, faixa)
+        ) WITHOUT ROWID;
+        INSERT INTO latencia_etapas (dia, etapa, faixa, total, ordem)
+            SELECT j.dia, e.etapa, faixa_latencia(e.duracao_ms), COUNT(*), MIN(e.ordem)
+            FROM etapas e JOIN jornadas j ON j.id = e.jornada_id
+            WHERE e.duracao_ms IS NOT NULL
+            GROUP BY j.dia, e.etapa, faixa_latencia(e.duracao_ms);
+    """),
+]
+
+PERCENTIS = (50, 95, 99)
+
+# Razão entre os limites de faixas consecutivas do histograma de latência
+RAZAO_FAIXA = 1.02
+
+
+def faixa_latencia(duracao_ms: float) -> int:
+    """Faixa do histograma: 0 abaixo de 1 ms, depois [RAZAO^(k-1), RAZAO^k)"""
+    if duracao_ms < 1:
+        return 0
+    return int(math.log(duracao_ms) / math.log(RAZAO_FAIXA)) + 1
+
+
+def valor_faixa(faixa: int) -> float:
+    """Valor representativo da faixa (média geométrica dos limites)"""
+    if faixa <= 0:
+        return 0.0
+    return round(RAZAO_FAIXA ** (faixa - 0.5), 1)
+
+
+# Status de etapa que interrompem a jornada
+STATUS_REPROVACAO = ("reprovado", "rejeitado")
+
+
+def _etapa_interrupcao(resultado) -> Optional[str]:
+    """Etapa responsável pela rejeição (ou pelo erro/adiamento) da jornada"""
+    # Decisão parcial (protocolo com vários itens): a jornada foi até o fim
+    if resultado.decisao_final in ("aprovado", "parcial"):
+        return None
+    if resultado.extras.get("etapa_adiamento"):
+        return resultado.extras["etapa_adiamento"]
+
+    ultima = None
+    for chave, stage in resultado.etapas.items():
+        if stage is None:
+            continue
+        ultima = chave
+        if stage.status in STATUS_REPROVACAO:
+            return chave
+    return ultima
+
+
+def _reservas(resultado, estoque) -> List[tuple]:
+    """(reserva_id, SKU) das reservas da jornada: uma por item num protocolo com vários itens"""
+    itens = resultado.extras.get("itens")
+    if itens:
+        return [(item["reserva_id"], item.get("produto_desejado")) for item in itens if item.get("reserva_id")]
+    if estoque and estoque.get("reserva_id"):
+        return [(estoque.get("reserva_id"), resultado.protocolo_resumo.get("produto_desejado"))]
+    return []
+
+
+class JourneyAnalyticsStore:
+    """
+    Grava jornadas concluídas em SQLite e responde consultas agregadas
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Arquivo do banco SQLite (":memory:" para testes)
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        # Usada pela migração que preenche o histograma de latência
+        self._conn.create_function("faixa_latencia", 1, faixa_latencia, deterministic=True)
+
+        with self._lock:
+            # WAL: leitores (dashboard) não bloqueiam o orquestrador gravando
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+            try:
+                self._conn.executescript(FTS_SCHEMA)
+                self.fts_enabled = True
+            except sqlite3.OperationalError:
+                # SQLite compilado sem FTS5: a busca textual fica indisponível
+                self.fts_enabled = False
+            self._conn.commit()
+
+    def _migrate(self):
+        versao = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        for numero, sql in MIGRATIONS:
+            if numero > versao:
+                self._conn.executescript(sql)
+                self._conn.execute(f"PRAGMA user_version = {numero}")
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def record(self, resultado):
+        """
+        Grava uma jornada concluída
+
+        Args:
+            resultado: JourneyResult da jornada
+        """
+        resumo = resultado.protocolo_resumo
+        documentos = resultado.etapa("analise_documentos")
+        classificacao = resultado.etapa("classificacao_troca")
+        estoque = resultado.etapa("validacao_estoque")
+        dia = (resultado.data_inicio or "")[:10]
+
+        duracao_ms = None
+        if resultado.data_inicio and resultado.data_fim:
+            inicio = datetime.fromisoformat(resultado.data_inicio)
+            fim = datetime.fromisoformat(resultado.data_fim)
+            duracao_ms = round((fim - inicio).total_seconds() * 1000, 1)
+
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO jornadas (
+                    protocolo, cpf, categoria, tipo_troca, motivo_troca, produto_original,
+                    produto_desejado, prioridade, decisao, etapa_interrupcao, motivo_interrupcao,
+                    erro, data_inicio, data_fim, dia, duracao_ms, llm_chamadas, llm_tokens
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    resultado.protocolo,
+                    resumo.get("cpf"),
+                    documentos.get("categoria") if documentos else None,
+                    classificacao.get("tipo_troca_classificado") if classificacao else resumo.get("tipo_troca_desejado"),
+                    resumo.get("motivo_troca"),
+                    resumo.get("produto_original"),
+                    resumo.get("produto_desejado"),
+                    resumo.get("prioridade"),
+                    resultado.decisao_final,
+                    _etapa_interrupcao(resultado),
+                    resultado.motivo_interrupcao,
+                    resultado.erro,
+                    resultado.data_inicio,
+                    resultado.data_fim,
+                    dia,
+                    duracao_ms,
+                    resultado.llm_chamadas,
+                    resultado.llm_tokens
+                )
+            )
+            jornada_id = cursor.lastrowid
+
+            for ordem, (chave, stage) in enumerate(resultado.etapas.items()):
+                if stage is None:
+                    continue
+                cursor = self._conn.execute(
+                    "INSERT INTO etapas (jornada_id, ordem, etapa, agent, status, duracao_ms, output) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (jornada_id, ordem, chave, stage.agent, stage.status, stage.duracao_ms, stage.output)
+                )
+                if self.fts_enabled and stage.output:
+                    self._conn.execute(
+                        "INSERT INTO etapas_fts (rowid, output) VALUES (?, ?)",
+                        (cursor.lastrowid, stage.output)
+                    )
+                if stage.duracao_ms is not None:
+                    self._conn.execute(
+                        "INSERT INTO latencia_etapas (dia, etapa, faixa, total, ordem) VALUES (?, ?, ?, 1, ?) "
+                        "ON CONFLICT (dia, etapa, faixa) DO UPDATE SET "
+                        "total = total + 1, ordem = MIN(ordem, excluded.ordem)",
+                        (dia, chave, faixa_latencia(stage.duracao_ms), ordem)
+                    )
+
+            self._conn.executemany(
+                "INSERT INTO reservas (jornada_id, reserva_id, sku, dia) VALUES (?, ?, ?, ?)",
+                [(jornada_id, reserva_id, sku, dia) for reserva_id, sku in _reservas(resultado, estoque)]
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(linha) for linha in self._conn.execute(sql, params)]
+
+    @staticmethod
+    def _periodo(desde: Optional[str], ate: Optional[str]) -> tuple:
+        """Intervalo de dias (AAAA-MM-DD), inclusivo; aberto quando não informado"""
+        return (desde or "0000-00-00", ate or "9999-12-31")
+
+    def taxa_rejeicao_por_categoria(self, desde: Optional[str] = None,
+                                    ate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Total, rejeitadas e taxa de rejeição por categoria de produto"""
+        return self._query(
+            """
+            SELECT categoria,
+                   COUNT(*) AS total,
+                   SUM(decisao = 'rejeitado') AS rejeitadas,
+                   ROUND(1.0 * SUM(decisao = 'rejeitado') / COUNT(*), 4) AS taxa
+            FROM jornadas
+            WHERE dia BETWEEN ? AND ?
+            GROUP BY categoria
+            ORDER BY taxa DESC
+            """,
+            self._periodo(desde, ate)
+        )
+
+    def rejeicoes_por_etapa(self, desde: Optional[str] = None,
+                            ate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Quantas jornadas cada etapa rejeitou"""
+        return self._query(
+            """
+            SELECT etapa_interrupcao AS etapa, COUNT(*) AS rejeicoes
+            FROM jornadas
+            WHERE dia BETWEEN ? AND ? AND decisao = 'rejeitado'
+            GROUP BY etapa_interrupcao
+            ORDER BY rejeicoes DESC
+            """,
+            self._periodo(desde, ate)
+        )
+
+    def decisoes_por_dia(self, desde: Optional[str] = None,
+                         ate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Contagem de decisões (aprovado, rejeitado, erro, adiado) por dia"""
+        return self._query(
+            """
+            SELECT dia, decisao, COUNT(*) AS total
+            FROM jornadas
+            WHERE dia BETWEEN ? AND ?
+            GROUP BY dia, decisao
+            ORDER BY dia, decisao
+            """,
+            self._periodo(desde, ate)
+        )
+
+    def jornadas_do_cliente(self, cpf: str, limite: int = 50) -> List[Dict[str, Any]]:
+        """Jornadas mais recentes de um CPF"""
+        return self._query(
+            """
+            SELECT protocolo, decisao, categoria, etapa_interrupcao, data_inicio
+            FROM jornadas
+            WHERE cpf = ?
+            ORDER BY dia DESC, id DESC
+            LIMIT ?
+            """,
+            (cpf, limite)
+        )
+
+    def jornada(self, protocolo: str) -> Optional[Dict[str, Any]]:
+        """Última execução de um protocolo, com as suas etapas"""
+        linhas = self._query(
+            "SELECT * FROM jornadas WHERE protocolo = ? ORDER BY id DESC LIMIT 1",
+            (protocolo,)
+        )
+        if not linhas:
+            return None
+
+        jornada = linhas[0]
+        jornada["etapas"] = self._query(
+            "SELECT etapa, agent, status, duracao_ms FROM etapas WHERE jornada_id = ? ORDER BY ordem",
+            (jornada["id"],)
+        )
+        return jornada
+
+    def reservas_por_sku(self, sku: str, desde: Optional[str] = None,
+                         ate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Reservas criadas para um SKU"""
+        return self._query(
+            """
+            SELECT r.reserva_id, r.dia, j.protocolo, j.decisao
+            FROM reservas r JOIN jornadas j ON j.id = r.jornada_id
+            WHERE r.sku = ? AND r.dia BETWEEN ? AND ?
+            ORDER BY r.dia DESC
+            """,
+            (sku, *self._periodo(desde, ate))
+        )
+
+    def latencia_por_etapa(self, desde: Optional[str] = None,
+                           ate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Percentis (p50, p95, p99) da duração de cada etapa, em ms
+
+        Lidos do histograma pré-agregado (`latencia_etapas`): o valor é o
+        da faixa logarítmica que contém o percentil (erro de até 1%).
+        """
+        faixas = self._query(
+            """
+            SELECT etapa, faixa, SUM(total) AS total, MIN(ordem) AS ordem
+            FROM latencia_etapas
+            WHERE dia BETWEEN ? AND ?
+            GROUP BY etapa, faixa
+            ORDER BY etapa, faixa
+            """,
+            self._periodo(desde, ate)
+        )
+
+        por_etapa: Dict[str, List[Dict[str, Any]]] = {}
+        for faixa in faixas:
+            por_etapa.setdefault(faixa["etapa"], []).append(faixa)
+
+        linhas = []
+        for etapa, contadores in sorted(por_etapa.items(), key=lambda par: min(f["ordem"] for f in par[1])):
+            total = sum(f["total"] for f in contadores)
+            linha = {"etapa": etapa, "total": total}
+            for p in PERCENTIS:
+                # Mesma posição do percentil de antes: a k-ésima duração em ordem crescente
+                posicao = int((total - 1) * p / 100)
+                acumulado = 0
+                for f in contadores:
+                    acumulado += f["total"]
+                    if acumulado > posicao:
+                        linha[f"p{p}"] = valor_faixa(f["faixa"])
+                        break
+            linhas.append(linha)
+        return linhas
+
+    def histograma_latencia(self, etapa: str, desde: Optional[str] = None, ate: Optional[str] = None,
+                            largura_ms: float = 1000.0) -> List[Dict[str, Any]]:
+        """Distribuição das durações de uma etapa em faixas de `largura_ms`"""
+        return self._query(
+            """
+            SELECT CAST(e.duracao_ms / ? AS INTEGER) * ? AS faixa_ms, COUNT(*) AS total
+            FROM etapas e JOIN jornadas j ON j.id = e.jornada_id
+            WHERE e.etapa = ? AND j.dia BETWEEN ? AND ? AND e.duracao_ms IS NOT NULL
+            GROUP BY faixa_ms
+            ORDER BY faixa_ms
+            """,
+            (largura_ms, largura_ms, etapa, *self._periodo(desde, ate))
+        )
+
+    def uso_llm(self, desde: Optional[str] = None, ate: Optional[str] = None) -> Dict[str, Any]:
+        """Chamadas e tokens de LLM por jornada (média e máximo)"""
+        linhas = self._query(
+            """
+            SELECT COUNT(*) AS jornadas,
+                   AVG(llm_chamadas) AS chamadas_media,
+                   MAX(llm_chamadas) AS chamadas_max,
+                   AVG(llm_tokens) AS tokens_media,
+                   MAX(llm_tokens) AS tokens_max,
+                   SUM(llm_tokens) AS tokens_total
+            FROM jornadas
+            WHERE dia BETWEEN ? AND ? AND llm_chamadas IS NOT NULL
+            """,
+            self._periodo(desde, ate)
+        )
+        return linhas[0]
+
+    def funil_por_etapa(self, desde: Optional[str] = None,
+                        ate: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Funil da jornada: quantas jornadas chegaram a cada etapa e quantas ela reprovou
+        """
+        return self._query(
+            f"""
+            SELECT e.etapa,
+                   COUNT(*) AS entradas,
+                   SUM(e.status IN ({", ".join("?" for _ in STATUS_REPROVACAO)})) AS reprovadas,
+                   MIN(e.ordem) AS ordem
+            FROM etapas e JOIN jornadas j ON j.id = e.jornada_id
+            WHERE j.dia BETWEEN ? AND ?
+            GROUP BY e.etapa
+            ORDER BY ordem
+            """,
+            (*STATUS_REPROVACAO, *self._periodo(desde, ate))
+        )
+
+    def buscar_outputs(self, consulta: str, limite: int = 20) -> List[Dict[str, Any]]:
+        """
+        Busca textual nas saídas dos agents (sintaxe FTS5: termos, "frases", OR, NOT)
+
+        Raises:
+            RuntimeError: se o SQLite não tiver suporte a FTS5
+        """
+        if not self.fts_enabled:
+            raise RuntimeError("Busca textual indisponível: SQLite sem suporte a FTS5")
+
+        return self._query(
+            """
+            SELECT j.protocolo, e.etapa, e.status,
+                   snippet(etapas_fts, 0, '[', ']', '…', 12) AS trecho
+            FROM etapas_fts
+            JOIN etapas e ON e.id = etapas_fts.rowid
+            JOIN jornadas j ON j.id = e.jornada_id
+            WHERE etapas_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (consulta, limite)
+        )
+
+
+_default_store: Optional[JourneyAnalyticsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_analytics_store() -> Optional[JourneyAnalyticsStore]:
+    """
+    Base analítica compartilhada do processo
+
+    Opcional: só existe com JOURNEY_ANALYTICS_DB definido.
+    """
+    global _default_store
+
+    caminho = os.getenv("JOURNEY_ANALYTICS_DB")
+    if not caminho:
+        return None
+
+    with _store_lock:
+        if _default_store is None:
+            _default_store = JourneyAnalyticsStore(caminho)
+        return _default_store
@@ -0,0 +1,181 @@
+"""
+Compensação de efeitos colaterais da jornada
+
+CONCEITO - Saga:
+A etapa 5 reserva o produto desejado antes de o DecisionAgent decidir. Se a
+jornada termina rejeitada, com erro ou adiada, a reserva ficava ativa e o
+estoque preso. Aqui cada jornada abre uma saga: as tools registram os
+efeitos que produzem (ex: reserva criada) junto com a ação que os desfaz,
+e o orquestrador executa as compensações, da mais recente para a mais
+antiga, quando a jornada não termina aprovada. Na aprovação, a saga é
+concluída e os efeitos permanecem.
+
+CONCEITO - Context-Scoped Saga:
+Como em llm/usage.py, um ContextVar guarda a saga da jornada em execução:
+a tool de reserva não sabe de qual jornada faz parte, e jornadas
+simultâneas (em threads diferentes) não se misturam.
+
+Jornadas interrompidas sem chegar ao fim (worker morto, lease expirado) não
+executam a saga. As reservas delas são liberadas por `liberar_reservas_orfas`
+a partir do estado durável: cada reserva feita num worker guarda a sua
+origem (job e tentativa, no livro de reservas), e a fila de jobs diz se
+aquela tentativa ainda está em execução ou terminou mantendo a reserva.
+"""
+
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Decisões finais que desfazem os efeitos da jornada
+DECISOES_COMPENSADAS = ("rejeitado", "erro", "adiado")
+
+
+class JourneySaga:
+    """Efeitos colaterais de uma jornada e as ações que os desfazem"""
+
+    def __init__(self, protocolo: Optional[str]):
+        self.protocolo = protocolo
+        self._efeitos: List[Dict[str, Any]] = []
+
+    def registrar(self, tipo: str, dados: Dict[str, Any], compensar: Callable[[], Any]):
+        """
+        Registra um efeito e a sua compensação
+
+        Args:
+            tipo: Tipo do efeito (ex: "reserva")
+            dados: Identificação do efeito (vai para o resultado da jornada)
+            compensar: Desfaz o efeito; deve ser idempotente
+        """
+        self._efeitos.append({"tipo": tipo, "dados": dados, "compensar": compensar})
+
+    @property
+    def pendentes(self) -> List[Dict[str, Any]]:
+        """Efeitos registrados e ainda não compensados nem concluídos"""
+        return [{"tipo": e["tipo"], **e["dados"]} for e in self._efeitos]
+
+    def compensar(self, motivo: str,
+                  filtro: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        """
+        Desfaz os efeitos, do mais recente para o mais antigo
+
+        Uma compensação que falha não impede as demais; a falha fica no retorno.
+
+        Args:
+            motivo: Motivo da compensação (para o log)
+            filtro: Desfaz só os efeitos aceitos ({"tipo", ...dados} -> bool); os
+                demais continuam pendentes. Ex: reservas dos itens rejeitados de
+                um protocolo com vários itens
+
+        Returns:
+            [{"tipo", ...dados, "status": "compensado" | "falhou", "erro"?}]
+        """
+        relatorio = []
+        mantidos = []
+        while self._efeitos:
+            efeito = self._efeitos.pop()
+            item = {"tipo": efeito["tipo"], **efeito["dados"]}
+            if filtro is not None and not filtro(item):
+                mantidos.append(efeito)
+                continue
+            try:
+                efeito["compensar"]()
+                item["status"] = "compensado"
+            except Exception as e:
+                item["status"] = "falhou"
+                item["erro"] = str(e)
+                logger.error(f"Falha ao compensar {efeito['tipo']} {efeito['dados']}: {e}",
+                             extra={"protocolo": self.protocolo})
+            relatorio.append(item)
+        self._efeitos = mantidos[::-1]
+
+        if relatorio:
+            logger.info(f"↩️  {len(relatorio)} efeito(s) compensado(s) ({motivo})", extra={"protocolo": self.protocolo})
+        return relatorio
+
+    def concluir(self):
+        """Mantém os efeitos (jornada aprovada)"""
+        self._efeitos.clear()
+
+
+_current_saga: ContextVar[Optional[JourneySaga]] = ContextVar("journey_saga", default=None)
+
+
+@contextmanager
+def journey_saga(protocolo: Optional[str]) -> Iterator[JourneySaga]:
+    """
+    Abre a saga de uma jornada
+
+    Se a jornada sai por exceção, os efeitos pendentes são compensados antes
+    de a exceção seguir adiante.
+    """
+    saga = JourneySaga(protocolo)
+    token = _current_saga.set(saga)
+    try:
+        yield saga
+    except BaseException:
+        saga.compensar("exceção na jornada")
+        raise
+    finally:
+        _current_saga.reset(token)
+
+
+def current_saga() -> Optional[JourneySaga]:
+    """Saga da jornada em execução, ou None fora de uma jornada"""
+    return _current_saga.get()
+
+
+def _cancelar_reserva(reserva_id: str):
+    from mocks.api_estoque import APIEstoque
+
+    resposta = APIEstoque.cancelar_reserva(reserva_id)
+    if resposta["status"] != "success":
+        raise RuntimeError(resposta.get("message", "cancelamento recusado"))
+
+
+def registrar_reserva(reserva_id: str, codigo_produto: str):
+    """Registra uma reserva de estoque na saga atual (sem saga, não faz nada)"""
+    saga = _current_saga.get()
+    if saga is not None:
+        saga.registrar(
+            "reserva",
+            {"reserva_id": reserva_id, "codigo_produto": codigo_produto},
+            lambda: _cancelar_reserva(reserva_id)
+        )
+
+
+def liberar_reservas_orfas(orfa: Callable[[str], bool]) -> List[str]:
+    """
+    Cancela as reservas ativas de execuções que não terminaram
+
+    Percorre as reservas do próprio processo (inclusive as recuperadas do
+    livro de um worker morto) e os livros de processos encerrados. Uma
+    reserva sem origem (feita fora de um worker) nunca é órfã.
+
+    Deve ser chamada sem jornada em execução no processo: a tentativa em
+    andamento ainda não terminou, mas não é "a tentativa ativa" do job se o
+    lease dela expirou.
+
+    Args:
+        orfa: Recebe a origem da reserva e diz se a execução que a fez
+            terminou sem mantê-la (ex: JobQueue.reserva_orfa)
+
+    Returns:
+        IDs das reservas canceladas
+    """
+    from mocks.api_estoque import APIEstoque
+
+    def selecionar(reserva: Dict[str, Any]) -> bool:
+        return bool(reserva.get("origem")) and orfa(reserva["origem"])
+
+    canceladas = []
+    for reserva in APIEstoque.reservas_ativas():
+        if selecionar(reserva) and APIEstoque.cancelar_reserva(reserva["id"])["status"] == "success":
+            canceladas.append(reserva["id"])
+    canceladas.extend(APIEstoque.cancelar_em_livros_livres(selecionar))
+
+    if canceladas:
+        logger.warning(f"↩️  {len(canceladas)} reserva(s) órfã(s) liberada(s)")
+    return canceladas
@@ -0,0 +1,71 @@
+"""
+Fila de jornadas adiadas
+
+CONCEITO - Deferred Work Queue:
+Quando o provedor de LLM está fora do ar (circuito aberto), não faz sentido
+manter um worker preso esperando timeouts. A jornada é registrada nesta fila
+e devolvida imediatamente como "adiada"; quando o circuito volta a aceitar
+chamadas, as jornadas adiadas são reprocessadas.
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class DeferredJourneyQueue:
+    """
+    Fila FIFO, limitada e sem duplicatas (chaveada pelo número do protocolo)
+
+    Reenvios do mesmo protocolo enquanto ele aguarda substituem a entrada
+    anterior em vez de gerar uma segunda jornada.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._items: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, protocolo_data: dict, motivo: str = "") -> bool:
+        """
+        Adia uma jornada
+
+        Returns:
+            False se a fila estiver cheia (a jornada não foi registrada)
+        """
+        chave = str(protocolo_data.get("protocolo") or id(protocolo_data))
+        with self._lock:
+            if chave not in self._items and len(self._items) >= self.max_size:
+                return False
+            self._items[chave] = {
+                "protocolo_data": protocolo_data,
+                "motivo": motivo,
+                "adiado_em": datetime.now().isoformat()
+            }
+            return True
+
+    def pop(self) -> Optional[Dict]:
+        """Remove e retorna a jornada adiada mais antiga (ou None)"""
+        with self._lock:
+            if not self._items:
+                return None
+            _, item = self._items.popitem(last=False)
+            return item
+
+    def pending(self) -> List[str]:
+        """Protocolos aguardando reprocessamento, em ordem"""
+        with self._lock:
+            return list(self._items)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+_default_queue = DeferredJourneyQueue()
+
+
+def get_deferred_queue() -> DeferredJourneyQueue:
+    """Fila compartilhada do processo (o app cria um orquestrador por requisição)"""
+    return _default_queue
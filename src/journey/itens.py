@@ -0,0 +1,70 @@
+"""
+Protocolos com vários itens
+
+CONCEITO - Multi-Item Journey:
+Um protocolo trazia um único `produto_original` e um único
+`produto_desejado`: o cliente que devolvia três produtos abria três
+protocolos, e cada um repetia a jornada inteira de seis agents (inclusive
+a validação do mesmo cliente e a análise da mesma nota fiscal). Agora o
+protocolo pode trazer uma lista `itens`. A jornada valida o cliente e os
+documentos uma vez e faz as verificações de cada item (linha da nota
+fiscal, elegibilidade, estoque) em lote: uma chamada de cada agent para
+todos os itens, com uma decisão por item.
+
+Cada item pode sobrescrever os campos de item do protocolo
+(`produto_original`, `produto_desejado`, `motivo_troca`,
+`tipo_troca_desejado`, `descricao_problema`); o que o item não informa vem
+do protocolo. Protocolos sem `itens` têm um único item, montado dos campos
+de sempre.
+"""
+
+from typing import Any, Dict, Iterable, List
+
+CAMPOS_ITEM = ("produto_original", "produto_desejado", "motivo_troca", "tipo_troca_desejado", "descricao_problema")
+
+
+def itens_do_protocolo(protocolo_data: dict) -> List[Dict[str, Any]]:
+    """
+    Itens do protocolo, numerados a partir de 1
+
+    Returns:
+        [{"item": n, "produto_original": {...}, "produto_desejado": {...}, "motivo_troca", ...}]
+    """
+    brutos = protocolo_data.get("itens")
+    if not isinstance(brutos, list) or not brutos:
+        brutos = [{}]
+
+    itens = []
+    for numero, bruto in enumerate(brutos, start=1):
+        bruto = bruto if isinstance(bruto, dict) else {}
+        item = {"item": numero}
+        for campo in CAMPOS_ITEM:
+            valor = bruto.get(campo, protocolo_data.get(campo))
+            if valor is None and campo.startswith("produto_"):
+                valor = {}
+            item[campo] = valor
+        itens.append(item)
+    return itens
+
+
+def protocolo_multi_item(protocolo_data: dict) -> bool:
+    """O protocolo traz mais de um item"""
+    itens = protocolo_data.get("itens")
+    return isinstance(itens, list) and len(itens) > 1
+
+
+def protocolo_do_item(protocolo_data: dict, item: Dict[str, Any]) -> dict:
+    """Protocolo de item único equivalente a um item (triagem, admissão, jornada de sempre)"""
+    protocolo = {chave: valor for chave, valor in protocolo_data.items() if chave != "itens"}
+    for campo in CAMPOS_ITEM:
+        protocolo[campo] = item[campo]
+    return protocolo
+
+
+def decisao_agregada(decisoes: Iterable[str]) -> str:
+    """Decisão do protocolo: aprovado (todos os itens), rejeitado (nenhum) ou parcial"""
+    decisoes = list(decisoes)
+    aprovados = sum(decisao == "aprovado" for decisao in decisoes)
+    if decisoes and aprovados == len(decisoes):
+        return "aprovado"
+    return "parcial" if aprovados else "rejeitado"
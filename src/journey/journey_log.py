@@ -0,0 +1,167 @@
+"""
+Log de jornada com escopo por execução e histórico limitado
+
+CONCEITO - Scoped Logging:
+Cada execução de jornada tem o seu próprio log. Um orquestrador reutilizado
+(por exemplo, num worker de longa duração) não acumula o log de jornadas
+anteriores, e o relatório de uma jornada contém apenas as suas etapas.
+
+CONCEITO - Ring Buffer:
+O histórico do processo guarda apenas um resumo das últimas N jornadas
+(deque com maxlen). A memória fica constante, não importa quantas jornadas
+o processo já executou.
+
+CONCEITO - Log Sink:
+Cada entrada é enviada a um "sink" plugável no momento em que é registrada
+(arquivo JSON Lines, coletor externo, etc). O detalhe completo vai para o
+sink; a memória do processo guarda só o necessário.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+
+class LogSink:
+    """
+    Interface de destino das entradas de log
+
+    Implementações devem ser thread-safe: várias jornadas podem
+    registrar etapas ao mesmo tempo.
+    """
+
+    def write(self, entry: Dict[str, Any]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NullLogSink(LogSink):
+    """Descarta as entradas (padrão)"""
+
+    def write(self, entry: Dict[str, Any]):
+        pass
+
+
+class JsonlLogSink(LogSink):
+    """
+    Grava cada entrada como uma linha JSON num arquivo (append)
+
+    CONCEITO - JSON Lines:
+    Uma entrada por linha permite escrita incremental e leitura em
+    streaming (grep, jq, pandas.read_json(lines=True)).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        diretorio = os.path.dirname(os.path.abspath(path))
+        os.makedirs(diretorio, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, entry: Dict[str, Any]):
+        linha = json.dumps(entry, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(linha + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class JourneyLog:
+    """
+    Log de uma única execução de jornada
+    """
+
+    def __init__(self, protocolo: Optional[str] = None, sink: Optional[LogSink] = None):
+        self.protocolo = protocolo
+        self.sink = sink or NullLogSink()
+        self.entries: List[Dict[str, Any]] = []
+
+    def add(self, step_name: str, status: str, details: Any):
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "protocolo": self.protocolo,
+            "step": step_name,
+            "status": status,
+            "details": details
+        }
+        self.entries.append(entry)
+        self.sink.write(entry)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+class JourneyHistory:
+    """
+    Histórico limitado (ring buffer) das jornadas concluídas no processo
+    """
+
+    def __init__(self, max_size: int = 200):
+        self._items: deque = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return self._items.maxlen
+
+    def record(self, resultado):
+        """
+        Guarda um resumo compacto da jornada (sem os detalhes das etapas)
+
+        Args:
+            resultado: JourneyResult da jornada concluída
+        """
+        resumo = {
+            "protocolo": resultado.protocolo,
+            "decisao_final": resultado.decisao_final,
+            "data_inicio": resultado.data_inicio,
+            "data_fim": resultado.data_fim,
+            "etapas": [(e["step"], e["status"]) for e in resultado.log]
+        }
+        with self._lock:
+            self._items.append(resumo)
+
+    def recent(self, n: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Resumos mais recentes primeiro"""
+        with self._lock:
+            itens = list(self._items)
+        itens.reverse()
+        return itens[:n] if n is not None else itens
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
+
+
+_default_history = JourneyHistory(max_size=int(os.getenv("JOURNEY_HISTORY_SIZE", "200")))
+_default_sink: Optional[LogSink] = None
+_sink_lock = threading.Lock()
+
+
+def get_journey_history() -> JourneyHistory:
+    """Histórico compartilhado do processo (o app cria um orquestrador por requisição)"""
+    return _default_history
+
+
+def get_default_log_sink() -> LogSink:
+    """
+    Sink padrão do processo
+
+    Com JOURNEY_LOG_PATH definido, as entradas vão para esse arquivo JSON Lines;
+    caso contrário são descartadas (o relatório da jornada continua completo).
+    """
+    global _default_sink
+
+    with _sink_lock:
+        if _default_sink is None:
+            caminho = os.getenv("JOURNEY_LOG_PATH")
+            _default_sink = JsonlLogSink(caminho) if caminho else NullLogSink()
+        return _default_sink
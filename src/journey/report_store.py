@@ -0,0 +1,312 @@
+"""
+Armazenamento de relatórios de jornada em segmentos comprimidos
+
+CONCEITO - Append-Only Segments:
+Um arquivo JSON por jornada gera milhões de arquivos pequenos e listagens
+de diretório lentas. Aqui os relatórios são acrescentados como JSON Lines
+em poucos arquivos grandes ("segmentos"), que giram ao atingir um tamanho
+máximo. Nada é reescrito: só se acrescenta ao final.
+
+CONCEITO - Compressed Blocks:
+Os relatórios são agrupados em blocos; cada bloco é um membro gzip (ou um
+stream xz) independente. Um segmento inteiro continua legível com
+`zcat`/`xzcat`, e um bloco pode ser descomprimido sozinho a partir do seu
+offset, sem ler o segmento do início.
+
+CONCEITO - Group Commit:
+O fsync é caro. Em vez de um fsync por jornada, os relatórios ficam num
+buffer e são gravados em lote (a cada `batch_size` relatórios ou
+`flush_interval` segundos), com um único fsync por lote. Uma thread de
+fundo grava o buffer quando o relatório mais antigo nele passa de
+`flush_interval`: num processo com pouco tráfego os relatórios não esperam
+o próximo `append` (nem o encerramento) para chegar ao disco.
+
+CONCEITO - Multi-Process Writers:
+Os workers do serviço gravam no mesmo diretório. A gravação de um bloco
+(leitura do offset, escrita no segmento e no índice) acontece com um lock
+exclusivo (flock) no diretório, e o índice escrito pelos outros processos
+é lido antes de acrescentar o próprio.
+
+CONCEITO - Sparse Index:
+O arquivo `index.tsv` mapeia protocolo → (segmento, offset do bloco,
+tamanho do bloco, linha no bloco). Buscar um relatório pelo protocolo
+custa um seek e a descompressão de um único bloco. O índice é gravado
+depois dos dados, então nunca aponta para um bloco inexistente.
+"""
+
+import atexit
+import gzip
+import json
+import lzma
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+COMPRESSIONS = {
+    "gzip": ("gz", gzip.compress, gzip.decompress, gzip.open),
+    "lzma": ("xz", lzma.compress, lzma.decompress, lzma.open),
+}
+
+INDEX_FILE = "index.tsv"
+LOCK_FILE = "LOCK"
+
+
+class SegmentedReportStore:
+    """
+    Store append-only de relatórios com segmentos comprimidos e índice por protocolo
+    """
+
+    def __init__(self, directory: str, compression: str = "gzip",
+                 segment_max_bytes: int = 64 * 1024 * 1024, batch_size: int = 100,
+                 flush_interval: float = 5.0):
+        """
+        Args:
+            directory: Diretório dos segmentos e do índice
+            compression: "gzip" (mais rápido) ou "lzma" (mais compacto)
+            segment_max_bytes: Tamanho a partir do qual um novo segmento é aberto
+            batch_size: Relatórios por bloco gravado (um fsync por bloco)
+            flush_interval: Idade máxima do buffer, em segundos (verificada a cada
+                escrita e por uma thread de fundo)
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Compressão inválida: {compression} (use {', '.join(COMPRESSIONS)})")
+
+        self.directory = directory
+        self.compression = compression
+        self.segment_max_bytes = segment_max_bytes
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+
+        self._ext, self._compress, self._decompress, self._open = COMPRESSIONS[compression]
+        self._buffer: List[Tuple[str, str]] = []  # (protocolo, linha JSON)
+        self._last_flush = time.monotonic()
+        self._index: Dict[str, Tuple[int, int, int, int]] = {}
+        self._index_pos = 0  # bytes do índice já lidos
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._segment = self._last_segment()
+        self._load_index()
+
+    # ------------------------------------------------------------------
+    # Arquivos
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, numero: int) -> str:
+        return os.path.join(self.directory, f"segment-{numero:06d}.jsonl.{self._ext}")
+
+    def _segments(self) -> List[int]:
+        sufixo = f".jsonl.{self._ext}"
+        numeros = []
+        for nome in os.listdir(self.directory):
+            if nome.startswith("segment-") and nome.endswith(sufixo):
+                numeros.append(int(nome[len("segment-"):-len(sufixo)]))
+        return sorted(numeros)
+
+    def _last_segment(self) -> int:
+        segmentos = self._segments()
+        return segmentos[-1] if segmentos else 1
+
+    def _load_index(self):
+        """Lê as linhas do índice acrescentadas desde a última leitura (deste ou de outro processo)"""
+        caminho = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(caminho):
+            return
+
+        with open(caminho, "rb") as f:
+            f.seek(self._index_pos)
+            dados = f.read()
+
+        for linha in dados.splitlines(keepends=True):
+            if not linha.endswith(b"\n"):
+                break  # gravação em andamento: relida na próxima vez
+            self._index_pos += len(linha)
+            partes = linha.decode("utf-8").rstrip("\n").split("\t")
+            if len(partes) != 5:
+                continue  # linha parcial de uma gravação interrompida
+            protocolo, segmento, offset, tamanho, posicao = partes
+            self._index[protocolo] = (int(segmento), int(offset), int(tamanho), int(posicao))
+
+    def _lock_directory(self) -> Optional[int]:
+        """Lock exclusivo do diretório entre processos (None sem fcntl)"""
+        if fcntl is None:
+            return None
+        fd = os.open(os.path.join(self.directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return fd
+
+    @staticmethod
+    def _unlock_directory(fd: Optional[int]):
+        if fd is not None:
+            os.close(fd)  # fechar o descritor libera o flock
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def append(self, resultados: dict) -> str:
+        """
+        Acrescenta o relatório de uma jornada
+
+        Args:
+            resultados: Resultado da jornada (dict)
+
+        Returns:
+            Localização lógica do relatório ("<diretório>#<protocolo>")
+        """
+        protocolo = str(resultados.get("protocolo") or "unknown")
+        linha = json.dumps(resultados, ensure_ascii=False, default=str)
+
+        with self._lock:
+            if not self._buffer:
+                # Conta a idade do buffer a partir do primeiro relatório pendente
+                self._last_flush = time.monotonic()
+            self._buffer.append((protocolo, linha))
+            if (len(self._buffer) >= self.batch_size
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+            elif self._flusher is None and not self._closed.is_set():
+                self._flusher = threading.Thread(target=self._flush_loop, name="report-store-flush", daemon=True)
+                self._flusher.start()
+
+        return f"{self.directory}#{protocolo}"
+
+    def _flush_loop(self):
+        """Grava o buffer que passou de `flush_interval` sem atingir `batch_size`"""
+        espera = max(0.05, self.flush_interval / 2)
+        while not self._closed.wait(espera):
+            with self._lock:
+                if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+                    self.flush()
+
+    def flush(self):
+        """Grava o buffer como um bloco comprimido e faz fsync dos dados e do índice"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+
+            bloco = self._compress("".join(linha + "\n" for _, linha in self._buffer).encode("utf-8"))
+
+            fd = self._lock_directory()
+            try:
+                # Outro processo pode ter girado o segmento ou acrescentado ao índice
+                self._segment = max(self._segment, self._last_segment())
+                self._load_index()
+
+                caminho = self._segment_path(self._segment)
+                offset = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+                if offset >= self.segment_max_bytes:
+                    self._segment += 1
+                    caminho = self._segment_path(self._segment)
+                    offset = 0
+
+                with open(caminho, "ab") as f:
+                    f.write(bloco)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                entradas = []
+                for posicao, (protocolo, _) in enumerate(self._buffer):
+                    local = (self._segment, offset, len(bloco), posicao)
+                    self._index[protocolo] = local
+                    entradas.append("\t".join([protocolo, *map(str, local)]) + "\n")
+
+                dados = "".join(entradas).encode("utf-8")
+                with open(os.path.join(self.directory, INDEX_FILE), "ab") as f:
+                    f.write(dados)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._index_pos += len(dados)
+            finally:
+                self._unlock_directory(fd)
+
+            self._buffer.clear()
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def get(self, protocolo: str) -> Optional[dict]:
+        """
+        Busca o relatório mais recente de um protocolo pelo índice
+
+        Returns:
+            Relatório da jornada ou None se o protocolo não existir
+        """
+        with self._lock:
+            for protocolo_buffer, linha in reversed(self._buffer):
+                if protocolo_buffer == protocolo:
+                    return json.loads(linha)
+            local = self._index.get(protocolo)
+            if local is None:
+                # Talvez gravado por outro processo
+                self._load_index()
+                local = self._index.get(protocolo)
+
+        if local is None:
+            return None
+
+        segmento, offset, tamanho, posicao = local
+        with open(self._segment_path(segmento), "rb") as f:
+            f.seek(offset)
+            bloco = self._decompress(f.read(tamanho))
+
+        return json.loads(bloco.decode("utf-8").splitlines()[posicao])
+
+    def scan(self) -> Iterator[Dict[str, Any]]:
+        """Percorre todos os relatórios gravados, na ordem de gravação"""
+        self.flush()
+        for numero in self._segments():
+            with self._open(self._segment_path(numero), "rt", encoding="utf-8") as f:
+                for linha in f:
+                    yield json.loads(linha)
+
+    def __contains__(self, protocolo: str) -> bool:
+        with self._lock:
+            return protocolo in self._index or any(p == protocolo for p, _ in self._buffer)
+
+    def __len__(self) -> int:
+        """Quantidade de protocolos distintos armazenados"""
+        with self._lock:
+            pendentes = {p for p, _ in self._buffer if p not in self._index}
+            return len(self._index) + len(pendentes)
+
+
+_default_store: Optional[SegmentedReportStore] = None
+_store_lock = threading.Lock()
+
+
+def get_report_store() -> SegmentedReportStore:
+    """
+    Store de relatórios compartilhado do processo
+
+    Configurado por JOURNEY_REPORT_DIR, JOURNEY_REPORT_COMPRESSION,
+    JOURNEY_REPORT_SEGMENT_MB, JOURNEY_REPORT_BATCH_SIZE e
+    JOURNEY_REPORT_FLUSH_SECONDS. O buffer é gravado ao encerrar o processo.
+    """
+    global _default_store
+
+    with _store_lock:
+        if _default_store is None:
+            _default_store = SegmentedReportStore(
+                directory=os.getenv("JOURNEY_REPORT_DIR", "reports"),
+                compression=os.getenv("JOURNEY_REPORT_COMPRESSION", "gzip"),
+                segment_max_bytes=int(float(os.getenv("JOURNEY_REPORT_SEGMENT_MB", "64")) * 1024 * 1024),
+                batch_size=int(os.getenv("JOURNEY_REPORT_BATCH_SIZE", "100")),
+                flush_interval=float(os.getenv("JOURNEY_REPORT_FLUSH_SECONDS", "5"))
+            )
+            atexit.register(_default_store.close)
+        return _default_store
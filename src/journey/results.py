@@ -0,0 +1,245 @@
+"""
+Modelo compacto e tipado do resultado de uma jornada
+
+CONCEITO - Compact Result Model:
+Antes, cada etapa guardava o `raw_result` completo do AgentExecutor, o
+resultado embutia o `protocolo_data` inteiro e o log duplicava cada etapa.
+Aqui cada informação existe uma única vez:
+- StageResult: status, saída do agent e os poucos campos extraídos
+- JourneyResult: metadados da jornada, etapas e um resumo do protocolo
+- O log da jornada guarda apenas (timestamp, etapa, status)
+
+As classes usam `__slots__` (sem __dict__ por instância), o que reduz a
+memória de cada resultado mantido em filas, caches e históricos.
+
+CONCEITO - Raw Retention Policy:
+Os dados brutos (raw_result e protocolo completo) são úteis para depuração,
+mas caros. A política decide quando mantê-los:
+- off: nunca
+- sampled: numa amostra aleatória das jornadas
+- on_error: apenas em jornadas que terminaram em erro
+- on: sempre (comportamento antigo)
+"""
+
+import os
+import random
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from journey.itens import itens_do_protocolo
+
+# dataclass(slots=True) só existe a partir do Python 3.10
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+RETENTION_MODES = ("off", "sampled", "on_error", "on")
+
+
+@dataclass(**_SLOTS)
+class StageResult:
+    """
+    Resultado de uma etapa da jornada
+
+    Atributos:
+        etapa: Chave da etapa (ex: "validacao_cliente")
+        agent: Nome do agent que executou a etapa
+        status: Status normalizado da etapa
+        output: Resposta final do agent
+        dados: Campos extraídos da resposta (data_compra, reserva_id, ...)
+        duracao_ms: Duração da etapa, em milissegundos
+        raw: Resultado bruto do AgentExecutor (mantido conforme a política)
+    """
+
+    etapa: str
+    agent: str
+    status: str
+    output: str = ""
+    dados: Dict[str, Any] = field(default_factory=dict)
+    duracao_ms: float = 0.0
+    raw: Optional[Any] = None
+
+    @classmethod
+    def from_agent(cls, etapa: str, resultado: dict, duracao_ms: float = 0.0,
+                   status_key: str = "status") -> "StageResult":
+        """
+        Converte o dict devolvido por um agent em StageResult
+
+        Args:
+            etapa: Chave da etapa
+            resultado: Dict retornado pelo agent (com output e raw_result)
+            duracao_ms: Duração medida pelo orquestrador
+            status_key: Campo que contém o status (o DecisionAgent usa "decisao_final")
+        """
+        dados = {
+            k: v for k, v in resultado.items()
+            if k not in ("agent", "status", "output", "raw_result")
+        }
+        return cls(
+            etapa=etapa,
+            agent=resultado.get("agent", ""),
+            status=str(resultado.get(status_key) or resultado.get("status") or "concluido"),
+            output=resultado.get("output", ""),
+            dados=dados,
+            duracao_ms=round(duracao_ms, 1),
+            raw=resultado.get("raw_result")
+        )
+
+    def get(self, chave: str, padrao: Any = None) -> Any:
+        """Acesso estilo dict aos campos extraídos"""
+        return self.dados.get(chave, padrao)
+
+    def to_dict(self) -> dict:
+        """Formato de dict usado pelo app, relatórios e DecisionAgent"""
+        d = {
+            "agent": self.agent,
+            "status": self.status,
+            "output": self.output,
+            **self.dados,
+            "duracao_ms": self.duracao_ms
+        }
+        if self.raw is not None:
+            d["raw_result"] = self.raw
+        return d
+
+
+def resumir_protocolo(protocolo_data: dict) -> Dict[str, Any]:
+    """
+    Campos do protocolo necessários para relatórios e análises
+
+    Em protocolos com vários itens, os campos de produto são os do primeiro
+    item e `num_itens` informa quantos são (a decisão de cada item fica em
+    `extras["itens"]` do resultado).
+    """
+    cliente = protocolo_data.get("cliente") or {}
+    itens = itens_do_protocolo(protocolo_data)
+    primeiro = itens[0]
+    original = primeiro["produto_original"] or {}
+    desejado = primeiro["produto_desejado"] or {}
+    resumo = {
+        "cpf": cliente.get("cpf"),
+        "produto_original": original.get("codigo"),
+        "data_compra": original.get("data_compra"),
+        "valor_pago": original.get("valor_pago"),
+        "produto_desejado": desejado.get("codigo"),
+        "motivo_troca": primeiro["motivo_troca"],
+        "tipo_troca_desejado": primeiro["tipo_troca_desejado"],
+        "prioridade": protocolo_data.get("prioridade")
+    }
+    if len(itens) > 1:
+        resumo["num_itens"] = len(itens)
+    return resumo
+
+
+@dataclass(**_SLOTS)
+class JourneyResult:
+    """
+    Resultado consolidado de uma jornada
+
+    Atributos:
+        protocolo: Número do protocolo
+        data_inicio / data_fim: Timestamps ISO da execução
+        protocolo_resumo: Campos essenciais do protocolo
+        etapas: Etapas executadas, em ordem (None = etapa não aplicável)
+        decisao_final: aprovado / rejeitado / erro / adiado
+        motivo_interrupcao: Motivo quando a jornada para antes da decisão
+        erro: Mensagem de erro, se houver
+        extras: Campos adicionais de casos especiais (ex: adiamento)
+        log: Entradas do log da jornada (timestamp, etapa, status)
+        llm_chamadas / llm_tokens: Consumo de LLM da jornada
+        protocolo_data: Protocolo completo (mantido conforme a política)
+    """
+
+    protocolo: Optional[str]
+    data_inicio: str
+    protocolo_resumo: Dict[str, Any] = field(default_factory=dict)
+    etapas: Dict[str, Optional[StageResult]] = field(default_factory=dict)
+    decisao_final: Optional[str] = None
+    motivo_interrupcao: Optional[str] = None
+    erro: Optional[str] = None
+    data_fim: Optional[str] = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+    log: List[Dict[str, Any]] = field(default_factory=list)
+    llm_chamadas: int = 0
+    llm_tokens: int = 0
+    protocolo_data: Optional[dict] = None
+
+    def etapa(self, chave: str) -> Optional[StageResult]:
+        return self.etapas.get(chave)
+
+    def drop_raw(self):
+        """Descarta os dados brutos de todas as etapas e o protocolo completo"""
+        self.protocolo_data = None
+        for stage in self.etapas.values():
+            if stage is not None:
+                stage.raw = None
+
+    def to_dict(self) -> dict:
+        """
+        Formato de dict compatível com o relatório original
+
+        Cada etapa continua disponível pela sua chave
+        (validacao_cliente, analise_documentos, ..., decisao).
+        """
+        d: Dict[str, Any] = {
+            "protocolo": self.protocolo,
+            "data_inicio": self.data_inicio,
+            "protocolo_resumo": self.protocolo_resumo
+        }
+        if self.protocolo_data is not None:
+            d["protocolo_data"] = self.protocolo_data
+
+        for chave, stage in self.etapas.items():
+            d[chave] = stage.to_dict() if stage is not None else None
+
+        d["decisao_final"] = self.decisao_final
+        if self.motivo_interrupcao:
+            d["motivo_interrupcao"] = self.motivo_interrupcao
+        if self.erro:
+            d["erro"] = self.erro
+        d.update(self.extras)
+        d["uso_llm"] = {"chamadas": self.llm_chamadas, "tokens": self.llm_tokens}
+        d["data_fim"] = self.data_fim
+        d["journey_log"] = self.log
+        return d
+
+
+class RawRetentionPolicy:
+    """
+    Decide se os dados brutos de uma jornada são mantidos no resultado
+    """
+
+    def __init__(self, mode: str = "on_error", sample_rate: float = 0.01):
+        if mode not in RETENTION_MODES:
+            raise ValueError(f"Modo de retenção inválido: {mode} (use {', '.join(RETENTION_MODES)})")
+        self.mode = mode
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_env(cls) -> "RawRetentionPolicy":
+        """Lê JOURNEY_RAW_RETENTION e JOURNEY_RAW_SAMPLE_RATE"""
+        return cls(
+            mode=os.getenv("JOURNEY_RAW_RETENTION", "on_error"),
+            sample_rate=float(os.getenv("JOURNEY_RAW_SAMPLE_RATE", "0.01"))
+        )
+
+    def collect(self) -> bool:
+        """
+        Decidido no início da jornada: vale a pena coletar dados brutos?
+
+        Para on_error coletamos sempre, pois o erro só é conhecido no fim.
+        """
+        if self.mode == "sampled":
+            return random.random() < self.sample_rate
+        return self.mode != "off"
+
+    def keep(self, resultado: JourneyResult, coletado: bool) -> bool:
+        """Decidido no fim da jornada: os dados coletados ficam no resultado?"""
+        if not coletado:
+            return False
+        if self.mode == "on_error":
+            return resultado.decisao_final == "erro"
+        return True
@@ -0,0 +1,263 @@
+"""
+Escalonamento de jornadas por prioridade
+
+CONCEITO - Weighted Fair Queuing:
+Os protocolos trazem `prioridade` (alta, media, baixa). Em vez de atender
+em ordem de chegada, cada prioridade tem a sua fila e um peso; a cada vaga
+livre a próxima fila é escolhida por round robin ponderado suave: com pesos
+6/3/1, de cada 10 jornadas iniciadas sob carga, 6 são de prioridade alta.
+Trocas urgentes não esperam atrás de uma importação em lote, e a prioridade
+baixa continua andando.
+
+CONCEITO - Aging:
+Uma jornada que espera demais sobe de classe: a cada `aging_seconds` de
+espera, a fila passa a concorrer com o peso da prioridade acima. Isso
+limita a espera máxima da prioridade baixa mesmo com pesos muito desiguais.
+
+CONCEITO - Concurrency Quotas:
+Cada prioridade pode ter um limite de jornadas simultâneas. Com quota para
+media e baixa, sempre sobram workers livres para a prioridade alta, então
+o tempo de espera dela não cresce junto com o backlog das demais.
+
+Configuração via variáveis de ambiente (ver .env.example):
+- SCHEDULER_WEIGHTS: pesos por prioridade (padrão: alta=6,media=3,baixa=1)
+- SCHEDULER_QUOTAS: jornadas simultâneas por prioridade (padrão: sem limite)
+- SCHEDULER_AGING_SECONDS: espera que promove uma fila de classe (padrão: 120)
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Mapping, Optional, Tuple
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from metrics import MetricsRegistry, get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+# Da mais urgente para a menos urgente
+PRIORIDADES = ("alta", "media", "baixa")
+PRIORIDADE_PADRAO = "media"
+
+DEFAULT_WEIGHTS = {"alta": 6, "media": 3, "baixa": 1}
+
+_ALIASES = {"média": "media", "urgente": "alta", "high": "alta", "medium": "media", "low": "baixa"}
+
+
+def normalizar_prioridade(valor: Any) -> str:
+    """Prioridade do protocolo como uma de PRIORIDADES (padrão: media)"""
+    nome = str(valor or "").strip().lower()
+    nome = _ALIASES.get(nome, nome)
+    return nome if nome in PRIORIDADES else PRIORIDADE_PADRAO
+
+
+def _parse_mapping(texto: str) -> Dict[str, int]:
+    """'alta=6,media=3' -> {"alta": 6, "media": 3}"""
+    valores = {}
+    for parte in texto.split(","):
+        if not parte.strip():
+            continue
+        nome, _, valor = parte.partition("=")
+        valores[normalizar_prioridade(nome)] = int(valor)
+    return valores
+
+
+class SchedulingPolicy:
+    """
+    Decide qual prioridade recebe a próxima vaga de execução
+
+    Usada pelo escalonador em memória e pela fila durável do serviço.
+    Guarda o estado do round robin ponderado, então cada consumidor
+    (escalonador ou processo worker) deve ter a sua instância.
+    """
+
+    def __init__(self, weights: Optional[Mapping[str, int]] = None,
+                 quotas: Optional[Mapping[str, int]] = None,
+                 aging_seconds: float = 120.0):
+        """
+        Args:
+            weights: Peso de cada prioridade (padrão: alta=6, media=3, baixa=1)
+            quotas: Máximo de jornadas simultâneas por prioridade (ausente = sem limite)
+            aging_seconds: Espera que promove a fila uma classe acima (0 desliga)
+        """
+        self.weights = dict(DEFAULT_WEIGHTS)
+        self.weights.update(weights or {})
+        if any(peso <= 0 for peso in self.weights.values()):
+            raise ValueError("Pesos de prioridade devem ser positivos")
+        self.quotas = dict(quotas or {})
+        self.aging_seconds = aging_seconds
+        self._credito = {p: 0 for p in PRIORIDADES}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SchedulingPolicy":
+        """Lê SCHEDULER_WEIGHTS, SCHEDULER_QUOTAS e SCHEDULER_AGING_SECONDS"""
+        return cls(
+            weights=_parse_mapping(os.getenv("SCHEDULER_WEIGHTS", "")),
+            quotas=_parse_mapping(os.getenv("SCHEDULER_QUOTAS", "")),
+            aging_seconds=float(os.getenv("SCHEDULER_AGING_SECONDS", "120"))
+        )
+
+    def effective_weight(self, prioridade: str, espera: float) -> int:
+        """Peso da fila considerando o aging da jornada mais antiga"""
+        nivel = PRIORIDADES.index(prioridade)
+        if self.aging_seconds > 0:
+            nivel = max(0, nivel - int(espera // self.aging_seconds))
+        return self.weights[PRIORIDADES[nivel]]
+
+    def has_capacity(self, prioridade: str, em_execucao: int) -> bool:
+        quota = self.quotas.get(prioridade)
+        return quota is None or em_execucao < quota
+
+    def choose(self, esperas: Mapping[str, float],
+               em_execucao: Optional[Mapping[str, int]] = None) -> Optional[str]:
+        """
+        Escolhe a prioridade da próxima jornada
+
+        Args:
+            esperas: Espera (segundos) da jornada mais antiga de cada fila não vazia
+            em_execucao: Jornadas em execução por prioridade (para as quotas)
+
+        Returns:
+            Prioridade escolhida, ou None se nenhuma fila puder ser atendida
+        """
+        em_execucao = em_execucao or {}
+        elegiveis = [
+            p for p in PRIORIDADES
+            if p in esperas and self.has_capacity(p, em_execucao.get(p, 0))
+        ]
+        if not elegiveis:
+            return None
+
+        # Round robin ponderado suave (o mesmo do nginx): cada fila acumula
+        # crédito igual ao seu peso e a de maior crédito paga o total
+        with self._lock:
+            for p in PRIORIDADES:
+                if p not in esperas:
+                    # Fila vazia não acumula crédito para usar depois em rajada
+                    self._credito[p] = 0
+            pesos = {p: self.effective_weight(p, esperas[p]) for p in elegiveis}
+            for p in elegiveis:
+                self._credito[p] += pesos[p]
+            escolhida = max(elegiveis, key=lambda p: self._credito[p])
+            self._credito[escolhida] -= sum(pesos.values())
+        return escolhida
+
+
+class PriorityJourneyScheduler:
+    """
+    Escalonador em memória na frente do orquestrador
+
+    Recebe protocolos com `submit` e os executa num pool de threads,
+    escolhendo a próxima jornada pela SchedulingPolicy. O tempo de espera
+    na fila de cada prioridade vai para o registro de métricas
+    (`fila.<prioridade>`).
+    """
+
+    def __init__(self, executar: Optional[Callable[[dict], Any]] = None, workers: int = 4,
+                 policy: Optional[SchedulingPolicy] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        """
+        Args:
+            executar: Função que executa uma jornada (padrão: execute_journey de um orquestrador)
+            workers: Jornadas executadas em paralelo
+            policy: Política de escalonamento (padrão: variáveis SCHEDULER_*)
+            metrics: Registro das esperas por prioridade (padrão: o do processo)
+        """
+        if executar is None:
+            from orchestrator import ExchangeJourneyOrchestrator
+            executar = ExchangeJourneyOrchestrator().execute_journey
+
+        self.executar = executar
+        self.policy = policy if policy is not None else SchedulingPolicy.from_env()
+        self.metrics = metrics if metrics is not None else get_metrics_registry()
+
+        self._filas: Dict[str, Deque[Tuple[float, dict, Future]]] = {p: deque() for p in PRIORIDADES}
+        self._em_execucao = {p: 0 for p in PRIORIDADES}
+        self._cond = threading.Condition()
+        self._encerrando = False
+
+        self._threads: List[threading.Thread] = [
+            threading.Thread(target=self._loop, name=f"journey-scheduler-{i + 1}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, protocolo_data: dict) -> Future:
+        """
+        Enfileira um protocolo na fila da sua prioridade
+
+        Returns:
+            Future com o resultado da jornada
+        """
+        prioridade = normalizar_prioridade(protocolo_data.get("prioridade"))
+        futuro: Future = Future()
+        with self._cond:
+            if self._encerrando:
+                raise RuntimeError("Escalonador encerrado")
+            self._filas[prioridade].append((time.monotonic(), protocolo_data, futuro))
+            self._cond.notify()
+        return futuro
+
+    def _proxima(self) -> Optional[Tuple[str, float, dict, Future]]:
+        """Retira a próxima jornada (chamado com o lock do escalonador)"""
+        agora = time.monotonic()
+        esperas = {p: agora - fila[0][0] for p, fila in self._filas.items() if fila}
+        prioridade = self.policy.choose(esperas, self._em_execucao)
+        if prioridade is None:
+            return None
+        enfileirado_em, protocolo_data, futuro = self._filas[prioridade].popleft()
+        return prioridade, agora - enfileirado_em, protocolo_data, futuro
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                item = self._proxima()
+                while item is None:
+                    if self._encerrando and not any(self._filas.values()):
+                        return
+                    self._cond.wait()
+                    item = self._proxima()
+                prioridade, espera, protocolo_data, futuro = item
+                self._em_execucao[prioridade] += 1
+
+            self.metrics.latency(f"fila.{prioridade}").observe(espera * 1000)
+            try:
+                if futuro.set_running_or_notify_cancel():
+                    try:
+                        futuro.set_result(self.executar(protocolo_data))
+                    except Exception as e:
+                        logger.exception("Falha ao executar jornada escalonada",
+                                         extra={"protocolo": protocolo_data.get("protocolo")})
+                        futuro.set_exception(e)
+            finally:
+                with self._cond:
+                    self._em_execucao[prioridade] -= 1
+                    # A vaga liberada pode destravar uma prioridade que estava na quota
+                    self._cond.notify_all()
+
+    def pending(self) -> Dict[str, int]:
+        """Jornadas aguardando em cada prioridade"""
+        with self._cond:
+            return {p: len(fila) for p, fila in self._filas.items()}
+
+    def queue_wait(self) -> Dict[str, Dict[str, Optional[float]]]:
+        """Espera na fila (ms) por prioridade: count, p50, p95, p99"""
+        return {p: self.metrics.latency(f"fila.{p}").summary() for p in PRIORIDADES}
+
+    def shutdown(self, wait: bool = True):
+        """Para de aceitar protocolos; as jornadas já enfileiradas são executadas"""
+        with self._cond:
+            self._encerrando = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
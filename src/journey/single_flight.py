@@ -0,0 +1,162 @@
+"""
+Deduplicação de jornadas idênticas
+
+CONCEITO - Single Flight:
+Um duplo clique no app ou o reenvio de um sistema de origem dispara a mesma
+jornada duas vezes: seis chamadas de LLM a mais e, pior, uma segunda reserva
+de estoque. Aqui cada jornada é identificada pelo número do protocolo mais
+um hash do conteúdo. Enquanto uma jornada com a mesma chave está em
+execução, as duplicatas esperam por ela e recebem o mesmo resultado.
+
+CONCEITO - Short-Lived Result Cache:
+Depois de concluída, a jornada continua respondendo às duplicatas por
+alguns segundos (JOURNEY_DEDUP_TTL_SECONDS). Jornadas adiadas ou com erro
+não ficam no cache: o reenvio delas deve executar de novo.
+
+O mesmo número de protocolo com conteúdo diferente (um protocolo corrigido)
+gera outra chave e executa normalmente.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple, TypeVar
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from metrics import get_metrics_registry
+
+T = TypeVar("T")
+
+# Campos que mudam a cada envio sem mudar a solicitação
+CAMPOS_VOLATEIS = ("data_abertura",)
+
+
+def hash_conteudo(protocolo_data: dict) -> str:
+    """Hash SHA-256 do protocolo em JSON canônico, sem os campos voláteis"""
+    conteudo = {k: v for k, v in protocolo_data.items() if k not in CAMPOS_VOLATEIS}
+    canonico = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+def chave_jornada(protocolo_data: dict) -> str:
+    """Chave de deduplicação: número do protocolo + hash do conteúdo"""
+    return f"{protocolo_data.get('protocolo', '')}:{hash_conteudo(protocolo_data)}"
+
+
+class SingleFlight:
+    """
+    Coalescência de execuções concorrentes com cache curto de resultados
+
+    Thread-safe; compartilhado pelo processo via `get_single_flight()`.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024, nome: str = "jornadas.dedup"):
+        """
+        Args:
+            ttl: Segundos em que um resultado concluído atende duplicatas (0 desliga o cache)
+            max_entries: Máximo de resultados em cache (os mais antigos saem primeiro)
+            nome: Nome do cache no registro de métricas
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = get_metrics_registry().cache(nome)
+        self._em_execucao: Dict[str, Future] = {}
+        self._cache: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "SingleFlight":
+        """Lê JOURNEY_DEDUP_TTL_SECONDS e JOURNEY_DEDUP_MAX_ENTRIES"""
+        return cls(
+            ttl=float(os.getenv("JOURNEY_DEDUP_TTL_SECONDS", "60")),
+            max_entries=int(os.getenv("JOURNEY_DEDUP_MAX_ENTRIES", "1024"))
+        )
+
+    def _cached(self, chave: str) -> Optional[object]:
+        """Resultado em cache ainda válido (chamado com o lock)"""
+        entrada = self._cache.get(chave)
+        if entrada is None:
+            return None
+        expira_em, resultado = entrada
+        if expira_em < time.monotonic():
+            del self._cache[chave]
+            return None
+        return resultado
+
+    def run(self, chave: str, executar: Callable[[], T],
+            cacheable: Callable[[T], bool] = lambda _: True) -> Tuple[T, bool]:
+        """
+        Executa `executar` uma única vez por chave entre chamadas concorrentes
+
+        Args:
+            chave: Identidade da execução (ver `chave_jornada`)
+            executar: Função executada pela primeira chamada
+            cacheable: Decide se o resultado pode atender duplicatas depois de concluído
+
+        Returns:
+            (resultado, compartilhado) - compartilhado indica que veio de outra execução
+        """
+        with self._lock:
+            resultado = self._cached(chave)
+            if resultado is not None:
+                self.stats.hit()
+                return resultado, True
+
+            futuro = self._em_execucao.get(chave)
+            lider = futuro is None
+            if lider:
+                futuro = Future()
+                self._em_execucao[chave] = futuro
+
+        if not lider:
+            self.stats.hit()
+            return futuro.result(), True
+
+        self.stats.miss()
+        try:
+            resultado = executar()
+        except BaseException as e:
+            with self._lock:
+                del self._em_execucao[chave]
+            futuro.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._em_execucao[chave]
+            if self.ttl > 0 and cacheable(resultado):
+                self._cache[chave] = (time.monotonic() + self.ttl, resultado)
+                self._cache.move_to_end(chave)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        futuro.set_result(resultado)
+        return resultado, False
+
+    def in_flight(self) -> int:
+        """Execuções em andamento"""
+        with self._lock:
+            return len(self._em_execucao)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_default_single_flight: Optional[SingleFlight] = None
+_default_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Deduplicação compartilhada do processo (o app cria um orquestrador por requisição)"""
+    global _default_single_flight
+    with _default_lock:
+        if _default_single_flight is None:
+            _default_single_flight = SingleFlight.from_env()
+        return _default_single_flight
@@ -0,0 +1,53 @@
+"""
+Módulo de infraestrutura de LLM compartilhada pelos agents
+
+CONCEITO - Cross-Cutting Concerns:
+Controle de vazão, retentativas e proteção do provedor não são
+responsabilidade de nenhum agent específico. Centralizá-los aqui
+mantém os agents focados no seu prompt e nas suas tools.
+
+CONCEITO - Lazy Loading (PEP 562):
+Parte destes módulos depende de LangChain e do cliente Groq. Os nomes só
+carregam o seu módulo no primeiro acesso; o orquestrador pode consultar o
+circuit breaker sem importar nenhum cliente de LLM.
+"""
+
+import importlib
+
+# Nome exportado -> módulo que o define
+_EXPORTS = {
+    'TokenBucket': 'rate_limiter',
+    'RateLimiter': 'rate_limiter',
+    'AIMDConcurrencyLimiter': 'rate_limiter',
+    'ProviderThrottle': 'rate_limiter',
+    'jittered_backoff': 'rate_limiter',
+    'CircuitBreaker': 'circuit_breaker',
+    'CircuitOpenError': 'circuit_breaker',
+    'StructuredAnswerDetector': 'early_stop',
+    'blocos_esperados': 'early_stop',
+    'LatencyTracker': 'hedging',
+    'HedgeBudget': 'hedging',
+    'HedgedCaller': 'hedging',
+    'LLMUsage': 'usage',
+    'track_llm_usage': 'usage',
+    'current_llm_usage': 'usage',
+    'GuardedChatModel': 'guarded_chat_model',
+    'create_llm': 'factory',
+    'get_provider_throttle': 'factory',
+    'get_hedger': 'factory',
+    'get_circuit_breaker': 'factory',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    valor = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = valor  # próximos acessos não passam por aqui
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,200 @@
+"""
+Circuit breaker para as chamadas dos agents ao provedor de LLM
+
+CONCEITO - Circuit Breaker:
+Quando o provedor está fora do ar, cada jornada entra na etapa 1 e espera
+timeouts e retentativas antes de falhar. O circuit breaker observa a taxa
+de erro das chamadas e, acima de um limiar, "abre o circuito": as chamadas
+seguintes falham imediatamente (fail fast) até o provedor se recuperar.
+
+Estados:
+- FECHADO (closed): chamadas normais, erros são contabilizados
+- ABERTO (open): chamadas rejeitadas sem tocar no provedor
+- SEMIABERTO (half_open): após `open_seconds`, algumas chamadas de teste
+  são liberadas; sucesso fecha o circuito, falha reabre
+
+CONCEITO - Error-Rate Window:
+A taxa de erro é medida numa janela deslizante de tempo (baldes de 1s),
+com um mínimo de chamadas para evitar abrir o circuito por um erro isolado.
+
+Só falhas do provedor contam: timeouts, erros de conexão, 5xx e 429 que
+sobraram das retentativas. Outros erros (prompt inválido, bug no parser,
+400) não dizem nada sobre a saúde do provedor: são repassados sem entrar
+na taxa de erro nem reabrir o circuito.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from llm.rate_limiter import is_rate_limit_error, is_transient_error
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Chamada rejeitada porque o circuito está aberto"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Provedor de LLM indisponível (circuito aberto). Nova tentativa em {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Erro que indica provedor indisponível (transitório ou 429 após as retentativas)"""
+    return is_transient_error(error) or is_rate_limit_error(error)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker thread-safe com janela de taxa de erro
+    """
+
+    def __init__(self, failure_rate_threshold: float = 0.5, window_seconds: float = 30.0,
+                 min_requests: int = 5, open_seconds: float = 30.0, half_open_max_calls: int = 1,
+                 clock: Callable[[], float] = time.monotonic,
+                 is_failure: Callable[[BaseException], bool] = is_provider_failure):
+        """
+        Args:
+            failure_rate_threshold: Taxa de erro (0-1) que abre o circuito
+            window_seconds: Tamanho da janela de observação
+            min_requests: Mínimo de chamadas na janela para avaliar a taxa
+            open_seconds: Tempo no estado aberto antes de testar o provedor
+            half_open_max_calls: Chamadas de teste simultâneas no estado semiaberto
+            clock: Relógio monotônico (injetável para testes)
+            is_failure: Quais exceções contam como falha do provedor
+        """
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._is_failure = is_failure
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_in_flight = 0
+        self._buckets: deque = deque()  # (segundo, sucessos, falhas)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Janela de observação
+    # ------------------------------------------------------------------
+
+    def _trim(self, agora: float):
+        limite = agora - self.window_seconds
+        while self._buckets and self._buckets[0][0] <= limite:
+            self._buckets.popleft()
+
+    def _add(self, sucesso: bool):
+        agora = self._clock()
+        segundo = int(agora)
+        if self._buckets and self._buckets[-1][0] == segundo:
+            _, ok, erro = self._buckets[-1]
+            self._buckets[-1] = (segundo, ok + sucesso, erro + (not sucesso))
+        else:
+            self._buckets.append((segundo, int(sucesso), int(not sucesso)))
+        self._trim(agora)
+
+    def _failure_rate(self):
+        total = sum(ok + erro for _, ok, erro in self._buckets)
+        falhas = sum(erro for _, _, erro in self._buckets)
+        return total, (falhas / total if total else 0.0)
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    def _refresh(self):
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_in_flight = 0
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._buckets.clear()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def retry_after(self) -> float:
+        """Segundos até o circuito aceitar chamadas de teste (0 se fechado)"""
+        with self._lock:
+            self._refresh()
+            if self._state != OPEN:
+                return 0.0
+            return max(self.open_seconds - (self._clock() - self._opened_at), 0.0)
+
+    def is_available(self) -> bool:
+        """
+        Indica se vale a pena iniciar trabalho que depende do provedor
+
+        Não consome vaga de teste do estado semiaberto: é usado pelo
+        orquestrador para decidir se inicia ou adia uma jornada.
+        """
+        return self.state != OPEN
+
+    def allow_request(self) -> bool:
+        """Reserva a permissão para uma chamada (consome vaga de teste se semiaberto)"""
+        with self._lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_in_flight < self.half_open_max_calls:
+                self._half_open_in_flight += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._buckets.clear()
+                self._half_open_in_flight = 0
+            self._add(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._open()
+                return
+            self._add(False)
+            total, taxa = self._failure_rate()
+            if self._state == CLOSED and total >= self.min_requests and taxa >= self.failure_rate_threshold:
+                self._open()
+
+    def release_probe(self):
+        """Devolve a vaga de teste de uma chamada que não contou como sucesso nem falha"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_in_flight:
+                self._half_open_in_flight -= 1
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """
+        Executa `fn` sob proteção do circuito
+
+        Raises:
+            CircuitOpenError: se o circuito estiver aberto
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.retry_after())
+
+        try:
+            resultado = fn()
+        except Exception as e:
+            if self._is_failure(e):
+                self.record_failure()
+            else:
+                self.release_probe()
+            raise
+
+        self.record_success()
+        return resultado
@@ -0,0 +1,112 @@
+"""
+Interrupção antecipada da geração quando a resposta estruturada está completa
+
+CONCEITO - Early Termination:
+A latência de uma chamada ao LLM cresce com o número de tokens gerados.
+Os agents só precisam do bloco estruturado após "Final Answer:"
+(delimitado por `---`), mas o modelo às vezes continua escrevendo depois
+dele. Lendo a resposta em streaming, podemos abortar a geração assim que:
+- o `---` de fechamento do bloco chegou, ou
+- todas as chaves obrigatórias (ex: STATUS, PODE_PROSSEGUIR) chegaram
+  com a linha completa.
+
+Stop sequences comuns não resolvem o caso: o delimitador de abertura e o de
+fechamento são o mesmo texto, e a geração pararia no primeiro `---`.
+
+Numa chamada em lote (agents/multi_item.py) a resposta final traz um bloco
+por item: `blocos_esperados` informa quantos, e o corte só acontece depois
+do último.
+"""
+
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterable, Iterator, Optional
+
+_blocos_esperados: ContextVar[int] = ContextVar("early_stop_blocos", default=1)
+
+
+@contextmanager
+def blocos_esperados(quantidade: int) -> Iterator[None]:
+    """Escopo em que a resposta final deve trazer `quantidade` blocos estruturados"""
+    token = _blocos_esperados.set(max(1, quantidade))
+    try:
+        yield
+    finally:
+        _blocos_esperados.reset(token)
+
+
+def current_blocos_esperados() -> int:
+    """Blocos esperados no escopo atual (1 fora de uma chamada em lote)"""
+    return _blocos_esperados.get()
+
+
+class StructuredAnswerDetector:
+    """
+    Detecta o ponto em que a resposta final estruturada está completa
+
+    Só atua depois do marcador "Final Answer:"; passos intermediários do
+    ReAct (Thought/Action) nunca são cortados.
+    """
+
+    def __init__(self, required_keys: Iterable[str] = (), marker: str = "Final Answer:",
+                 delimiter: str = "---"):
+        """
+        Args:
+            required_keys: Chaves cujo recebimento completo encerra a geração.
+                Vazio = corta apenas no fechamento do bloco.
+            marker: Marcador da resposta final do ReAct
+            delimiter: Delimitador do bloco estruturado
+        """
+        self.required_keys = tuple(required_keys)
+        self.marker = marker
+        self.delimiter = delimiter
+        self._key_patterns = [
+            re.compile(rf"^[ \t]*{re.escape(chave)}[ \t]*:[^\n]*\n", re.MULTILINE)
+            for chave in self.required_keys
+        ]
+
+    def cut_position(self, texto: str, blocos: int = 1) -> Optional[int]:
+        """
+        Posição (exclusiva) onde a resposta pode ser cortada, ou None
+
+        Args:
+            texto: Texto gerado até o momento
+            blocos: Blocos estruturados esperados na resposta final
+        """
+        inicio = texto.find(self.marker)
+        if inicio < 0:
+            return None
+        inicio += len(self.marker)
+
+        corte = self._fechamento(texto, inicio, blocos)
+        if corte is not None:
+            return corte
+
+        if not self._key_patterns:
+            return None
+
+        fim = inicio
+        for padrao in self._key_patterns:
+            encontrados = 0
+            for encontrado in padrao.finditer(texto, inicio):
+                encontrados += 1
+                if encontrados == blocos:
+                    fim = max(fim, encontrado.end())
+                    break
+            else:
+                return None
+        return fim
+
+    def _fechamento(self, texto: str, inicio: int, blocos: int) -> Optional[int]:
+        """Fim do delimitador que fecha o último bloco esperado, ou None"""
+        posicao = inicio
+        for _ in range(blocos):
+            abertura = texto.find(self.delimiter, posicao)
+            if abertura < 0:
+                return None
+            fechamento = texto.find(self.delimiter, abertura + len(self.delimiter))
+            if fechamento < 0:
+                return None
+            posicao = fechamento + len(self.delimiter)
+        return posicao
@@ -0,0 +1,206 @@
+"""
+Fábrica de LLMs para os agents
+
+CONCEITO - Shared Provider Throttle:
+Os 6 agents criam cada um o seu ChatGroq, mas todos consomem a MESMA cota
+da conta na Groq. Por isso o controle de vazão precisa ser único por processo:
+esta fábrica cria o modelo de cada agent e o conecta ao ProviderThrottle
+compartilhado.
+
+Configuração via variáveis de ambiente (ver .env.example):
+- LLM_RATE_LIMIT_ENABLED: liga/desliga o controle (padrão: true)
+- LLM_REQUESTS_PER_MINUTE / LLM_TOKENS_PER_MINUTE: cotas do provedor
+- LLM_MAX_CONCURRENCY / LLM_INITIAL_CONCURRENCY: limites do AIMD
+- LLM_LATENCY_TARGET_SECONDS: latência acima da qual a concorrência é reduzida
+- LLM_MAX_RETRIES: retentativas com jittered backoff
+- LLM_HEDGE_ENABLED: liga o hedging de requisições lentas (padrão: false)
+- LLM_HEDGE_PERCENTILE: percentil de latência que dispara a cópia (padrão: 95)
+- LLM_HEDGE_BUDGET_RATIO: fração máxima de cópias por requisição (padrão: 0.1)
+- LLM_HEDGE_MIN_SAMPLES: amostras mínimas antes de começar a copiar
+- LLM_CIRCUIT_BREAKER_ENABLED: liga o circuit breaker (padrão: true)
+- LLM_CIRCUIT_FAILURE_RATE / LLM_CIRCUIT_WINDOW_SECONDS / LLM_CIRCUIT_MIN_REQUESTS:
+  taxa de erro, janela e mínimo de chamadas para abrir o circuito
+- LLM_CIRCUIT_OPEN_SECONDS: tempo aberto antes de testar o provedor novamente
+- LLM_EARLY_STOP_ENABLED: corta a geração quando o bloco final está completo (padrão: true)
+- LLM_MAX_TOKENS_<AGENT>: teto de tokens gerados por chamada de um agent
+  (ex: LLM_MAX_TOKENS_DECISIONAGENT=1024)
+"""
+
+import os
+import threading
+from typing import TYPE_CHECKING, List, Optional
+
+from llm.circuit_breaker import CircuitBreaker
+from llm.early_stop import StructuredAnswerDetector
+from llm.hedging import HedgeBudget, HedgedCaller
+from llm.rate_limiter import AIMDConcurrencyLimiter, ProviderThrottle, RateLimiter
+
+if TYPE_CHECKING:
+    from llm.guarded_chat_model import GuardedChatModel
+
+# CONCEITO - Bounded Generation:
+# Teto de tokens por chamada e chaves cuja chegada completa encerra a geração.
+# A última chave exigida é a última linha do bloco no prompt do agent (o
+# corte nunca perde as linhas seguintes). O DecisionAgent escreve a mensagem
+# ao cliente DENTRO do bloco, então só corta no `---` de fechamento (sem
+# chaves obrigatórias).
+AGENT_LLM_PROFILES = {
+    "CustomerValidator": {"max_tokens": 512, "required_keys": ("STATUS", "PODE_PROSSEGUIR")},
+    "DocumentAnalyzer": {"max_tokens": 768, "required_keys": ("STATUS", "DATA_COMPRA", "CATEGORIA", "PODE_PROSSEGUIR")},
+    "EligibilityValidator": {"max_tokens": 768, "required_keys": ("STATUS", "PODE_PROSSEGUIR")},
+    "ExchangeClassifier": {"max_tokens": 512, "required_keys": ("TIPO_TROCA_CLASSIFICADO", "REQUER_ESTOQUE")},
+    "InventoryValidator": {"max_tokens": 640, "required_keys": ("STATUS", "PODE_PROSSEGUIR", "OBSERVACOES")},
+    "DecisionAgent": {"max_tokens": 1536, "required_keys": ()},
+}
+
+_throttle: Optional[ProviderThrottle] = None
+_hedger: Optional[HedgedCaller] = None
+_breaker: Optional[CircuitBreaker] = None
+_lock = threading.Lock()
+
+
+def _env_float(nome: str, padrao: float) -> float:
+    valor = os.getenv(nome)
+    return float(valor) if valor not in (None, "") else padrao
+
+
+def _env_bool(nome: str, padrao: bool) -> bool:
+    valor = os.getenv(nome)
+    if valor in (None, ""):
+        return padrao
+    return valor.strip().lower() in ("1", "true", "sim", "yes", "on")
+
+
+def get_provider_throttle() -> Optional[ProviderThrottle]:
+    """
+    Retorna o ProviderThrottle compartilhado do processo
+
+    CONCEITO - Lazy Singleton:
+    Criado na primeira chamada e reutilizado por todos os agents.
+    Retorna None se o controle estiver desligado.
+    """
+    global _throttle
+
+    if not _env_bool("LLM_RATE_LIMIT_ENABLED", True):
+        return None
+
+    with _lock:
+        if _throttle is None:
+            latency_target = os.getenv("LLM_LATENCY_TARGET_SECONDS")
+            _throttle = ProviderThrottle(
+                rate_limiter=RateLimiter(
+                    requests_per_minute=_env_float("LLM_REQUESTS_PER_MINUTE", 30),
+                    tokens_per_minute=_env_float("LLM_TOKENS_PER_MINUTE", 12000),
+                ),
+                concurrency=AIMDConcurrencyLimiter(
+                    initial_limit=_env_float("LLM_INITIAL_CONCURRENCY", 4),
+                    max_limit=_env_float("LLM_MAX_CONCURRENCY", 16),
+                    latency_target=float(latency_target) if latency_target else None,
+                ),
+                max_retries=int(_env_float("LLM_MAX_RETRIES", 4)),
+            )
+        return _throttle
+
+
+def get_hedger() -> Optional[HedgedCaller]:
+    """
+    Retorna o HedgedCaller compartilhado, ou None se o hedging estiver desligado
+
+    Hedging é opt-in: cada cópia consome cota do provedor.
+    """
+    global _hedger
+
+    if not _env_bool("LLM_HEDGE_ENABLED", False):
+        return None
+
+    with _lock:
+        if _hedger is None:
+            _hedger = HedgedCaller(
+                percentile=_env_float("LLM_HEDGE_PERCENTILE", 95),
+                min_samples=int(_env_float("LLM_HEDGE_MIN_SAMPLES", 20)),
+                budget=HedgeBudget(ratio=_env_float("LLM_HEDGE_BUDGET_RATIO", 0.1)),
+            )
+        return _hedger
+
+
+def get_circuit_breaker() -> Optional[CircuitBreaker]:
+    """
+    Retorna o CircuitBreaker compartilhado, ou None se estiver desligado
+
+    O mesmo circuito protege todos os agents e é consultado pelo
+    orquestrador para adiar jornadas enquanto o provedor estiver fora.
+    """
+    global _breaker
+
+    if not _env_bool("LLM_CIRCUIT_BREAKER_ENABLED", True):
+        return None
+
+    with _lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                failure_rate_threshold=_env_float("LLM_CIRCUIT_FAILURE_RATE", 0.5),
+                window_seconds=_env_float("LLM_CIRCUIT_WINDOW_SECONDS", 30),
+                min_requests=int(_env_float("LLM_CIRCUIT_MIN_REQUESTS", 5)),
+                open_seconds=_env_float("LLM_CIRCUIT_OPEN_SECONDS", 30),
+            )
+        return _breaker
+
+
+def resolve_max_tokens(agent_name: str, max_tokens: Optional[int] = None) -> Optional[int]:
+    """
+    Teto de tokens gerados para o agent
+
+    Prioridade: argumento explícito > LLM_MAX_TOKENS_<AGENT> > perfil padrão.
+    """
+    if max_tokens is not None:
+        return max_tokens
+    valor = os.getenv(f"LLM_MAX_TOKENS_{agent_name.upper()}")
+    if valor:
+        return int(valor)
+    return AGENT_LLM_PROFILES.get(agent_name, {}).get("max_tokens")
+
+
+def create_llm(agent_name: str, model_name: str, temperature: float,
+               max_tokens: Optional[int] = None,
+               stop_sequences: Optional[List[str]] = None) -> "GuardedChatModel":
+    """
+    Cria o LLM de um agent já conectado aos controles compartilhados
+
+    Args:
+        agent_name: Nome do agent (ex: "CustomerValidator")
+        model_name: Modelo da Groq
+        temperature: Temperatura do modelo
+        max_tokens: Teto de tokens gerados por chamada (None = perfil do agent)
+        stop_sequences: Stop sequences extras, somadas às do ReAct
+
+    Returns:
+        Chat model pronto para create_react_agent
+    """
+    # Importados aqui: carregar o cliente Groq só compensa quando um agent é criado
+    from langchain_groq import ChatGroq
+    from llm.guarded_chat_model import GuardedChatModel
+
+    early_stop = None
+    if _env_bool("LLM_EARLY_STOP_ENABLED", True):
+        perfil = AGENT_LLM_PROFILES.get(agent_name, {})
+        early_stop = StructuredAnswerDetector(required_keys=perfil.get("required_keys", ()))
+
+    inner = ChatGroq(
+        model=model_name,
+        temperature=temperature,
+        groq_api_key=os.getenv("GROQ_API_KEY"),
+        max_tokens=resolve_max_tokens(agent_name, max_tokens),
+        # Retentativas ficam a cargo do ProviderThrottle (com jitter e AIMD);
+        # retentar também no cliente multiplicaria as chamadas em caso de 429.
+        max_retries=0
+    )
+
+    return GuardedChatModel(
+        inner=inner,
+        throttle=get_provider_throttle(),
+        hedger=get_hedger(),
+        breaker=get_circuit_breaker(),
+        stop_sequences=list(stop_sequences or []),
+        early_stop=early_stop,
+        agent_name=agent_name
+    )
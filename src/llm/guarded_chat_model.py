@@ -0,0 +1,198 @@
+"""
+Chat model "protegido" que envolve o LLM real de cada agent
+
+CONCEITO - Decorator Pattern:
+O GuardedChatModel é um BaseChatModel do LangChain que delega a geração ao
+modelo real (ChatGroq), mas passa antes por controles compartilhados
+(circuit breaker, limitador de vazão, concorrência adaptativa, retentativas
+e, opcionalmente, hedging de requisições lentas).
+
+Como ele continua sendo um chat model comum, `create_react_agent` e o
+`AgentExecutor` funcionam sem nenhuma alteração.
+
+CONCEITO - Stop Sequences + Streaming Early-Cut:
+Stop sequences extras por agent são somadas às do ReAct, e com um
+detector de resposta estruturada a geração é lida em streaming e
+abortada assim que o bloco final está completo (ver llm/early_stop.py).
+"""
+
+from typing import Any, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.messages.ai import UsageMetadata, add_usage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from llm.early_stop import current_blocos_esperados
+from llm.usage import record_llm_call
+
+# Estimativa conservadora quando o modelo não define max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def estimate_tokens(messages: List[BaseMessage], max_tokens: Optional[int] = None) -> int:
+    """
+    Estima o custo em tokens de uma chamada
+
+    Heurística de ~4 caracteres por token para o prompt, mais o teto
+    de geração. A estimativa é corrigida depois com o uso real.
+    """
+    caracteres = sum(len(str(m.content)) for m in messages)
+    return caracteres // 4 + (max_tokens or DEFAULT_COMPLETION_TOKENS)
+
+
+def _token_usage(messages: List[BaseMessage], texto: str, uso: Optional[UsageMetadata],
+                 completo: bool) -> dict:
+    """
+    token_usage (formato do llm_output) de uma geração em streaming
+
+    O provedor informa o uso no último pedaço do stream. Uma geração cortada
+    (ou um provedor que não informa) tem o uso estimado: ~4 caracteres por
+    token do prompt (ou o prompt informado) e do texto gerado até o corte.
+    """
+    if completo and uso and uso.get("total_tokens"):
+        return {
+            "prompt_tokens": uso.get("input_tokens", 0),
+            "completion_tokens": uso.get("output_tokens", 0),
+            "total_tokens": uso["total_tokens"]
+        }
+    prompt = (uso or {}).get("input_tokens") or sum(len(str(m.content)) for m in messages) // 4
+    geracao = max((uso or {}).get("output_tokens", 0), len(texto) // 4)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": geracao,
+        "total_tokens": prompt + geracao,
+        "estimado": True
+    }
+
+
+def total_tokens_of(result: ChatResult) -> Optional[int]:
+    """Extrai o total de tokens consumidos informado pelo provedor"""
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class GuardedChatModel(BaseChatModel):
+    """
+    Envolve um chat model aplicando os controles compartilhados do provedor
+
+    Atributos:
+        inner: Modelo real (ex: ChatGroq)
+        throttle: ProviderThrottle compartilhado (None = sem controle)
+        hedger: HedgedCaller compartilhado (None = sem hedging)
+        breaker: CircuitBreaker compartilhado (None = sem circuit breaker)
+        stop_sequences: Stop sequences extras do agent
+        early_stop: StructuredAnswerDetector (None = sem corte antecipado)
+        agent_name: Nome do agent, usado em métricas, logs e perfil de latência
+    """
+
+    inner: BaseChatModel
+    throttle: Any = None
+    hedger: Any = None
+    breaker: Any = None
+    stop_sequences: List[str] = []
+    early_stop: Any = None
+    agent_name: str = "agent"
+
+    @property
+    def _llm_type(self) -> str:
+        return f"guarded-{self.inner._llm_type}"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if self.stop_sequences:
+            stop = list(stop or []) + [seq for seq in self.stop_sequences if seq not in (stop or [])]
+
+        # Lido aqui: o hedging pode executar a chamada em outra thread
+        blocos = current_blocos_esperados()
+
+        def chamada() -> ChatResult:
+            if self.early_stop is None:
+                return self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return self._generate_with_early_stop(messages, stop, run_manager, blocos=blocos, **kwargs)
+
+        def tentativa() -> ChatResult:
+            if self.throttle is None:
+                return chamada()
+            estimado = estimate_tokens(messages, getattr(self.inner, "max_tokens", None))
+            return self.throttle.call(chamada, estimated_tokens=estimado, usage_of=total_tokens_of)
+
+        def protegida() -> ChatResult:
+            # Cada cópia do hedging passa pelo throttle como uma chamada normal
+            if self.hedger is None:
+                return tentativa()
+            return self.hedger.call(self.agent_name, tentativa)
+
+        # O circuito avalia o resultado final (após retentativas e hedging)
+        if self.breaker is None:
+            resultado = protegida()
+        else:
+            resultado = self.breaker.call(protegida)
+
+        record_llm_call(total_tokens_of(resultado) or 0)
+        return resultado
+
+    def _generate_with_early_stop(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]],
+        run_manager: Optional[CallbackManagerForLLMRun],
+        blocos: int = 1,
+        **kwargs: Any,
+    ) -> ChatResult:
+        """
+        Gera em streaming e aborta assim que a resposta estruturada está completa
+
+        Modelos sem suporte a streaming geram normalmente e têm o texto
+        excedente descartado (sem ganho de latência, mas com saída enxuta).
+
+        Args:
+            blocos: Blocos estruturados esperados (um por item numa chamada em lote)
+        """
+        if type(self.inner)._stream is BaseChatModel._stream:
+            resultado = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            texto = str(resultado.generations[0].message.content)
+            corte = self.early_stop.cut_position(texto, blocos)
+            if corte is not None and corte < len(texto):
+                resultado.generations[0] = ChatGeneration(message=AIMessage(content=texto[:corte]))
+            return resultado
+
+        texto = ""
+        cortado = False
+        uso: Optional[UsageMetadata] = None
+        stream = self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+        try:
+            for chunk in stream:
+                uso_chunk = getattr(chunk.message, "usage_metadata", None)
+                if uso_chunk:
+                    uso = add_usage(uso, uso_chunk)
+                parte = str(chunk.message.content)
+                texto += parte
+                # O bloco só pode fechar num fim de linha ou num delimitador
+                if "\n" not in parte and "-" not in parte:
+                    continue
+                corte = self.early_stop.cut_position(texto, blocos)
+                if corte is not None:
+                    texto = texto[:corte]
+                    cortado = True
+                    break
+        finally:
+            # Fechar o gerador encerra a conexão de streaming com o provedor
+            stream.close()
+
+        token_usage = _token_usage(messages, texto, uso, completo=not cortado)
+        mensagem = AIMessage(content=texto, usage_metadata={
+            "input_tokens": token_usage["prompt_tokens"],
+            "output_tokens": token_usage["completion_tokens"],
+            "total_tokens": token_usage["total_tokens"]
+        })
+        return ChatResult(
+            generations=[ChatGeneration(message=mensagem)],
+            llm_output={"early_stop": cortado, "token_usage": token_usage}
+        )
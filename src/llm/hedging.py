@@ -0,0 +1,166 @@
+"""
+Requisições "hedged" para reduzir a latência de cauda (p99)
+
+CONCEITO - Hedged Requests:
+A latência de uma jornada é a soma de várias chamadas sequenciais ao LLM,
+então uma única resposta lenta do provedor domina o p99. Com hedging,
+se uma chamada passar do percentil alto de latência observado (ex: p95),
+disparamos uma cópia idêntica e usamos a primeira que responder.
+
+CONCEITO - Hedge Budget:
+Sem limite, hedging vira amplificação de carga justamente quando o
+provedor está lento. O orçamento limita as cópias a uma fração das
+requisições (ex: 10%), acumulando crédito a cada chamada normal.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+
+class LatencyTracker:
+    """
+    Janela deslizante de latências por chave (ex: por agent)
+
+    Cada agent tem um perfil de latência próprio (o DecisionAgent gera
+    muito mais texto que o ExchangeClassifier), por isso os percentis
+    são calculados separadamente.
+    """
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, latency: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(latency)
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, p: float) -> Optional[float]:
+        """Percentil `p` (0-100) das latências da chave, ou None sem amostras"""
+        with self._lock:
+            amostras = sorted(self._samples.get(key, ()))
+        if not amostras:
+            return None
+        indice = min(int(round(p / 100.0 * (len(amostras) - 1))), len(amostras) - 1)
+        return amostras[indice]
+
+
+class HedgeBudget:
+    """
+    Orçamento de cópias: cada requisição rende `ratio` de crédito,
+    cada cópia custa 1. O crédito acumulado é limitado a `max_credit`.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_credit: float = 10.0):
+        self.ratio = ratio
+        self.max_credit = max_credit
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        with self._lock:
+            self._credit = min(self.max_credit, self._credit + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._credit >= 1.0:
+                self._credit -= 1.0
+                return True
+            return False
+
+
+class HedgedCaller:
+    """
+    Executa chamadas com hedging baseado em percentil
+
+    Enquanto não houver `min_samples` amostras para a chave, as chamadas
+    seguem sem cópia (não há base para definir o limiar).
+    """
+
+    def __init__(self, percentile: float = 95.0, min_samples: int = 20,
+                 budget: Optional[HedgeBudget] = None, tracker: Optional[LatencyTracker] = None,
+                 max_workers: int = 32, clock: Callable[[], float] = time.monotonic):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget or HedgeBudget()
+        self.tracker = tracker or LatencyTracker()
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge")
+
+        self._stats_lock = threading.Lock()
+        self.stats = {"chamadas": 0, "hedges": 0, "hedges_vencedores": 0, "sem_orcamento": 0}
+
+    def _count(self, chave: str):
+        with self._stats_lock:
+            self.stats[chave] += 1
+
+    def threshold(self, key: str) -> Optional[float]:
+        """Limiar de latência a partir do qual a cópia é disparada"""
+        if self.tracker.count(key) < self.min_samples:
+            return None
+        return self.tracker.percentile(key, self.percentile)
+
+    def _submit(self, key: str, fn: Callable[[], Any]):
+        inicio = self._clock()
+
+        def executar():
+            resultado = fn()
+            # Só latências de sucesso alimentam o percentil
+            self.tracker.record(key, self._clock() - inicio)
+            return resultado
+
+        return self._executor.submit(executar)
+
+    def call(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Executa `fn`, disparando uma cópia se ela passar do limiar
+
+        Args:
+            key: Chave do perfil de latência (nome do agent)
+            fn: Chamada idempotente ao provedor
+
+        Returns:
+            Resultado da primeira chamada bem-sucedida
+        """
+        self._count("chamadas")
+        self.budget.earn()
+
+        limiar = self.threshold(key)
+        if limiar is None:
+            inicio = self._clock()
+            resultado = fn()
+            self.tracker.record(key, self._clock() - inicio)
+            return resultado
+
+        primaria = self._submit(key, fn)
+        concluidas, _ = wait([primaria], timeout=limiar)
+        if concluidas:
+            return primaria.result()
+
+        if not self.budget.try_spend():
+            self._count("sem_orcamento")
+            return primaria.result()
+
+        self._count("hedges")
+        copia = self._submit(key, fn)
+        pendentes = {primaria, copia}
+        erro: Optional[BaseException] = None
+
+        # A primeira resposta de sucesso vence; a outra é descartada
+        while pendentes:
+            concluidas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidas:
+                if futuro.exception() is None:
+                    if futuro is copia:
+                        self._count("hedges_vencedores")
+                    return futuro.result()
+                erro = futuro.exception()
+
+        raise erro
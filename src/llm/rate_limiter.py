@@ -0,0 +1,333 @@
+"""
+Controle de vazão (rate limiting) e concorrência adaptativa para o provedor de LLM
+
+CONCEITO - Token Bucket:
+Cada cota do provedor (requisições/minuto e tokens/minuto) é modelada como
+um "balde" que se reabastece continuamente. Antes de cada chamada o agent
+retira do balde o custo estimado; se o balde estiver vazio, a chamada espera
+o tempo exato necessário em vez de disparar e receber um 429.
+
+CONCEITO - AIMD (Additive Increase / Multiplicative Decrease):
+O mesmo algoritmo usado pelo controle de congestionamento do TCP.
+A cada resposta bem-sucedida o limite de chamadas simultâneas cresce devagar
+(+1 por "janela"); a cada 429 (ou latência acima do alvo) ele é cortado
+multiplicativamente. O resultado é uma vazão que fica próxima da cota real
+do provedor sem tempestades de erros.
+
+CONCEITO - Jittered Backoff:
+Retentativas com espera exponencial e aleatória ("full jitter") evitam que
+várias jornadas concorrentes retentem todas no mesmo instante.
+
+Todas as classes são thread-safe: um único ProviderThrottle é compartilhado
+por todos os agents do processo (ver llm/factory.py).
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class TokenBucket:
+    """
+    Balde de tokens com reabastecimento contínuo
+
+    Usa o modelo de "reserva": o saldo pode ficar negativo, e quem reservou
+    dorme o tempo necessário para quitar a dívida. Assim a ordem de chegada
+    é preservada sem precisar de filas explícitas.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            capacity: Tamanho máximo do balde (rajada permitida)
+            refill_per_second: Taxa de reabastecimento
+            clock: Relógio monotônico (injetável para testes)
+        """
+        if capacity <= 0 or refill_per_second <= 0:
+            raise ValueError("capacity e refill_per_second devem ser positivos")
+
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        agora = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (agora - self._last) * self.refill_per_second)
+        self._last = agora
+
+    def reserve(self, amount: float) -> float:
+        """
+        Debita `amount` do balde e retorna quantos segundos esperar
+
+        Pedidos maiores que a capacidade são limitados à capacidade,
+        caso contrário nunca seriam atendidos.
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.refill_per_second
+
+    def adjust(self, delta: float):
+        """
+        Corrige o saldo após conhecer o custo real
+
+        delta > 0 devolve tokens (estimativa foi maior que o uso real);
+        delta < 0 cobra a diferença.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + delta)
+
+    @property
+    def available(self) -> float:
+        """Saldo atual do balde (pode ser negativo)"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class RateLimiter:
+    """
+    Limitador de cotas do provedor: requisições/minuto e tokens/minuto
+
+    CONCEITO - Dual Quota:
+    Provedores como a Groq limitam tanto o número de requisições quanto o
+    volume de tokens. Uma chamada só é liberada quando cabe nas duas cotas.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0, clock)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0, clock)
+        self._sleep = sleep
+
+    def acquire(self, estimated_tokens: int) -> float:
+        """
+        Bloqueia até a chamada caber nas duas cotas
+
+        Returns:
+            Tempo total de espera, em segundos
+        """
+        espera = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+        if espera > 0:
+            self._sleep(espera)
+        return espera
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Ajusta a cota de tokens com o uso real informado pelo provedor"""
+        if actual_tokens is None:
+            return
+        self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+class AIMDConcurrencyLimiter:
+    """
+    Limite de chamadas simultâneas ajustado por AIMD
+
+    - Sucesso com latência normal: limite += 1 / limite (≈ +1 por janela)
+    - 429: limite *= decrease_factor
+    - 5xx, timeout ou falha de conexão: limite *= latency_decrease_factor (corte suave)
+    - Latência acima do alvo: limite *= latency_decrease_factor
+    - Outros erros (ex: requisição inválida): limite mantido
+
+    Cortes consecutivos são agrupados por `cooldown` segundos para que uma
+    rajada de 429 (todas as chamadas em voo falhando juntas) conte como um
+    único sinal de congestionamento.
+    """
+
+    def __init__(self, initial_limit: float = 4, min_limit: float = 1, max_limit: float = 16,
+                 decrease_factor: float = 0.5, latency_target: Optional[float] = None,
+                 latency_decrease_factor: float = 0.9, cooldown: float = 1.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.decrease_factor = decrease_factor
+        self.latency_target = latency_target
+        self.latency_decrease_factor = latency_decrease_factor
+        self.cooldown = cooldown
+        self._clock = clock
+
+        self._limit = min(max(float(initial_limit), self.min_limit), self.max_limit)
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """Limite inteiro efetivo de chamadas simultâneas"""
+        return max(int(self._limit), 1)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Aguarda uma vaga de concorrência"""
+        with self._cond:
+            ok = self._cond.wait_for(lambda: self._in_flight < self.limit, timeout)
+            if ok:
+                self._in_flight += 1
+            return ok
+
+    def release(self, latency: float, rate_limited: bool = False, error: Optional[BaseException] = None):
+        """
+        Libera a vaga e alimenta o controle AIMD
+
+        Só uma chamada bem-sucedida aumenta o limite: um provedor falhando
+        não pode receber mais chamadas simultâneas.
+
+        Args:
+            latency: Duração da chamada, em segundos
+            rate_limited: True se a chamada recebeu 429
+            error: Exceção da chamada que falhou (None = sucesso)
+        """
+        with self._cond:
+            self._in_flight = max(self._in_flight - 1, 0)
+
+            if rate_limited:
+                self._decrease(self.decrease_factor)
+            elif error is not None:
+                if is_transient_error(error):
+                    self._decrease(self.latency_decrease_factor)
+            elif self.latency_target is not None and latency > self.latency_target:
+                self._decrease(self.latency_decrease_factor)
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float):
+        agora = self._clock()
+        if agora - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = agora
+        self._limit = max(self.min_limit, self._limit * factor)
+
+
+def jittered_backoff(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """
+    Espera para a retentativa `attempt` (0, 1, 2...) com "full jitter"
+
+    CONCEITO - Full Jitter:
+    Sorteia uniformemente entre 0 e o teto exponencial. Espalha as
+    retentativas no tempo e, na média, termina antes do backoff fixo.
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Identifica respostas 429 do provedor (Groq/OpenAI-like ou genéricas)"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    if type(error).__name__ == "RateLimitError":
+        return True
+    mensagem = str(error).lower()
+    return "429" in mensagem or "rate limit" in mensagem
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Erros que valem uma retentativa: 5xx, timeouts e falhas de conexão"""
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return type(error).__name__ in ("APITimeoutError", "APIConnectionError", "TimeoutError", "ConnectionError")
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Lê o header Retry-After da resposta de erro, se houver"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    valor = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(valor) if valor is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderThrottle:
+    """
+    Porta de entrada única para todas as chamadas ao provedor de LLM
+
+    Combina, nesta ordem:
+    1. RateLimiter (cotas RPM/TPM)
+    2. AIMDConcurrencyLimiter (vagas simultâneas adaptativas)
+    3. Retentativas com jittered backoff para 429 e erros transitórios
+    """
+
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None,
+                 concurrency: Optional[AIMDConcurrencyLimiter] = None,
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_cap: float = 30.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._sleep = sleep
+        self._clock = clock
+
+        self._stats_lock = threading.Lock()
+        self.stats = {"chamadas": 0, "rate_limited": 0, "retentativas": 0, "espera_cota_s": 0.0}
+
+    def _count(self, chave: str, valor: float = 1):
+        with self._stats_lock:
+            self.stats[chave] += valor
+
+    def call(self, fn: Callable[[], Any], estimated_tokens: int = 0,
+             usage_of: Optional[Callable[[Any], Optional[int]]] = None) -> Any:
+        """
+        Executa `fn` respeitando cotas, concorrência e retentativas
+
+        Args:
+            fn: Chamada ao provedor (sem argumentos)
+            estimated_tokens: Custo estimado em tokens (prompt + completion)
+            usage_of: Extrai o total de tokens realmente consumidos do resultado
+
+        Returns:
+            Resultado de `fn`
+        """
+        tentativa = 0
+        while True:
+            if self.rate_limiter:
+                self._count("espera_cota_s", self.rate_limiter.acquire(estimated_tokens))
+            if self.concurrency:
+                self.concurrency.acquire()
+
+            inicio = self._clock()
+            self._count("chamadas")
+            try:
+                resultado = fn()
+            except Exception as e:
+                latencia = self._clock() - inicio
+                limitado = is_rate_limit_error(e)
+                if self.concurrency:
+                    self.concurrency.release(latencia, rate_limited=limitado, error=e)
+                if limitado:
+                    self._count("rate_limited")
+
+                if tentativa >= self.max_retries or not (limitado or is_transient_error(e)):
+                    raise
+
+                espera = jittered_backoff(tentativa, self.backoff_base, self.backoff_cap)
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    espera = max(espera, retry_after)
+                tentativa += 1
+                self._count("retentativas")
+                self._sleep(espera)
+                continue
+
+            if self.concurrency:
+                self.concurrency.release(self._clock() - inicio)
+            if self.rate_limiter and usage_of is not None:
+                self.rate_limiter.reconcile(estimated_tokens, usage_of(resultado))
+            return resultado
@@ -0,0 +1,50 @@
+"""
+Contabilização de chamadas e tokens de LLM por jornada
+
+CONCEITO - Context-Scoped Metrics:
+Os agents chamam o LLM através do AgentExecutor, sem saber de qual jornada
+fazem parte. Um ContextVar guarda o contador da jornada em execução: o
+orquestrador abre o escopo, o GuardedChatModel incrementa, e jornadas
+simultâneas (em threads diferentes) não se misturam.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+
+class LLMUsage:
+    """Chamadas e tokens consumidos dentro de um escopo"""
+
+    __slots__ = ("chamadas", "tokens")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.tokens = 0
+
+
+_current_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_llm_usage() -> Iterator[LLMUsage]:
+    """Abre um escopo de contabilização (um por jornada)"""
+    uso = LLMUsage()
+    token = _current_usage.set(uso)
+    try:
+        yield uso
+    finally:
+        _current_usage.reset(token)
+
+
+def current_llm_usage() -> Optional[LLMUsage]:
+    """Contador do escopo atual, ou None fora de uma jornada"""
+    return _current_usage.get()
+
+
+def record_llm_call(tokens: int):
+    """Registra uma chamada concluída no escopo atual (sem escopo, não faz nada)"""
+    uso = _current_usage.get()
+    if uso is not None:
+        uso.chamadas += 1
+        uso.tokens += tokens
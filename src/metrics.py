@@ -0,0 +1,181 @@
+"""
+Registro de métricas do processo
+
+CONCEITO - Metrics Registry:
+Componentes com cache (tools, deduplicação de jornadas) registram aqui os
+seus acertos e falhas por nome, componentes com fila (escalonador de
+jornadas) registram os tempos de espera e filtros probabilísticos (Bloom
+de CPFs) registram as rejeições e os falsos positivos. O painel de operação lê um
+snapshot do registro sem conhecer cada componente.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+class CacheStats:
+    """Contadores de um cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LatencyStats:
+    """
+    Janela das últimas medições de uma duração (em ms)
+
+    Os percentis são calculados sobre as `window` medições mais recentes,
+    então refletem a carga atual e não o histórico do processo.
+    """
+
+    def __init__(self, window: int = 2048):
+        self.count = 0
+        self._valores: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float):
+        with self._lock:
+            self.count += 1
+            self._valores.append(ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Percentil `p` (0-100) da janela, ou None sem medições"""
+        with self._lock:
+            valores = sorted(self._valores)
+        if not valores:
+            return None
+        indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+        return valores[indice]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """count, p50, p95 e p99 da janela"""
+        resumo: Dict[str, Optional[float]] = {"count": self.count}
+        for p in (50, 95, 99):
+            valor = self.percentile(p)
+            resumo[f"p{p}"] = round(valor, 1) if valor is not None else None
+        return resumo
+
+
+class FilterStats:
+    """
+    Contadores de um filtro de pertinência probabilístico
+
+    Um filtro de Bloom nunca erra um "não está", mas pode dizer "talvez
+    esteja" para uma chave ausente. A taxa de falsos positivos medida é
+    falsos_positivos / (falsos_positivos + rejeitados), ou seja, entre as
+    chaves ausentes, a fração que o filtro deixou passar até a base.
+    """
+
+    def __init__(self):
+        self.rejeitados = 0
+        self.confirmados = 0
+        self.falsos_positivos = 0
+        self._lock = threading.Lock()
+
+    def rejeitado(self):
+        """O filtro respondeu "não está" e a base não foi consultada"""
+        with self._lock:
+            self.rejeitados += 1
+
+    def confirmado(self):
+        """O filtro deixou passar e a chave existia"""
+        with self._lock:
+            self.confirmados += 1
+
+    def falso_positivo(self):
+        """O filtro deixou passar e a chave não existia"""
+        with self._lock:
+            self.falsos_positivos += 1
+
+    @property
+    def taxa_falsos_positivos(self) -> float:
+        ausentes = self.falsos_positivos + self.rejeitados
+        return self.falsos_positivos / ausentes if ausentes else 0.0
+
+
+class MetricsRegistry:
+    """Registro de caches, latências e filtros nomeados do processo"""
+
+    def __init__(self):
+        self._caches: Dict[str, CacheStats] = {}
+        self._latencies: Dict[str, LatencyStats] = {}
+        self._filters: Dict[str, FilterStats] = {}
+        self._lock = threading.Lock()
+
+    def cache(self, nome: str) -> CacheStats:
+        """Contadores do cache `nome` (criados no primeiro uso)"""
+        with self._lock:
+            if nome not in self._caches:
+                self._caches[nome] = CacheStats()
+            return self._caches[nome]
+
+    def latency(self, nome: str) -> LatencyStats:
+        """Janela de latência `nome` (criada no primeiro uso)"""
+        with self._lock:
+            if nome not in self._latencies:
+                self._latencies[nome] = LatencyStats()
+            return self._latencies[nome]
+
+    def filter(self, nome: str) -> FilterStats:
+        """Contadores do filtro `nome` (criados no primeiro uso)"""
+        with self._lock:
+            if nome not in self._filters:
+                self._filters[nome] = FilterStats()
+            return self._filters[nome]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Estado atual de todos os caches: hits, misses e hit_rate"""
+        with self._lock:
+            caches = dict(self._caches)
+        return {
+            nome: {"hits": c.hits, "misses": c.misses, "hit_rate": round(c.hit_rate, 4)}
+            for nome, c in sorted(caches.items())
+        }
+
+    def latency_snapshot(self, prefixo: str = "") -> Dict[str, Dict[str, Optional[float]]]:
+        """Resumo (count, p50, p95, p99) das latências cujo nome começa com `prefixo`"""
+        with self._lock:
+            latencias = dict(self._latencies)
+        return {
+            nome: l.summary()
+            for nome, l in sorted(latencias.items())
+            if nome.startswith(prefixo)
+        }
+
+    def filter_snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Estado atual dos filtros: rejeitados, confirmados, falsos positivos e taxa medida"""
+        with self._lock:
+            filtros = dict(self._filters)
+        return {
+            nome: {
+                "rejeitados": f.rejeitados,
+                "confirmados": f.confirmados,
+                "falsos_positivos": f.falsos_positivos,
+                "taxa_falsos_positivos": round(f.taxa_falsos_positivos, 4)
+            }
+            for nome, f in sorted(filtros.items())
+        }
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Registro compartilhado do processo"""
+    return _registry
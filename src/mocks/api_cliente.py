@@ -1,15 +1,42 @@
 """
 Mock da API de Clientes
 Simula a consulta de dados do cliente no sistema
+
+CONCEITO - Normalized Key Index:
+"Joao Silva Santos" e "João  Silva Santos" são o mesmo cliente. A chave
+normalizada do nome (acentos removidos via NFKD, caixa e espaços
+uniformizados) é calculada uma vez no cadastro e guardada num índice;
+a validação compara chaves em O(1), sem depender do LLM para perceber
+que a diferença é trivial. Opcionalmente, uma distância de edição
+limitada (CLIENTE_NOME_MAX_DISTANCIA) tolera erros de digitação.
+
+CONCEITO - Negative Lookup Filter:
+Sondagens de fraude e CPFs digitados errado geram muitas consultas a CPFs
+que não existem, e cada uma seria uma consulta completa à base. Um filtro
+de Bloom com todos os CPFs cadastrados (ver bloom.py) responde "não
+encontrado" sem tocar na base quando o CPF com certeza não existe. O
+filtro é atualizado a cada cadastro e a taxa de falsos positivos medida
+fica no registro de métricas (`clientes.cpf`).
 """
 
-from typing import Dict, Optional
+import os
+import sys
+import threading
+import unicodedata
+from typing import Callable, Dict, List, Optional, Set
 from datetime import datetime
 
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from metrics import get_metrics_registry
+from mocks.bloom import BloomFilter
+
 # Base de dados mock de clientes
 CLIENTES_DB = {
-    "12345678900": {
-        "cpf": "12345678900",
+    "12345678909": {
+        "cpf": "12345678909",
         "nome": "João Silva Santos",
         "email": "joao.silva@email.com",
         "telefone": "(11) 98765-4321",
@@ -45,6 +72,75 @@ CLIENTES_DB = {
 }
 
 
+def normalizar_nome(nome: str) -> str:
+    """'  JOÃO  silva ' -> 'joao silva' (sem acentos, minúsculas, espaços simples)"""
+    decomposto = unicodedata.normalize("NFKD", nome or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.casefold().split())
+
+
+def distancia_limitada(a: str, b: str, limite: int) -> Optional[int]:
+    """
+    Distância de edição (Levenshtein) entre `a` e `b`, ou None se passar de `limite`
+
+    Calcula só a faixa diagonal de largura 2*limite+1 e para assim que
+    todas as células da linha passam do limite: O(len * limite).
+    """
+    if abs(len(a) - len(b)) > limite:
+        return None
+    if a == b:
+        return 0
+
+    infinito = limite + 1
+    anterior = [j if j <= limite else infinito for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        atual = [infinito] * (len(b) + 1)
+        if i <= limite:
+            atual[0] = i
+        for j in range(max(1, i - limite), min(len(b), i + limite) + 1):
+            custo = 0 if a[i - 1] == b[j - 1] else 1
+            atual[j] = min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + custo, infinito)
+        if min(atual) > limite:
+            return None
+        anterior = atual
+    return anterior[-1] if anterior[-1] <= limite else None
+
+
+# Chave normalizada do nome por CPF e índice chave -> CPFs
+NOMES_NORMALIZADOS: Dict[str, str] = {}
+INDICE_NOMES: Dict[str, Set[str]] = {}
+
+
+def _indexar_cliente(cliente: Dict):
+    """Calcula a chave normalizada do nome do cliente e a registra no índice"""
+    anterior = NOMES_NORMALIZADOS.get(cliente["cpf"])
+    if anterior is not None:
+        INDICE_NOMES.get(anterior, set()).discard(cliente["cpf"])
+
+    chave = normalizar_nome(cliente["nome"])
+    NOMES_NORMALIZADOS[cliente["cpf"]] = chave
+    INDICE_NOMES.setdefault(chave, set()).add(cliente["cpf"])
+
+
+for _cliente in CLIENTES_DB.values():
+    _indexar_cliente(_cliente)
+
+# Erros de digitação tolerados no nome (0 = só diferenças de acento, caixa e espaços)
+NOME_MAX_DISTANCIA = int(os.getenv("CLIENTE_NOME_MAX_DISTANCIA", "0"))
+
+# Filtro de CPFs cadastrados; reconstruído com o dobro da capacidade quando enche
+_FILTRO_CAPACIDADE = int(os.getenv("CLIENTES_BLOOM_CAPACIDADE", "100000"))
+_FILTRO_TAXA = float(os.getenv("CLIENTES_BLOOM_FPR", "0.01"))
+_filtro_cpfs = BloomFilter.de_chaves(CLIENTES_DB, _FILTRO_CAPACIDADE, _FILTRO_TAXA)
+_filtro_stats = get_metrics_registry().filter("clientes.cpf")
+
+# Cadastros são serializados (base, índice de nomes e filtro mudam juntos)
+_cadastro_lock = threading.Lock()
+
+# Funções notificadas com o CPF após cada cadastro (ex: caches de consulta)
+_CADASTRO_LISTENERS: List[Callable[[str], None]] = []
+
+
 class APICliente:
     """
     Mock da API de consulta de clientes
@@ -67,7 +163,16 @@ class APICliente:
         # Remove caracteres não numéricos
         cpf_limpo = ''.join(filter(str.isdigit, cpf))
 
-        cliente = CLIENTES_DB.get(cpf_limpo)
+        # "Não está" do filtro é definitivo: responde sem consultar a base
+        if cpf_limpo not in _filtro_cpfs:
+            _filtro_stats.rejeitado()
+            cliente = None
+        else:
+            cliente = CLIENTES_DB.get(cpf_limpo)
+            if cliente:
+                _filtro_stats.confirmado()
+            else:
+                _filtro_stats.falso_positivo()
 
         if cliente:
             return {
@@ -82,6 +187,64 @@ class APICliente:
                 "timestamp": datetime.now().isoformat()
             }
 
+    @staticmethod
+    def cadastrar_cliente(cliente: Dict) -> Dict:
+        """
+        Cadastra (ou atualiza) um cliente
+
+        Atualiza a base, o índice de nomes e o filtro de CPFs, e avisa os
+        listeners para que um "não encontrado" em cache não esconda o cadastro.
+
+        Args:
+            cliente: Dados do cliente (mesmos campos de CLIENTES_DB; `cpf` e `nome` obrigatórios)
+
+        Returns:
+            Resposta no formato de `consultar_cliente`
+        """
+        global _filtro_cpfs
+
+        cpf_limpo = ''.join(filter(str.isdigit, cliente.get("cpf", "")))
+        if len(cpf_limpo) != 11 or not cliente.get("nome"):
+            return {
+                "status": "error",
+                "message": "Cadastro exige CPF com 11 dígitos e nome",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        registro = {"ativo": True, "data_cadastro": datetime.now().date().isoformat(), **cliente, "cpf": cpf_limpo}
+        with _cadastro_lock:
+            CLIENTES_DB[cpf_limpo] = registro
+            _indexar_cliente(registro)
+            if cpf_limpo not in _filtro_cpfs:
+                if _filtro_cpfs.cheio:
+                    _filtro_cpfs = BloomFilter.de_chaves(CLIENTES_DB, 2 * _filtro_cpfs.capacidade, _FILTRO_TAXA)
+                else:
+                    _filtro_cpfs.add(cpf_limpo)
+
+        for callback in list(_CADASTRO_LISTENERS):
+            callback(cpf_limpo)
+
+        return {
+            "status": "success",
+            "data": registro,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def registrar_listener(callback: Callable[[str], None]):
+        """
+        Registra uma função chamada com o CPF após cada cadastro
+
+        Usado pelos caches de consulta para descartar um "não encontrado" guardado.
+        """
+        if callback not in _CADASTRO_LISTENERS:
+            _CADASTRO_LISTENERS.append(callback)
+
+    @staticmethod
+    def taxa_falsos_positivos_estimada() -> float:
+        """Taxa teórica do filtro de CPFs para o número atual de cadastros"""
+        return _filtro_cpfs.taxa_estimada()
+
     @staticmethod
     def validar_dados(cpf: str, nome: str, email: str) -> Dict:
         """
@@ -95,8 +258,23 @@ class APICliente:
         Returns:
             Resultado da validação
         """
-        cliente_response = APICliente.consultar_cliente(cpf)
+        return APICliente.comparar_dados(APICliente.consultar_cliente(cpf), nome, email)
 
+    @staticmethod
+    def comparar_dados(cliente_response: Dict, nome: str, email: str) -> Dict:
+        """
+        Compara os dados informados com uma resposta de `consultar_cliente`
+
+        Permite validar a partir de uma consulta já feita (ex: em cache).
+
+        Args:
+            cliente_response: Resposta de `consultar_cliente`
+            nome: Nome informado
+            email: Email informado
+
+        Returns:
+            Resultado da validação
+        """
         if cliente_response["status"] == "not_found":
             return {
                 "valido": False,
@@ -109,10 +287,11 @@ class APICliente:
         # Validações
         erros = []
 
-        if cliente["nome"].lower() != nome.lower():
+        correspondencia = APICliente.comparar_nome(cliente, nome)
+        if correspondencia is None:
             erros.append(f"Nome não confere. Cadastrado: {cliente['nome']}, Informado: {nome}")
 
-        if cliente["email"].lower() != email.lower():
+        if cliente["email"].strip().lower() != email.strip().lower():
             erros.append(f"Email não confere. Cadastrado: {cliente['email']}, Informado: {email}")
 
         if not cliente["ativo"]:
@@ -128,5 +307,37 @@ class APICliente:
         return {
             "valido": True,
             "dados_cliente": cliente,
+            "correspondencia_nome": correspondencia,
             "timestamp": datetime.now().isoformat()
         }
+
+    @staticmethod
+    def comparar_nome(cliente: Dict, nome: str, max_distancia: Optional[int] = None) -> Optional[str]:
+        """
+        Compara o nome informado com o cadastrado pela chave normalizada
+
+        Args:
+            cliente: Registro do cliente
+            nome: Nome informado
+            max_distancia: Erros de digitação tolerados (padrão: CLIENTE_NOME_MAX_DISTANCIA)
+
+        Returns:
+            "exata", "normalizada", "aproximada" ou None se não confere
+        """
+        if cliente["nome"] == nome:
+            return "exata"
+
+        cadastrado = NOMES_NORMALIZADOS.get(cliente["cpf"]) or normalizar_nome(cliente["nome"])
+        informado = normalizar_nome(nome)
+        if cadastrado == informado:
+            return "normalizada"
+
+        limite = NOME_MAX_DISTANCIA if max_distancia is None else max_distancia
+        if limite > 0 and distancia_limitada(cadastrado, informado, limite) is not None:
+            return "aproximada"
+        return None
+
+    @staticmethod
+    def buscar_por_nome(nome: str) -> List[Dict]:
+        """Clientes cujo nome tem a mesma chave normalizada (consulta O(1) no índice)"""
+        return [CLIENTES_DB[cpf] for cpf in sorted(INDICE_NOMES.get(normalizar_nome(nome), ()))]
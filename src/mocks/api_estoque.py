@@ -1,20 +1,100 @@
 """
 Mock da API de Estoque
 Simula a consulta e reserva de produtos no estoque
+
+CONCEITO - Multi-Warehouse Allocation:
+O estoque de cada produto é mantido por centro de distribuição (CD), e a
+reserva sai do CD mais próximo do cliente que tem o produto. A proximidade
+não é calculada na reserva: o índice UF -> CDs ordenados por distância é
+montado uma vez no carregamento do módulo (distância entre as capitais).
+
+CONCEITO - Per-Location Counters:
+Quantidade em estoque e quantidade reservada ficam em contadores por
+produto e CD, atualizados a cada reserva e cancelamento. A consulta de
+disponibilidade lê os contadores (custo constante por CD) em vez de somar
+todas as reservas a cada chamada.
+
+Os contadores e os dados cadastrais ficam no catálogo em colunas
+(sku_store.py), criado na primeira consulta a partir de ESTOQUE_DB ou
+mapeado de um arquivo .npy (ESTOQUE_CATALOGO_PATH). As reservas ficam no
+livro de reservas durável (reservation_ledger.py), recuperado junto com o
+catálogo: reiniciar o processo não libera o estoque reservado.
+
+Cada reserva vale ESTOQUE_RESERVAS_VALIDADE_HORAS (48 h por padrão) e
+guarda `expira_em`: as vencidas são expiradas no livro e devolvem as
+unidades na recuperação e na próxima consulta de estoque (`get_catalogo`).
+
+Cada reserva guarda a `origem` do chamador (ex: job e tentativa de um
+worker do serviço, ver `origem_das_reservas`), que permite a outro processo
+reconhecer reservas de uma execução interrompida e liberá-las.
 """
 
-from typing import Dict, Optional
-from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta
+import math
+import os
 import random
+import sys
+import threading
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from mocks.reservation_ledger import ReservationLedger, abrir_livro, livros_livres
+from mocks.sku_store import SkuStore
+
+# Centros de distribuição e a UF onde ficam
+CENTROS_DISTRIBUICAO = {
+    "CD-SP": {"uf": "SP", "cidade": "São Paulo"},
+    "CD-RJ": {"uf": "RJ", "cidade": "Rio de Janeiro"},
+    "CD-MG": {"uf": "MG", "cidade": "Belo Horizonte"},
+    "CD-PE": {"uf": "PE", "cidade": "Recife"},
+    "CD-RS": {"uf": "RS", "cidade": "Porto Alegre"},
+}
+
+# Coordenadas (lat, lon) das capitais, usadas só para montar o índice de proximidade
+_CAPITAIS = {
+    "AC": (-9.97, -67.81), "AL": (-9.67, -35.74), "AP": (0.03, -51.07), "AM": (-3.12, -60.02),
+    "BA": (-12.97, -38.50), "CE": (-3.73, -38.52), "DF": (-15.79, -47.88), "ES": (-20.32, -40.34),
+    "GO": (-16.68, -49.25), "MA": (-2.53, -44.30), "MT": (-15.60, -56.10), "MS": (-20.47, -54.62),
+    "MG": (-19.92, -43.94), "PA": (-1.46, -48.50), "PB": (-7.12, -34.86), "PR": (-25.43, -49.27),
+    "PE": (-8.05, -34.88), "PI": (-5.09, -42.80), "RJ": (-22.91, -43.17), "RN": (-5.79, -35.21),
+    "RS": (-30.03, -51.23), "RO": (-8.76, -63.90), "RR": (2.82, -60.67), "SC": (-27.60, -48.55),
+    "SP": (-23.55, -46.63), "SE": (-10.91, -37.07), "TO": (-10.18, -48.33),
+}
+
 
-# Base de dados mock de estoque
+def _distancia_km(origem: Tuple[float, float], destino: Tuple[float, float]) -> float:
+    """Distância (haversine) entre dois pontos (lat, lon)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*origem, *destino))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(a))
+
+
+# UF -> CDs do mais próximo ao mais distante
+PROXIMIDADE_CDS: Dict[str, Tuple[str, ...]] = {
+    uf: tuple(sorted(
+        CENTROS_DISTRIBUICAO,
+        key=lambda cd: _distancia_km(coordenadas, _CAPITAIS[CENTROS_DISTRIBUICAO[cd]["uf"]])
+    ))
+    for uf, coordenadas in _CAPITAIS.items()
+}
+
+# Ordem usada quando a UF do cliente não é conhecida (CD principal primeiro)
+ORDEM_PADRAO_CDS: Tuple[str, ...] = tuple(CENTROS_DISTRIBUICAO)
+
+# Base de dados mock de estoque (`estoque_cd`: unidades por centro de distribuição;
+# `localizacao` é o endereço no CD principal do produto)
 ESTOQUE_DB = {
     "PROD-001": {
         "codigo": "PROD-001",
         "nome": "Smartphone XYZ Pro",
         "categoria": "Eletrônicos",
         "preco": 2499.90,
-        "quantidade_disponivel": 15,
+        "estoque_cd": {"CD-SP": 9, "CD-RJ": 4, "CD-PE": 2},
         "localizacao": "CD-SP-A12",
         "ativo": True
     },
@@ -23,7 +103,7 @@ ESTOQUE_DB = {
         "nome": "Notebook ABC 15\"",
         "categoria": "Informática",
         "preco": 3999.00,
-        "quantidade_disponivel": 0,  # Sem estoque
+        "estoque_cd": {},  # Sem estoque
         "localizacao": "CD-SP-B05",
         "ativo": True
     },
@@ -32,7 +112,7 @@ ESTOQUE_DB = {
         "nome": "Fone Bluetooth Premium",
         "categoria": "Áudio",
         "preco": 599.90,
-        "quantidade_disponivel": 42,
+        "estoque_cd": {"CD-RJ": 30, "CD-SP": 12},
         "localizacao": "CD-RJ-C08",
         "ativo": True
     },
@@ -41,7 +121,7 @@ ESTOQUE_DB = {
         "nome": "Smart TV 55\" 4K",
         "categoria": "Eletrônicos",
         "preco": 2899.00,
-        "quantidade_disponivel": 8,
+        "estoque_cd": {"CD-SP": 8},
         "localizacao": "CD-SP-A15",
         "ativo": True
     },
@@ -50,7 +130,7 @@ ESTOQUE_DB = {
         "nome": "Tablet 10\" 128GB",
         "categoria": "Eletrônicos",
         "preco": 1499.00,
-        "quantidade_disponivel": 23,
+        "estoque_cd": {"CD-MG": 15, "CD-RS": 8},
         "localizacao": "CD-MG-D03",
         "ativo": True
     }
@@ -59,6 +139,102 @@ ESTOQUE_DB = {
 # Controle de reservas (em memória para o mock)
 RESERVAS = {}
 
+# Reservas, cancelamentos e expirações alteram os contadores sob o mesmo lock
+# (reentrante: a reserva consulta o catálogo, que expira as vencidas, com o lock)
+_estoque_lock = threading.RLock()
+
+_catalogo: Optional[SkuStore] = None
+_ledger: Optional[ReservationLedger] = None
+_catalogo_lock = threading.Lock()
+
+# Quem está reservando (gravado em cada reserva); None fora de um worker
+_origem: ContextVar[Optional[str]] = ContextVar("estoque_origem", default=None)
+
+
+@contextmanager
+def origem_das_reservas(origem: str) -> Iterator[None]:
+    """Escopo em que as reservas criadas registram `origem` (ex: "<job>:<tentativa>")"""
+    token = _origem.set(origem)
+    try:
+        yield
+    finally:
+        _origem.reset(token)
+
+
+def get_catalogo() -> SkuStore:
+    """
+    Catálogo do processo, com os contadores de estoque e reservas por CD
+
+    Com ESTOQUE_CATALOGO_PATH, abre o arquivo .npy (mapeado em memória, a
+    menos que ESTOQUE_CATALOGO_MMAP=off); sem ele, monta a partir de ESTOQUE_DB.
+    As reservas recuperadas do livro já entram nos contadores.
+    """
+    global _catalogo
+    with _catalogo_lock:
+        if _catalogo is None:
+            caminho = os.getenv("ESTOQUE_CATALOGO_PATH")
+            if caminho:
+                catalogo = SkuStore.abrir(caminho, mmap=os.getenv("ESTOQUE_CATALOGO_MMAP", "on").lower() != "off")
+            else:
+                catalogo = SkuStore.de_registros(ESTOQUE_DB.values(), tuple(CENTROS_DISTRIBUICAO))
+
+            ledger = _get_ledger()
+            ledger.recuperar()
+            ledger.expirar()
+            for (codigo, cd), quantidade in ledger.reservado.items():
+                posicao = catalogo.linha(codigo)
+                if quantidade and posicao is not None and cd in catalogo.centros:
+                    catalogo.reservar(posicao, cd, quantidade)
+            _catalogo = catalogo
+        catalogo = _catalogo
+
+    if _get_ledger().ha_vencidas():
+        _expirar_vencidas(catalogo)
+    return catalogo
+
+
+def _expirar_vencidas(catalogo: SkuStore):
+    """Expira as reservas vencidas e devolve as unidades ao catálogo"""
+    with _estoque_lock:
+        expiradas = _get_ledger().expirar()
+        for reserva in expiradas:
+            posicao = catalogo.linha(reserva["codigo_produto"])
+            if posicao is not None and reserva["centro_distribuicao"] in catalogo.centros:
+                catalogo.reservar(posicao, reserva["centro_distribuicao"], -reserva["quantidade"])
+    for codigo in {reserva["codigo_produto"] for reserva in expiradas}:
+        APIEstoque._notificar_alteracao(codigo)
+
+
+def _get_ledger() -> ReservationLedger:
+    """
+    Livro de reservas do processo (mantém RESERVAS)
+
+    Configurado por ESTOQUE_RESERVAS_DIR (vazio = só em memória),
+    ESTOQUE_RESERVAS_SNAPSHOT_EVERY e ESTOQUE_RESERVAS_FSYNC. Cada processo
+    fica com o primeiro diretório livre (ESTOQUE_RESERVAS_DIR, .2, .3, ...).
+    """
+    global _ledger
+    if _ledger is None:
+        _ledger = abrir_livro(
+            _diretorio_reservas(),
+            reservas=RESERVAS,
+            snapshot_every=int(os.getenv("ESTOQUE_RESERVAS_SNAPSHOT_EVERY", "10000")),
+            fsync=os.getenv("ESTOQUE_RESERVAS_FSYNC", "on").lower() != "off"
+        )
+    return _ledger
+
+
+def _diretorio_reservas() -> Optional[str]:
+    return os.getenv("ESTOQUE_RESERVAS_DIR", "reservas") or None
+
+
+def _validade_reservas() -> float:
+    """Validade das reservas em horas (ESTOQUE_RESERVAS_VALIDADE_HORAS)"""
+    return float(os.getenv("ESTOQUE_RESERVAS_VALIDADE_HORAS", "48"))
+
+# Funções chamadas com o código do produto sempre que o estoque dele muda
+_ALTERACAO_LISTENERS: List[Callable[[str], None]] = []
+
 
 class APIEstoque:
     """
@@ -68,6 +244,21 @@ class APIEstoque:
     que os agents utilizarão para validar disponibilidade
     """
 
+    @staticmethod
+    def registrar_listener(callback: Callable[[str], None]):
+        """
+        Registra uma função chamada com o código do produto após reservas e cancelamentos
+
+        Usado pelos caches de consulta para invalidar a quantidade livre do produto.
+        """
+        if callback not in _ALTERACAO_LISTENERS:
+            _ALTERACAO_LISTENERS.append(callback)
+
+    @staticmethod
+    def _notificar_alteracao(codigo_produto: str):
+        for callback in list(_ALTERACAO_LISTENERS):
+            callback(codigo_produto)
+
     @staticmethod
     def consultar_produto(codigo_produto: str) -> Optional[Dict]:
         """
@@ -79,22 +270,26 @@ class APIEstoque:
         Returns:
             Dicionário com dados do produto ou None se não encontrado
         """
-        produto = ESTOQUE_DB.get(codigo_produto)
+        catalogo = get_catalogo()
+        posicao = catalogo.linha(codigo_produto)
 
-        if produto:
-            # Verifica se há reservas para este produto
-            qtd_reservada = sum(
-                r["quantidade"]
-                for r in RESERVAS.values()
-                if r["codigo_produto"] == codigo_produto and r["status"] == "ativa"
-            )
+        if posicao is not None:
+            produto = catalogo.registro(posicao)
+            por_cd = {
+                cd: {"disponivel": estoque, "reservada": reservado, "livre": estoque - reservado}
+                for cd, (estoque, reservado) in catalogo.contadores(posicao).items()
+            }
+            qtd_disponivel = sum(cd["disponivel"] for cd in por_cd.values())
+            qtd_reservada = sum(cd["reservada"] for cd in por_cd.values())
 
             return {
                 "status": "success",
                 "data": {
                     **produto,
+                    "quantidade_disponivel": qtd_disponivel,
                     "quantidade_reservada": qtd_reservada,
-                    "quantidade_livre": produto["quantidade_disponivel"] - qtd_reservada
+                    "quantidade_livre": qtd_disponivel - qtd_reservada,
+                    "estoque_por_cd": por_cd
                 },
                 "timestamp": datetime.now().isoformat()
             }
@@ -106,13 +301,53 @@ class APIEstoque:
             }
 
     @staticmethod
-    def verificar_disponibilidade(codigo_produto: str, quantidade: int = 1) -> Dict:
+    def disponibilidade_por_cd(codigo_produto: str) -> Dict[str, Dict[str, int]]:
+        """
+        Unidades em estoque, reservadas e livres do produto em cada CD
+
+        Lê os contadores por CD, sem percorrer as reservas.
+
+        Returns:
+            {cd: {"disponivel", "reservada", "livre"}} ({} se o produto não existe)
+        """
+        catalogo = get_catalogo()
+        posicao = catalogo.linha(codigo_produto)
+        if posicao is None:
+            return {}
+        return {
+            cd: {"disponivel": estoque, "reservada": reservado, "livre": estoque - reservado}
+            for cd, (estoque, reservado) in catalogo.contadores(posicao).items()
+        }
+
+    @staticmethod
+    def centros_por_proximidade(uf: Optional[str]) -> Tuple[str, ...]:
+        """CDs do mais próximo ao mais distante da UF (ordem padrão se a UF é desconhecida)"""
+        return PROXIMIDADE_CDS.get((uf or "").strip().upper(), ORDEM_PADRAO_CDS)
+
+    @staticmethod
+    def centro_mais_proximo(codigo_produto: str, quantidade: int = 1, uf: Optional[str] = None) -> Optional[str]:
+        """CD mais próximo da UF com `quantidade` unidades livres do produto, ou None"""
+        catalogo = get_catalogo()
+        posicao = catalogo.linha(codigo_produto)
+        if posicao is None:
+            return None
+        for cd in APIEstoque.centros_por_proximidade(uf):
+            if cd in catalogo.centros and catalogo.livre(posicao, cd) >= quantidade:
+                return cd
+        return None
+
+    @staticmethod
+    def verificar_disponibilidade(codigo_produto: str, quantidade: int = 1, uf: Optional[str] = None) -> Dict:
         """
         Verifica se há quantidade disponível do produto
 
+        A troca é atendida por um único CD, então o produto só está disponível
+        se algum CD tem a quantidade inteira livre.
+
         Args:
             codigo_produto: Código do produto
             quantidade: Quantidade desejada
+            uf: UF de entrega (define o CD mais próximo; opcional)
 
         Returns:
             Resultado da verificação de disponibilidade
@@ -135,10 +370,13 @@ class APIEstoque:
                 "timestamp": datetime.now().isoformat()
             }
 
-        if produto["quantidade_livre"] >= quantidade:
+        centro = APIEstoque.centro_mais_proximo(codigo_produto, quantidade, uf)
+
+        if centro is not None:
             return {
                 "disponivel": True,
                 "quantidade_livre": produto["quantidade_livre"],
+                "centro_distribuicao": centro,
                 "produto": {
                     "codigo": produto["codigo"],
                     "nome": produto["nome"],
@@ -146,6 +384,13 @@ class APIEstoque:
                 },
                 "timestamp": datetime.now().isoformat()
             }
+        elif produto["quantidade_livre"] >= quantidade:
+            return {
+                "disponivel": False,
+                "motivo": f"Nenhum CD tem {quantidade} unidades livres (estoque dividido entre CDs)",
+                "quantidade_livre": produto["quantidade_livre"],
+                "timestamp": datetime.now().isoformat()
+            }
         else:
             return {
                 "disponivel": False,
@@ -155,49 +400,110 @@ class APIEstoque:
             }
 
     @staticmethod
-    def reservar_produto(codigo_produto: str, quantidade: int, protocolo: str) -> Dict:
+    def reservar_produto(codigo_produto: str, quantidade: int, protocolo: str, uf: Optional[str] = None) -> Dict:
         """
-        Reserva um produto no estoque
+        Reserva um produto no estoque do CD mais próximo que tem o produto
 
         Args:
             codigo_produto: Código do produto
             quantidade: Quantidade a reservar
             protocolo: Número do protocolo de troca
+            uf: UF de entrega do cliente (sem ela, segue a ordem padrão dos CDs)
 
         Returns:
             Resultado da reserva
         """
-        verificacao = APIEstoque.verificar_disponibilidade(codigo_produto, quantidade)
+        with _estoque_lock:
+            verificacao = APIEstoque.verificar_disponibilidade(codigo_produto, quantidade, uf)
 
-        if not verificacao["disponivel"]:
-            return {
-                "status": "error",
-                "message": verificacao["motivo"],
-                "timestamp": datetime.now().isoformat()
-            }
+            if not verificacao["disponivel"]:
+                return {
+                    "status": "error",
+                    "message": verificacao["motivo"],
+                    "timestamp": datetime.now().isoformat()
+                }
 
-        # Gera ID da reserva
-        reserva_id = f"RES-{random.randint(10000, 99999)}"
+            centro = verificacao["centro_distribuicao"]
 
-        # Cria reserva
-        RESERVAS[reserva_id] = {
-            "id": reserva_id,
-            "codigo_produto": codigo_produto,
-            "quantidade": quantidade,
-            "protocolo": protocolo,
-            "status": "ativa",
-            "data_reserva": datetime.now().isoformat()
-        }
+            # Gera ID da reserva (sem sobrescrever uma existente)
+            reserva_id = f"RES-{random.randint(10000, 99999)}"
+            while reserva_id in RESERVAS:
+                reserva_id = f"RES-{random.randint(10000, 99999)}"
+
+            # Cria reserva (o livro acrescenta a RESERVAS e ao log)
+            agora = datetime.now()
+            validade = _validade_reservas()
+            expira_em = (agora + timedelta(hours=validade)).isoformat()
+            seq = _get_ledger().registrar({
+                "op": "reservar",
+                "reserva": {
+                    "id": reserva_id,
+                    "codigo_produto": codigo_produto,
+                    "quantidade": quantidade,
+                    "centro_distribuicao": centro,
+                    "protocolo": protocolo,
+                    "origem": _origem.get(),
+                    "status": "ativa",
+                    "data_reserva": agora.isoformat(),
+                    "expira_em": expira_em
+                }
+            })
+            catalogo = get_catalogo()
+            catalogo.reservar(catalogo.linha(codigo_produto), centro, quantidade)
+
+        # Responde só com a reserva em disco (fora do lock: reservas concorrentes dividem o fsync)
+        _get_ledger().aguardar(seq)
+        APIEstoque._notificar_alteracao(codigo_produto)
 
         return {
             "status": "success",
             "reserva_id": reserva_id,
             "codigo_produto": codigo_produto,
             "quantidade": quantidade,
-            "validade": "48 horas",
+            "centro_distribuicao": centro,
+            "validade": f"{validade:g} horas",
+            "expira_em": expira_em,
             "timestamp": datetime.now().isoformat()
         }
 
+    @staticmethod
+    def reservas_ativas(protocolo: Optional[str] = None) -> List[Dict]:
+        """Reservas ativas do processo (de um protocolo ou de todos)"""
+        get_catalogo()  # recupera as reservas do livro
+        with _estoque_lock:
+            return [
+                dict(reserva) for reserva in RESERVAS.values()
+                if reserva["status"] == "ativa" and (protocolo is None or reserva["protocolo"] == protocolo)
+            ]
+
+    @staticmethod
+    def cancelar_em_livros_livres(filtro: Callable[[Dict], bool]) -> List[str]:
+        """
+        Cancela reservas ativas nos livros de processos encerrados
+
+        Um worker que morreu deixa o seu diretório de reservas sem lock; até
+        outro processo retomá-lo, as reservas dele só podem ser canceladas
+        no próprio livro (os contadores de estoque são refeitos do livro
+        quando ele for recuperado).
+
+        Args:
+            filtro: Seleciona as reservas a cancelar
+
+        Returns:
+            IDs das reservas canceladas
+        """
+        canceladas = []
+        with livros_livres(_diretorio_reservas()) as livros:
+            for livro in livros:
+                ids = [r["id"] for r in livro.reservas.values() if r["status"] == "ativa" and filtro(r)]
+                seq = None
+                for reserva_id in ids:
+                    seq = livro.registrar({"op": "cancelar", "id": reserva_id})
+                if seq is not None:
+                    livro.aguardar(seq)
+                canceladas.extend(ids)
+        return canceladas
+
     @staticmethod
     def cancelar_reserva(reserva_id: str) -> Dict:
         """
@@ -209,14 +515,26 @@ class APIEstoque:
         Returns:
             Resultado do cancelamento
         """
-        if reserva_id not in RESERVAS:
-            return {
-                "status": "error",
-                "message": "Reserva não encontrada",
-                "timestamp": datetime.now().isoformat()
-            }
+        catalogo = get_catalogo()
+        with _estoque_lock:
+            reserva = RESERVAS.get(reserva_id)
+            if reserva is None:
+                return {
+                    "status": "error",
+                    "message": "Reserva não encontrada",
+                    "timestamp": datetime.now().isoformat()
+                }
+
+            # Cancelar de novo não devolve as unidades duas vezes
+            seq = None
+            if reserva["status"] == "ativa":
+                catalogo.reservar(catalogo.linha(reserva["codigo_produto"]), reserva["centro_distribuicao"],
+                                  -reserva["quantidade"])
+                seq = _get_ledger().registrar({"op": "cancelar", "id": reserva_id})
 
-        RESERVAS[reserva_id]["status"] = "cancelada"
+        if seq is not None:
+            _get_ledger().aguardar(seq)
+        APIEstoque._notificar_alteracao(reserva["codigo_produto"])
 
         return {
             "status": "success",
@@ -0,0 +1,86 @@
+"""
+Filtro de Bloom para chaves inexistentes
+
+CONCEITO - Bloom Filter:
+Um vetor de m bits e k funções de hash. Inserir uma chave liga os k bits
+dela; consultar verifica se os k bits estão ligados. Se algum está
+desligado, a chave com certeza nunca foi inserida ("não está" definitivo);
+se todos estão ligados, ela provavelmente foi ("talvez esteja"), com uma
+taxa de falsos positivos que depende de m, k e do número de chaves.
+
+Com 1% de falsos positivos são ~9,6 bits por chave: 1 milhão de CPFs cabem
+em ~1,2 MB, e a consulta de um CPF inexistente (sondagens de fraude, erros
+de digitação) é respondida sem tocar na base.
+
+Os k índices saem de dois hashes de 64 bits (double hashing,
+h1 + i * h2), extraídos de um único BLAKE2b por chave.
+"""
+
+import hashlib
+import math
+import threading
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    Filtro de Bloom dimensionado pela capacidade e taxa de falsos positivos alvo
+
+    Inserções são serializadas por lock (dois `add` concorrentes no mesmo
+    byte não podem perder bits); consultas não precisam de lock.
+    """
+
+    def __init__(self, capacidade: int, taxa_falsos_positivos: float = 0.01):
+        """
+        Args:
+            capacidade: Número de chaves esperado
+            taxa_falsos_positivos: Taxa alvo quando o filtro está na capacidade
+        """
+        self.capacidade = max(1, capacidade)
+        self.taxa_alvo = taxa_falsos_positivos
+
+        # m = -n ln(p) / ln(2)^2 e k = (m / n) ln(2)
+        self.num_bits = max(8, math.ceil(-self.capacidade * math.log(taxa_falsos_positivos) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacidade * math.log(2)))
+        self.num_chaves = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def de_chaves(cls, chaves: Iterable[str], capacidade: int,
+                  taxa_falsos_positivos: float = 0.01) -> "BloomFilter":
+        """Filtro construído a partir de uma base existente"""
+        filtro = cls(capacidade, taxa_falsos_positivos)
+        for chave in chaves:
+            filtro.add(chave)
+        return filtro
+
+    def _posicoes(self, chave: str):
+        digest = hashlib.blake2b(chave.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, chave: str):
+        with self._lock:
+            for posicao in self._posicoes(chave):
+                self._bits[posicao >> 3] |= 1 << (posicao & 7)
+            self.num_chaves += 1
+
+    def __contains__(self, chave: str) -> bool:
+        """False = com certeza ausente; True = provavelmente presente"""
+        bits = self._bits
+        return all(bits[posicao >> 3] & (1 << (posicao & 7)) for posicao in self._posicoes(chave))
+
+    @property
+    def cheio(self) -> bool:
+        """Passou da capacidade: a taxa de falsos positivos já está acima do alvo"""
+        return self.num_chaves > self.capacidade
+
+    def taxa_estimada(self) -> float:
+        """Taxa de falsos positivos teórica para as chaves inseridas: (1 - e^(-kn/m))^k"""
+        return (1 - math.exp(-self.num_hashes * self.num_chaves / self.num_bits)) ** self.num_hashes
+
+    def __len__(self) -> int:
+        return self.num_chaves
@@ -0,0 +1,108 @@
+"""
+Mock de LLM local com latência injetada
+
+Simula o provedor de LLM sem rede nem API key, permitindo medir
+o efeito de controles como hedging e rate limiting de forma reproduzível.
+
+CONCEITO - Fault Injection:
+A latência é sorteada de uma distribuição com cauda longa: a maioria das
+respostas é rápida, mas uma fração `slow_probability` demora `slow_latency`.
+É exatamente esse perfil que faz o p99 de uma jornada explodir.
+
+Em streaming, a resposta é entregue linha a linha com `token_latency` entre
+os pedaços, o que permite medir o ganho da interrupção antecipada.
+"""
+
+import itertools
+import random
+import threading
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class LocalStandInLLM(BaseChatModel):
+    """
+    Chat model local que responde com textos pré-definidos após uma espera
+
+    Atributos:
+        responses: Respostas devolvidas em ciclo
+        base_latency: Latência típica, em segundos
+        jitter: Variação uniforme somada à latência típica
+        slow_probability: Probabilidade de uma resposta lenta
+        slow_latency: Latência das respostas lentas, em segundos
+        token_latency: Espera entre linhas no modo streaming
+        seed: Semente para tornar a sequência reproduzível
+    """
+
+    responses: List[str] = ["Thought: I now know the final answer\nFinal Answer: ---\nSTATUS: APROVADO\n---"]
+    base_latency: float = 0.05
+    jitter: float = 0.02
+    slow_probability: float = 0.0
+    slow_latency: float = 1.0
+    token_latency: float = 0.0
+    seed: Optional[int] = None
+
+    _rng: Any = None
+    _cycle: Any = None
+    _lock: Any = None
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+        self._cycle = itertools.cycle(self.responses)
+        self._lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "local-stand-in"
+
+    def _sample_latency(self) -> float:
+        with self._lock:
+            if self._rng.random() < self.slow_probability:
+                return self.slow_latency
+            return self.base_latency + self._rng.uniform(0, self.jitter)
+
+    def _next_response(self) -> str:
+        with self._lock:
+            return next(self._cycle)
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self._sample_latency())
+
+        texto = self._next_response()
+
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(texto) // 4
+
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=texto))],
+            llm_output={"token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }}
+        )
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self._sample_latency())
+
+        for linha in self._next_response().splitlines(keepends=True):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=linha))
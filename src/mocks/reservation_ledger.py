@@ -0,0 +1,455 @@
+"""
+Livro de reservas durável (write-ahead log + snapshots)
+
+CONCEITO - Write-Ahead Log:
+Cada reserva e cada cancelamento vira um registro JSON acrescentado ao
+final do log (`wal-<seq>.jsonl`) antes de a API responder. Reiniciar o app
+ou um worker não perde mais as reservas ativas: o estado é reconstruído a
+partir do log.
+
+CONCEITO - Group Commit:
+O fsync domina a latência da reserva. Registros de threads concorrentes
+entram numa fila; a primeira thread que precisa de durabilidade vira a
+"líder", grava todos os registros pendentes com um único fsync e libera
+as demais. Sob concorrência, N reservas custam um fsync, não N.
+
+CONCEITO - Snapshot + Tail Replay:
+A cada `snapshot_every` registros, o estado (reservas ativas e unidades
+reservadas por produto e CD) é gravado em `snapshot.json` (arquivo
+temporário + rename atômico) e os segmentos do log já cobertos são
+apagados. A recuperação carrega o snapshot e reaplica apenas a cauda do
+log. As unidades reservadas vêm prontas do snapshot, sem somar o histórico
+de reservas; reservas canceladas ficam de fora, então o snapshot tem o
+tamanho das reservas ativas e o cancelamento de uma delas depois de um
+reinício responde "não encontrada".
+
+Um registro parcial no final do log (queda no meio de uma gravação) é
+descartado na recuperação: a reserva dele nunca foi confirmada ao chamador.
+
+CONCEITO - One Writer per Directory:
+A sequência dos registros é do processo que escreve o log, e o snapshot
+apaga os segmentos que a sua sequência cobre. Dois processos no mesmo
+diretório apagariam os registros um do outro. Por isso o livro mantém um
+lock exclusivo (flock) no diretório enquanto está aberto e se recusa a
+abrir um diretório já travado; `abrir_livro` dá a cada processo (ex: os
+workers do serviço) o primeiro diretório livre: `reservas`, `reservas.2`...
+O lock some com o processo, então um worker reiniciado retoma o diretório
+de um worker morto e recupera as reservas dele; enquanto ninguém o retoma,
+`livros_livres` permite a outro processo cancelar reservas nele.
+
+CONCEITO - Expiring Holds:
+Cada reserva traz `expira_em`. O livro mantém um heap pelas datas de
+expiração, e `expirar` registra no log a expiração das reservas vencidas
+(op "expirar", status "expirada"), devolvendo as unidades. A recuperação
+e as consultas de estoque (mocks/api_estoque.py) chamam `expirar`; quando
+nada venceu, o custo é olhar o topo do heap.
+"""
+
+import heapq
+
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "snapshot.json"
+LOCK_FILE = "LOCK"
+
+# Diretórios tentados por `abrir_livro` (um por processo)
+MAX_DIRETORIOS = 64
+
+
+class LedgerLockedError(RuntimeError):
+    """O diretório do livro já está aberto por outro processo"""
+
+# Unidades reservadas por (código do produto, CD)
+Reservado = Dict[Tuple[str, str], int]
+
+
+def aplicar(reservas: Dict[str, dict], reservado: Reservado, registro: dict):
+    """Aplica um registro do log ao estado (usado ao vivo e na recuperação)"""
+    if registro["op"] == "reservar":
+        reserva = registro["reserva"]
+        reservas[reserva["id"]] = reserva
+        chave = (reserva["codigo_produto"], reserva["centro_distribuicao"])
+        reservado[chave] = reservado.get(chave, 0) + reserva["quantidade"]
+    elif registro["op"] in ("cancelar", "expirar"):
+        reserva = reservas.get(registro["id"])
+        if reserva is not None and reserva["status"] == "ativa":
+            chave = (reserva["codigo_produto"], reserva["centro_distribuicao"])
+            reservado[chave] -= reserva["quantidade"]
+            reserva["status"] = "cancelada" if registro["op"] == "cancelar" else "expirada"
+
+
+def _expiracao(reserva: dict) -> Optional[datetime]:
+    """Data de expiração da reserva (None nas reservas sem `expira_em`)"""
+    expira_em = reserva.get("expira_em")
+    if not expira_em:
+        return None
+    try:
+        return datetime.fromisoformat(expira_em)
+    except (TypeError, ValueError):
+        return None
+
+
+class ReservationLedger:
+    """
+    Estado das reservas com log durável
+
+    `registrar` aplica o registro e o põe na fila do log (chamado com o lock
+    de estoque da API, para que a ordem do log seja a ordem das operações);
+    `aguardar` espera o registro estar em disco (fora do lock, para que
+    reservas concorrentes dividam o mesmo fsync).
+    """
+
+    def __init__(self, directory: Optional[str], reservas: Optional[Dict[str, dict]] = None,
+                 snapshot_every: int = 10000, fsync: bool = True):
+        """
+        Args:
+            directory: Diretório do log e do snapshot (None mantém só em memória)
+            reservas: Dict de reservas a manter (ex: RESERVAS da API de estoque)
+            snapshot_every: Registros entre snapshots
+            fsync: Força os dados ao disco a cada gravação do log
+        """
+        self.directory = directory
+        self.reservas: Dict[str, dict] = reservas if reservas is not None else {}
+        self.reservado: Reservado = {}
+        self.snapshot_every = max(1, snapshot_every)
+        self.fsync = fsync
+        self.num_fsyncs = 0
+
+        self._seq = 0
+        self._duravel = 0
+        self._pendentes: List[Tuple[int, str]] = []
+        self._gravando = False
+        self._desde_snapshot = 0
+        self._em_snapshot = False
+        self._segmento = 1
+        self._arquivo = None
+        self._arquivo_segmento = 0
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._lock_fd: Optional[int] = None
+        # (expira_em, id) das reservas registradas; entradas de reservas já
+        # encerradas saem quando chegam ao topo
+        self._vencimentos: List[Tuple[datetime, str]] = []
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._travar()
+
+    def _travar(self):
+        """Lock exclusivo do diretório (LedgerLockedError se outro processo o mantém)"""
+        if fcntl is None:
+            return
+        fd = os.open(os.path.join(self.directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise LedgerLockedError(f"Livro de reservas em uso por outro processo: {self.directory}")
+        self._lock_fd = fd
+
+    # ------------------------------------------------------------------
+    # Arquivos
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, primeiro_seq: int) -> str:
+        return os.path.join(self.directory, f"wal-{primeiro_seq:012d}.jsonl")
+
+    def _segments(self) -> List[int]:
+        numeros = []
+        for nome in os.listdir(self.directory):
+            if nome.startswith("wal-") and nome.endswith(".jsonl"):
+                numeros.append(int(nome[len("wal-"):-len(".jsonl")]))
+        return sorted(numeros)
+
+    def _sync_directory(self):
+        """Torna durável a criação/renomeação de arquivos no diretório (POSIX)"""
+        if not self.fsync or not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ------------------------------------------------------------------
+    # Recuperação
+    # ------------------------------------------------------------------
+
+    def recuperar(self) -> Reservado:
+        """
+        Reconstrói o estado a partir do snapshot e da cauda do log
+
+        Returns:
+            Unidades reservadas por (código do produto, CD)
+        """
+        if not self.directory:
+            return self.reservado
+
+        seq_snapshot = 0
+        caminho = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(caminho):
+            with open(caminho, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            seq_snapshot = snapshot["seq"]
+            self.reservas.update(snapshot["reservas"])
+            for codigo, cd, quantidade in snapshot["reservado"]:
+                self.reservado[(codigo, cd)] = quantidade
+
+        ultimo = seq_snapshot
+        reaplicados = 0
+        for primeiro in self._segments():
+            caminho_segmento = self._segment_path(primeiro)
+            with open(caminho_segmento, "rb") as f:
+                dados = f.read()
+
+            offset = 0
+            for linha in dados.splitlines(keepends=True):
+                try:
+                    if not linha.endswith(b"\n"):
+                        raise ValueError("linha sem terminador")
+                    registro = json.loads(linha)
+                except ValueError:
+                    # Registro parcial de uma gravação interrompida: descarta daqui em diante
+                    with open(caminho_segmento, "r+b") as f:
+                        f.truncate(offset)
+                    break
+                offset += len(linha)
+                if registro["seq"] <= seq_snapshot:
+                    continue
+                aplicar(self.reservas, self.reservado, registro)
+                ultimo = max(ultimo, registro["seq"])
+                reaplicados += 1
+
+        self._seq = self._duravel = ultimo
+        self._desde_snapshot = reaplicados
+        self._segmento = ultimo + 1
+        vencimentos = ((_expiracao(r), r["id"]) for r in self.reservas.values() if r["status"] == "ativa")
+        self._vencimentos = [v for v in vencimentos if v[0] is not None]
+        heapq.heapify(self._vencimentos)
+
+        if reaplicados or seq_snapshot:
+            logger.info(
+                f"Reservas recuperadas: {len(self.reservas)} (snapshot seq {seq_snapshot}, {reaplicados} registros do log)"
+            )
+        return self.reservado
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def registrar(self, registro: dict) -> int:
+        """
+        Aplica o registro ao estado e o põe na fila do log
+
+        Returns:
+            Número de sequência do registro (para `aguardar`)
+        """
+        with self._cond:
+            aplicar(self.reservas, self.reservado, registro)
+            if registro["op"] == "reservar":
+                self._agendar(registro["reserva"])
+            self._seq += 1
+            if self.directory:
+                self._pendentes.append((self._seq, json.dumps({"seq": self._seq, **registro}, ensure_ascii=False)))
+                self._desde_snapshot += 1
+            else:
+                self._duravel = self._seq
+            return self._seq
+
+    def _agendar(self, reserva: dict):
+        expira_em = _expiracao(reserva)
+        if expira_em is not None:
+            heapq.heappush(self._vencimentos, (expira_em, reserva["id"]))
+
+    def ha_vencidas(self, agora: Optional[datetime] = None) -> bool:
+        """Alguma reserva pode ter vencido (só olha o topo do heap, sem lock)"""
+        vencimentos = self._vencimentos
+        return bool(vencimentos) and vencimentos[0][0] <= (agora or datetime.now())
+
+    def expirar(self, agora: Optional[datetime] = None) -> List[dict]:
+        """
+        Registra a expiração das reservas ativas vencidas
+
+        Não espera o registro chegar ao disco: uma expiração perdida numa
+        queda é refeita na recuperação.
+
+        Returns:
+            Reservas expiradas agora
+        """
+        agora = agora or datetime.now()
+        expiradas = []
+        with self._cond:
+            while self._vencimentos and self._vencimentos[0][0] <= agora:
+                _, reserva_id = heapq.heappop(self._vencimentos)
+                reserva = self.reservas.get(reserva_id)
+                if reserva is not None and reserva["status"] == "ativa":
+                    self.registrar({"op": "expirar", "id": reserva_id})
+                    expiradas.append(reserva)
+        if expiradas:
+            logger.info(f"{len(expiradas)} reserva(s) expirada(s)")
+        return expiradas
+
+    def aguardar(self, seq: int):
+        """Espera até o registro `seq` estar gravado (group commit)"""
+        with self._cond:
+            while self._duravel < seq:
+                if self._gravando:
+                    self._cond.wait()
+                    continue
+
+                # Esta thread vira a líder e grava tudo o que está pendente
+                self._gravando = True
+                lote, self._pendentes = self._pendentes, []
+                segmento = self._segmento
+                self._cond.release()
+                try:
+                    self._gravar(lote, segmento)
+                except BaseException:
+                    self._cond.acquire()
+                    self._pendentes = lote + self._pendentes
+                    self._gravando = False
+                    self._cond.notify_all()
+                    raise
+                self._cond.acquire()
+                self._gravando = False
+                self._duravel = max(self._duravel, lote[-1][0]) if lote else self._duravel
+                self._cond.notify_all()
+
+            snapshot = self._desde_snapshot >= self.snapshot_every and not self._em_snapshot
+            if snapshot:
+                self._em_snapshot = True
+
+        if snapshot:
+            threading.Thread(target=self.snapshot, name="reservas-snapshot", daemon=True).start()
+
+    def _gravar(self, lote: List[Tuple[int, str]], segmento: int):
+        if not lote:
+            return
+        with self._io_lock:
+            if self._arquivo is None or self._arquivo_segmento != segmento:
+                if self._arquivo is not None:
+                    self._arquivo.close()
+                self._arquivo = open(self._segment_path(segmento), "a", encoding="utf-8")
+                self._arquivo_segmento = segmento
+                self._sync_directory()
+            self._arquivo.write("".join(linha + "\n" for _, linha in lote))
+            self._arquivo.flush()
+            if self.fsync:
+                os.fsync(self._arquivo.fileno())
+                self.num_fsyncs += 1
+
+    def snapshot(self):
+        """Grava o estado atual e apaga os segmentos do log que ele cobre"""
+        if not self.directory:
+            return
+        try:
+            with self._cond:
+                seq = self._seq
+                # Só as reservas ativas: as encerradas não mudam mais o
+                # estado, e o snapshot não cresce com o histórico
+                conteudo = json.dumps({
+                    "seq": seq,
+                    "reservas": {id_: r for id_, r in self.reservas.items() if r["status"] == "ativa"},
+                    "reservado": [[codigo, cd, q] for (codigo, cd), q in self.reservado.items() if q]
+                }, ensure_ascii=False)
+                # Registros depois do snapshot vão para um segmento novo
+                self._segmento = seq + 1
+                self._desde_snapshot = 0
+
+            caminho = os.path.join(self.directory, SNAPSHOT_FILE)
+            temporario = caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                f.write(conteudo)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            os.replace(temporario, caminho)
+            self._sync_directory()
+
+            for primeiro in self._segments():
+                if primeiro <= seq:
+                    os.remove(self._segment_path(primeiro))
+        except OSError as e:
+            logger.error(f"Falha ao gravar snapshot das reservas: {e}")
+        finally:
+            with self._cond:
+                self._em_snapshot = False
+
+    def close(self):
+        with self._io_lock:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+            if self._lock_fd is not None:
+                # Fechar o descritor libera o flock
+                os.close(self._lock_fd)
+                self._lock_fd = None
+
+
+def _diretorios(directory: str) -> Iterator[str]:
+    """`directory`, `directory.2`, ... até MAX_DIRETORIOS"""
+    base = directory.rstrip("/\\")
+    for n in range(1, MAX_DIRETORIOS + 1):
+        yield base if n == 1 else f"{base}.{n}"
+
+
+def abrir_livro(directory: Optional[str], **kwargs) -> ReservationLedger:
+    """
+    Abre o livro no primeiro diretório livre: `directory`, `directory.2`, ...
+
+    Args:
+        directory: Diretório base (None mantém só em memória)
+        **kwargs: Repassados a ReservationLedger
+    """
+    if not directory:
+        return ReservationLedger(None, **kwargs)
+    for candidato in _diretorios(directory):
+        try:
+            return ReservationLedger(candidato, **kwargs)
+        except LedgerLockedError:
+            continue
+    raise LedgerLockedError(f"Todos os {MAX_DIRETORIOS} diretórios de {directory} estão em uso")
+
+
+@contextmanager
+def livros_livres(directory: Optional[str], **kwargs) -> Iterator[List[ReservationLedger]]:
+    """
+    Livros já existentes que nenhum processo mantém aberto (processo encerrado)
+
+    Os livros são abertos (com o lock), recuperados e sem as reservas
+    vencidas; saem fechados do bloco.
+    O diretório do próprio processo, travado por ele, não entra.
+
+    Args:
+        directory: Diretório base (None = nenhum livro)
+        **kwargs: Repassados a ReservationLedger
+    """
+    livros = []
+    try:
+        for candidato in (_diretorios(directory) if directory else ()):
+            if not os.path.isdir(candidato):
+                continue
+            try:
+                livro = ReservationLedger(candidato, **kwargs)
+            except LedgerLockedError:
+                continue
+            livros.append(livro)
+            livro.recuperar()
+            livro.expirar()
+        yield livros
+    finally:
+        for livro in livros:
+            livro.close()
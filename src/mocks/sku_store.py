@@ -0,0 +1,161 @@
+"""
+Catálogo de SKUs em colunas
+
+CONCEITO - Columnar Store:
+Um dict de dicts custa centenas de bytes por SKU (o dict, as chaves, cada
+str e cada int são objetos Python). Aqui o catálogo é um único array
+estruturado NumPy: uma linha de tamanho fixo por SKU, com código, nome,
+categoria, localização, preço, status e os contadores de estoque e de
+unidades reservadas por CD. Um milhão de SKUs ocupa ~200 MB contíguos,
+sem um objeto Python por campo.
+
+CONCEITO - Sorted Key Index:
+As linhas ficam ordenadas pelo código, então a busca de um SKU é uma busca
+binária na própria coluna de códigos (`searchsorted`): não há índice para
+reconstruir no carregamento.
+
+CONCEITO - Memory-Mapped Catalog:
+`salvar` grava o array em .npy e `abrir` o mapeia em memória. Abrir um
+catálogo de um milhão de SKUs não lê o arquivo: só as páginas consultadas
+entram na memória. O mapeamento é copy-on-write, então reservas alteram
+os contadores em memória sem tocar no arquivo do catálogo.
+
+NumPy só é importado quando o catálogo é criado.
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Tamanho (bytes UTF-8) das colunas de texto
+TAMANHOS_TEXTO = {"codigo": 16, "nome": 80, "categoria": 32, "localizacao": 16}
+
+
+def _dtype(centros: Sequence[str]) -> "np.dtype":
+    """Linha do catálogo; os nomes dos CDs ficam no próprio dtype (e no .npy)"""
+    import numpy as np
+
+    contadores = [(cd, np.int32) for cd in centros]
+    return np.dtype(
+        [(campo, f"S{tamanho}") for campo, tamanho in TAMANHOS_TEXTO.items()]
+        + [("preco", np.float64), ("ativo", np.bool_), ("estoque", contadores), ("reservado", contadores)]
+    )
+
+
+def _texto(valor: bytes) -> str:
+    return valor.decode("utf-8")
+
+
+class SkuStore:
+    """
+    Catálogo de SKUs em um array estruturado, ordenado por código
+
+    Não é thread-safe para escrita: quem altera os contadores (APIEstoque)
+    serializa reservas e cancelamentos com o próprio lock.
+    """
+
+    def __init__(self, linhas: "np.ndarray"):
+        """
+        Args:
+            linhas: Array estruturado no formato de `_dtype`, ordenado por código
+        """
+        self.linhas = linhas
+        self.centros: Tuple[str, ...] = linhas.dtype["estoque"].names
+
+    @classmethod
+    def de_registros(cls, registros: Iterable[dict], centros: Sequence[str]) -> "SkuStore":
+        """
+        Catálogo a partir de dicts no formato de ESTOQUE_DB
+
+        Textos maiores que a coluna são truncados (sem quebrar caracteres UTF-8).
+        """
+        import numpy as np
+
+        registros = sorted(registros, key=lambda r: r["codigo"].encode("utf-8"))
+        linhas = np.zeros(len(registros), dtype=_dtype(centros))
+        for i, registro in enumerate(registros):
+            for campo, tamanho in TAMANHOS_TEXTO.items():
+                bruto = str(registro.get(campo, "")).encode("utf-8")[:tamanho]
+                linhas[campo][i] = bruto.decode("utf-8", "ignore").encode("utf-8")
+            linhas["preco"][i] = registro.get("preco", 0.0)
+            linhas["ativo"][i] = registro.get("ativo", True)
+            for cd, quantidade in registro.get("estoque_cd", {}).items():
+                linhas["estoque"][cd][i] = quantidade
+
+        codigos = linhas["codigo"]
+        if len(codigos) > 1 and (codigos[1:] == codigos[:-1]).any():
+            raise ValueError("Catálogo com códigos de produto repetidos")
+        return cls(linhas)
+
+    @classmethod
+    def abrir(cls, caminho: str, mmap: bool = True) -> "SkuStore":
+        """
+        Abre um catálogo gravado por `salvar`
+
+        Args:
+            caminho: Arquivo .npy
+            mmap: Mapeia o arquivo (copy-on-write) em vez de lê-lo inteiro
+        """
+        import numpy as np
+
+        return cls(np.load(caminho, mmap_mode="c" if mmap else None))
+
+    def salvar(self, caminho: str):
+        """
+        Grava o catálogo em .npy
+
+        Os contadores de reservadas são gravados zerados: as reservas vêm do
+        livro de reservas (reservation_ledger.py) ao abrir o catálogo.
+        """
+        import numpy as np
+
+        linhas = np.array(self.linhas)
+        linhas["reservado"] = np.zeros((), dtype=linhas.dtype["reservado"])
+        np.save(caminho, linhas)
+
+    def linha(self, codigo: str) -> Optional[int]:
+        """Posição do SKU no catálogo (busca binária na coluna de códigos), ou None"""
+        import numpy as np
+
+        chave = codigo.encode("utf-8")
+        if len(chave) > TAMANHOS_TEXTO["codigo"]:
+            return None
+        codigos = self.linhas["codigo"]
+        posicao = int(np.searchsorted(codigos, chave))
+        if posicao < len(codigos) and codigos[posicao] == chave:
+            return posicao
+        return None
+
+    def __contains__(self, codigo: str) -> bool:
+        return self.linha(codigo) is not None
+
+    def __len__(self) -> int:
+        return len(self.linhas)
+
+    def registro(self, posicao: int) -> dict:
+        """Dados cadastrais do SKU no formato de ESTOQUE_DB"""
+        linha = self.linhas[posicao]
+        return {
+            "codigo": _texto(linha["codigo"]),
+            "nome": _texto(linha["nome"]),
+            "categoria": _texto(linha["categoria"]),
+            "preco": float(linha["preco"]),
+            "estoque_cd": {cd: int(linha["estoque"][cd]) for cd in self.centros if linha["estoque"][cd]},
+            "localizacao": _texto(linha["localizacao"]),
+            "ativo": bool(linha["ativo"])
+        }
+
+    def contadores(self, posicao: int) -> Dict[str, Tuple[int, int]]:
+        """(estoque, reservado) do SKU em cada CD"""
+        linha = self.linhas[posicao]
+        return {cd: (int(linha["estoque"][cd]), int(linha["reservado"][cd])) for cd in self.centros}
+
+    def livre(self, posicao: int, cd: str) -> int:
+        """Unidades livres do SKU no CD"""
+        linha = self.linhas[posicao]
+        return int(linha["estoque"][cd]) - int(linha["reservado"][cd])
+
+    def reservar(self, posicao: int, cd: str, quantidade: int):
+        """Soma `quantidade` ao contador de reservadas (negativa para liberar)"""
+        self.linhas["reservado"][cd][posicao] += quantidade
@@ -0,0 +1,158 @@
+"""
+Logging estruturado com perfis e handlers assíncronos
+
+CONCEITO - Logging Profiles:
+Durante o desenvolvimento queremos ver cada etapa e o raciocínio dos agents;
+num servidor processando jornadas em lote, esse volume de saída vira custo
+de CPU e disputa pelo stdout entre threads. Os perfis definem o nível, o
+formato e a verbosidade dos agents de uma vez:
+- dev: etapas no console em texto, raciocínio ReAct dos agents visível
+- server: apenas avisos e erros, em JSON, sem saída por etapa ou por token
+- quiet: apenas erros
+
+CONCEITO - Queued Handlers:
+As chamadas de log só colocam o registro numa fila (QueueHandler). Uma
+thread dedicada (QueueListener) formata e escreve no console ou arquivo,
+então as threads das jornadas nunca esperam por I/O de terminal.
+
+Configuração via variáveis de ambiente (ver .env.example):
+- LOG_PROFILE: dev | server | quiet (padrão: dev)
+- LOG_LEVEL / LOG_FORMAT (text | json): sobrescrevem o perfil
+- LOG_FILE: grava também em arquivo
+- AGENT_VERBOSE: raciocínio ReAct de todos os agents (padrão: o do perfil)
+- AGENT_VERBOSE_<AGENT>: sobrescreve para um agent (ex: AGENT_VERBOSE_DECISIONAGENT=true)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+PROFILES = {
+    "dev": {"level": "INFO", "format": "text", "agent_verbose": True},
+    "server": {"level": "WARNING", "format": "json", "agent_verbose": False},
+    "quiet": {"level": "ERROR", "format": "text", "agent_verbose": False},
+}
+
+# Loggers da aplicação; bibliotecas (httpx, langchain) ficam em WARNING
+APP_LOGGERS = ("orchestrator", "journey", "llm", "agents", "tools", "service")
+
+_configured_profile: Optional[str] = None
+_configured_pid: Optional[int] = None
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos extras (ex: protocolo)"""
+
+    _PADRAO = set(vars(logging.makeLogRecord({})))
+
+    def format(self, record: logging.LogRecord) -> str:
+        entrada = {
+            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage().strip(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in self._PADRAO and chave != "message":
+                entrada[chave] = valor
+        if record.exc_info:
+            entrada["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entrada, ensure_ascii=False, default=str)
+
+
+def _profile_name(profile: Optional[str] = None) -> str:
+    nome = (profile or os.getenv("LOG_PROFILE", "dev")).lower()
+    if nome not in PROFILES:
+        raise ValueError(f"Perfil de log inválido: {nome} (use {', '.join(PROFILES)})")
+    return nome
+
+
+def configure_logging(profile: Optional[str] = None, force: bool = False) -> str:
+    """
+    Configura o logging do processo (idempotente)
+
+    Args:
+        profile: Perfil a usar (padrão: LOG_PROFILE)
+        force: Reconfigura mesmo se já configurado
+
+    Returns:
+        Nome do perfil ativo
+    """
+    global _configured_profile, _configured_pid, _listener
+
+    with _lock:
+        # Processos filhos (fork) herdam a configuração, mas não a thread do listener
+        herdado = _configured_pid is not None and _configured_pid != os.getpid()
+        if _configured_profile is not None and not force and not herdado:
+            return _configured_profile
+        if herdado:
+            _listener = None
+
+        nome = _profile_name(profile)
+        perfil = PROFILES[nome]
+        nivel = os.getenv("LOG_LEVEL", perfil["level"]).upper()
+        formato = os.getenv("LOG_FORMAT", perfil["format"]).lower()
+
+        if formato == "json":
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter("%(message)s")
+
+        handlers = [logging.StreamHandler(sys.stdout)]
+        caminho = os.getenv("LOG_FILE")
+        if caminho:
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+            handlers.append(logging.FileHandler(caminho, encoding="utf-8"))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        if _listener is not None:
+            _listener.stop()
+
+        fila: queue.Queue = queue.Queue(-1)
+        _listener = QueueListener(fila, *handlers, respect_handler_level=False)
+        _listener.start()
+
+        raiz = logging.getLogger()
+        for handler in [h for h in raiz.handlers if isinstance(h, QueueHandler)]:
+            raiz.removeHandler(handler)
+        raiz.addHandler(QueueHandler(fila))
+        raiz.setLevel(logging.WARNING)
+
+        for nome_logger in APP_LOGGERS:
+            logging.getLogger(nome_logger).setLevel(nivel)
+
+        _configured_profile = nome
+        _configured_pid = os.getpid()
+        return nome
+
+
+def agent_verbose(agent_name: str) -> bool:
+    """
+    Indica se o AgentExecutor de um agent deve imprimir o raciocínio ReAct
+
+    Ordem: AGENT_VERBOSE_<AGENT>, AGENT_VERBOSE, perfil ativo.
+    """
+    for chave in (f"AGENT_VERBOSE_{agent_name.upper()}", "AGENT_VERBOSE"):
+        valor = os.getenv(chave)
+        if valor is not None:
+            return valor.strip().lower() in ("1", "true", "yes", "sim")
+    return PROFILES[_configured_profile or _profile_name()]["agent_verbose"]
+
+
+def _stop_listener():
+    # Esvazia a fila antes de encerrar o processo
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
@@ -16,21 +16,44 @@ Decomposição de problemas complexos em etapas especializadas.
 """
 
 import json
-from datetime import datetime
-from typing import Dict, Any
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Any, Callable, List, Optional
 import sys
 import os
 
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from agents import (
-    CustomerValidatorAgent,
-    DocumentAnalyzerAgent,
-    EligibilityValidatorAgent,
-    ExchangeClassifierAgent,
-    InventoryValidatorAgent,
-    DecisionAgent
-)
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from bootstrap import load_env
+
+# O .env precisa estar carregado antes dos módulos que leem configuração
+load_env()
+
+# CONCEITO - Lazy Loading:
+# `agents` resolve cada classe no primeiro acesso (PEP 562); LangChain e o
+# cliente do LLM só são importados quando a primeira etapa cria o seu agent.
+import agents
+from journey.deferred_queue import DeferredJourneyQueue, get_deferred_queue
+from journey.journey_log import JourneyHistory, JourneyLog, LogSink, get_default_log_sink, get_journey_history
+from journey.admission import validar_lote, validar_protocolo
+from journey.analytics import JourneyAnalyticsStore, get_analytics_store
+from journey.compensation import DECISOES_COMPENSADAS, current_saga, journey_saga
+from journey.itens import decisao_agregada, itens_do_protocolo, protocolo_do_item, protocolo_multi_item
+from journey.report_store import SegmentedReportStore, get_report_store
+from journey.results import JourneyResult, RawRetentionPolicy, StageResult, resumir_protocolo
+from journey.single_flight import SingleFlight, chave_jornada, get_single_flight
+from llm.circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm.factory import get_circuit_breaker
+from llm.usage import current_llm_usage, track_llm_usage
+from observability import configure_logging
+from tools.nota_fiscal import arquivo_nota_fiscal, carregar_nota_fiscal, conferir_itens, descrever_nota_procurada
+from tools.prazos import campos_triagem, prazo_triagem, triar_protocolos
+
+logger = logging.getLogger(__name__)
 
 
 class ExchangeJourneyOrchestrator:
@@ -43,15 +66,36 @@ class ExchangeJourneyOrchestrator:
     3. Implementar lógica condicional (ex: validação de estoque só se necessário)
     4. Consolidar resultados finais
     5. Gerar relatório completo da jornada
+    6. Adiar jornadas (fail fast) enquanto o provedor de LLM estiver fora
     """
 
-    def __init__(self):
+    def __init__(self, circuit_breaker: Optional[CircuitBreaker] = None,
+                 deferred_queue: Optional[DeferredJourneyQueue] = None,
+                 log_sink: Optional[LogSink] = None,
+                 history: Optional[JourneyHistory] = None,
+                 raw_retention: Optional[RawRetentionPolicy] = None,
+                 report_store: Optional[SegmentedReportStore] = None,
+                 analytics: Optional[JourneyAnalyticsStore] = None,
+                 single_flight: Optional[SingleFlight] = None):
         """
         Inicializa o orquestrador
 
         CONCEITO - Lazy Initialization:
         Os agents são criados sob demanda para economizar recursos
+
+        Args:
+            circuit_breaker: Circuito do provedor de LLM (padrão: o compartilhado)
+            deferred_queue: Fila de jornadas adiadas (padrão: a compartilhada)
+            log_sink: Destino das entradas de log (padrão: JOURNEY_LOG_PATH ou descarte)
+            history: Histórico limitado de jornadas (padrão: o compartilhado)
+            raw_retention: Política de retenção de dados brutos (padrão: JOURNEY_RAW_RETENTION)
+            report_store: Store de relatórios (padrão: o compartilhado, criado no primeiro uso)
+            analytics: Base analítica SQLite (padrão: JOURNEY_ANALYTICS_DB, opcional)
+            single_flight: Deduplicação de jornadas idênticas (padrão: a compartilhada)
         """
+        # Perfil de log do processo (LOG_PROFILE); no perfil server as etapas não vão para o console
+        configure_logging()
+
         self.customer_validator = None
         self.document_analyzer = None
         self.eligibility_validator = None
@@ -59,7 +103,30 @@ class ExchangeJourneyOrchestrator:
         self.inventory_validator = None
         self.decision_agent = None
 
-        self.journey_log = []  # Log de todas as etapas
+        # Log com escopo por jornada (e por thread, para orquestradores compartilhados)
+        self._local = threading.local()
+        self.log_sink = log_sink if log_sink is not None else get_default_log_sink()
+        self.history = history if history is not None else get_journey_history()
+        self.raw_retention = raw_retention or RawRetentionPolicy.from_env()
+        self._report_store = report_store
+        self.analytics = analytics if analytics is not None else get_analytics_store()
+
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else get_circuit_breaker()
+        self.deferred_queue = deferred_queue if deferred_queue is not None else get_deferred_queue()
+        self.single_flight = single_flight if single_flight is not None else get_single_flight()
+
+        # Validação de schema/CPF/email antes das etapas com LLM (JOURNEY_ADMISSION=off desliga)
+        self.admission = os.getenv("JOURNEY_ADMISSION", "on").lower() not in ("off", "0", "false")
+
+        # Triagem de prazo antes das etapas com LLM (JOURNEY_PRESCREEN=off desliga)
+        self.prescreen = os.getenv("JOURNEY_PRESCREEN", "on").lower() not in ("off", "0", "false")
+        self.prescreen_margin = int(os.getenv("JOURNEY_PRESCREEN_MARGIN_DAYS", "0"))
+
+    @property
+    def journey_log(self) -> list:
+        """Entradas do log da jornada em execução (ou da última executada) nesta thread"""
+        log = getattr(self._local, "log", None)
+        return log.entries if log is not None else []
 
     def _log_step(self, step_name: str, status: str, details: Any):
         """
@@ -68,14 +135,9 @@ class ExchangeJourneyOrchestrator:
         CONCEITO - Observability:
         Logging detalhado permite auditoria e debugging da jornada
         """
-        self.journey_log.append({
-            "timestamp": datetime.now().isoformat(),
-            "step": step_name,
-            "status": status,
-            "details": details
-        })
-
-    def execute_journey(self, protocolo_data: dict) -> dict:
+        self._local.log.add(step_name, status, details)
+
+    def execute_journey(self, protocolo_data: dict, admitido: bool = False, triado: bool = False) -> dict:
         """
         Executa a jornada completa de troca
 
@@ -86,148 +148,218 @@ class ExchangeJourneyOrchestrator:
 
         Args:
             protocolo_data: Dados do protocolo de troca
+            admitido: Protocolo já aprovado na admissão (ex: por `validar_lote`)
+            triado: Protocolo já aprovado na triagem de prazo (ex: por `triar_protocolos`)
 
         Returns:
-            Resultado completo da jornada com decisão final
+            Resultado completo da jornada com decisão final (formato dict)
         """
-        print("\n" + "="*80)
-        print("🚀 INICIANDO JORNADA AGÊNTICA DE TROCA DE PRODUTOS")
-        print("="*80)
-        print(f"\nProtocolo: {protocolo_data.get('protocolo', 'N/A')}")
-        print(f"Cliente: {protocolo_data.get('cliente', {}).get('nome', 'N/A')}")
-        print(f"Produto: {protocolo_data.get('produto_original', {}).get('descricao', 'N/A')}")
-        print("\n" + "-"*80 + "\n")
-
-        resultados = {
-            "protocolo": protocolo_data.get("protocolo"),
-            "data_inicio": datetime.now().isoformat(),
-            "protocolo_data": protocolo_data
-        }
+        return self.execute(protocolo_data, admitido=admitido, triado=triado).to_dict()
+
+    def execute(self, protocolo_data: dict, admitido: bool = False, triado: bool = False) -> JourneyResult:
+        """
+        Executa a jornada e retorna o resultado tipado (JourneyResult)
+
+        Args:
+            protocolo_data: Dados do protocolo de troca
+            admitido: Pula a admissão (protocolo já validado)
+            triado: Pula a triagem de prazo (protocolo já triado)
+
+        Returns:
+            JourneyResult com uma única cópia de cada informação
+        """
+        # CONCEITO - Single Flight:
+        # Duplicatas do mesmo protocolo (duplo clique, reenvio) esperam a
+        # jornada em andamento ou recebem o resultado recente, sem chamar
+        # os agents nem reservar estoque de novo
+        resultado, compartilhado = self.single_flight.run(
+            chave_jornada(protocolo_data),
+            lambda: self._execute_once(protocolo_data, admitido, triado),
+            cacheable=lambda r: r.decisao_final not in ("adiado", "erro")
+        )
+        if compartilhado:
+            logger.info(f"♻️  Protocolo duplicado: resultado da jornada {resultado.protocolo} reaproveitado",
+                        extra={"protocolo": resultado.protocolo})
+        return resultado
+
+    def _execute_once(self, protocolo_data: dict, admitido: bool = False, triado: bool = False) -> JourneyResult:
+        # Chamadas e tokens de LLM desta jornada (ver llm/usage.py) e os
+        # efeitos colaterais a desfazer se ela não for aprovada (journey/compensation.py)
+        with track_llm_usage(), journey_saga(protocolo_data.get("protocolo")):
+            return self._run_journey(protocolo_data, admitido, triado)
+
+    def _run_journey(self, protocolo_data: dict, admitido: bool = False, triado: bool = False) -> JourneyResult:
+        """Executa as 6 etapas da jornada"""
+        # CONCEITO - Multi-Item Journey (journey/itens.py):
+        # Uma lista `itens` com um só item é um protocolo de sempre
+        multi_item = protocolo_multi_item(protocolo_data)
+        itens = itens_do_protocolo(protocolo_data)
+        if not multi_item and protocolo_data.get("itens"):
+            protocolo_data = protocolo_do_item(protocolo_data, itens[0])
+
+        logger.info("\n" + "="*80)
+        logger.info("🚀 INICIANDO JORNADA AGÊNTICA DE TROCA DE PRODUTOS")
+        logger.info("="*80)
+        logger.info(f"\nProtocolo: {protocolo_data.get('protocolo', 'N/A')}")
+        logger.info(f"Cliente: {protocolo_data.get('cliente', {}).get('nome', 'N/A')}")
+        if multi_item:
+            logger.info(f"Itens: {len(itens)}")
+        else:
+            logger.info(f"Produto: {protocolo_data.get('produto_original', {}).get('descricao', 'N/A')}")
+        logger.info("\n" + "-"*80 + "\n")
+
+        resultado = self._iniciar_resultado(protocolo_data)
+
+        # CONCEITO - Admission Gate:
+        # Protocolo malformado (CPF, email, datas, campos obrigatórios) é
+        # rejeitado em microssegundos, sem chegar ao CustomerValidatorAgent
+        if self.admission and not admitido:
+            invalido = validar_protocolo(protocolo_data)
+            if invalido is not None:
+                return self._rejeitar_na_admissao(resultado, invalido["motivo"], invalido["erros"])
+
+        # CONCEITO - Pre-Screen:
+        # Protocolo claramente fora do prazo é rejeitado sem chamar nenhum agent
+        # (em protocolos com vários itens, o item expirado é rejeitado sozinho)
+        expirados: Dict[int, tuple] = {}
+        triar = self.prescreen and not triado
+        if triar and multi_item:
+            for item in itens:
+                dias_prazo = self._triagem_prazo(protocolo_do_item(protocolo_data, item))
+                if dias_prazo is not None:
+                    expirados[item["item"]] = dias_prazo
+            if len(expirados) == len(itens):
+                return self._rejeitar_na_triagem(resultado, *expirados[itens[0]["item"]])
+        elif triar:
+            dias_prazo = self._triagem_prazo(protocolo_data)
+            if dias_prazo is not None:
+                return self._rejeitar_na_triagem(resultado, *dias_prazo)
+
+        # CONCEITO - Fail Fast:
+        # Com o circuito aberto, nenhuma etapa conseguiria chamar o LLM.
+        # A jornada é adiada imediatamente em vez de esperar timeouts.
+        if self.circuit_breaker and not self.circuit_breaker.is_available():
+            return self._adiar_jornada(protocolo_data, resultado, "inicio", self.circuit_breaker.retry_after())
 
         # =================================================================
         # ETAPA 1: Validação de Cliente
         # =================================================================
-        print("📋 ETAPA 1/6: Validação dos Dados do Cliente")
-        print("-"*80)
+        logger.info("📋 ETAPA 1/6: Validação dos Dados do Cliente")
+        logger.info("-"*80)
 
         try:
             if not self.customer_validator:
-                self.customer_validator = CustomerValidatorAgent()
-
-            resultado_cliente = self.customer_validator.validate(protocolo_data)
-            resultados["validacao_cliente"] = resultado_cliente
+                self.customer_validator = agents.CustomerValidatorAgent()
 
-            self._log_step("validacao_cliente", resultado_cliente["status"], resultado_cliente)
+            cliente = self._run_stage(
+                resultado, "validacao_cliente",
+                lambda: self.customer_validator.validate(protocolo_data)
+            )
 
-            print(f"\n✓ Status: {resultado_cliente['status'].upper()}")
+            logger.info(f"\n✓ Status: {cliente.status.upper()}")
 
             # Se reprovado, interrompe a jornada
-            if resultado_cliente["status"] == "reprovado":
-                print("\n❌ JORNADA INTERROMPIDA: Cliente não validado")
-                resultados["decisao_final"] = "rejeitado"
-                resultados["motivo_interrupcao"] = "Validação de cliente reprovada"
-                return self._finalize_journey(resultados)
+            if cliente.status == "reprovado":
+                logger.info("\n❌ JORNADA INTERROMPIDA: Cliente não validado")
+                return self._interromper(resultado, "Validação de cliente reprovada")
 
+        except CircuitOpenError as e:
+            return self._adiar_jornada(protocolo_data, resultado, "validacao_cliente", e.retry_after)
         except Exception as e:
-            print(f"\n❌ ERRO na validação de cliente: {str(e)}")
-            resultados["erro"] = str(e)
-            resultados["decisao_final"] = "erro"
-            return self._finalize_journey(resultados)
+            logger.error(f"\n❌ ERRO na validação de cliente: {str(e)}", extra={"protocolo": resultado.protocolo})
+            return self._falhar(resultado, e)
 
-        print("\n" + "-"*80 + "\n")
+        logger.info("\n" + "-"*80 + "\n")
 
         # =================================================================
         # ETAPA 2: Análise de Documentos
         # =================================================================
-        print("📄 ETAPA 2/6: Análise dos Documentos Anexados")
-        print("-"*80)
+        logger.info("📄 ETAPA 2/6: Análise dos Documentos Anexados")
+        logger.info("-"*80)
 
         try:
             if not self.document_analyzer:
-                self.document_analyzer = DocumentAnalyzerAgent()
-
-            resultado_documentos = self.document_analyzer.analyze(protocolo_data)
-            resultados["analise_documentos"] = resultado_documentos
+                self.document_analyzer = agents.DocumentAnalyzerAgent()
 
-            self._log_step("analise_documentos", resultado_documentos["status"], resultado_documentos)
+            documentos = self._run_stage(
+                resultado, "analise_documentos",
+                lambda: self.document_analyzer.analyze(protocolo_data)
+            )
 
-            print(f"\n✓ Status: {resultado_documentos['status'].upper()}")
-            print(f"✓ Data da Compra: {resultado_documentos.get('data_compra', 'N/A')}")
-            print(f"✓ Categoria: {resultado_documentos.get('categoria', 'N/A')}")
+            logger.info(f"\n✓ Status: {documentos.status.upper()}")
+            logger.info(f"✓ Data da Compra: {documentos.get('data_compra', 'N/A')}")
+            logger.info(f"✓ Categoria: {documentos.get('categoria', 'N/A')}")
 
-            if resultado_documentos["status"] == "reprovado":
-                print("\n❌ JORNADA INTERROMPIDA: Documentos inválidos")
-                resultados["decisao_final"] = "rejeitado"
-                resultados["motivo_interrupcao"] = "Análise de documentos reprovada"
-                return self._finalize_journey(resultados)
+            if documentos.status == "reprovado":
+                logger.info("\n❌ JORNADA INTERROMPIDA: Documentos inválidos")
+                return self._interromper(resultado, "Análise de documentos reprovada")
 
+        except CircuitOpenError as e:
+            return self._adiar_jornada(protocolo_data, resultado, "analise_documentos", e.retry_after)
         except Exception as e:
-            print(f"\n❌ ERRO na análise de documentos: {str(e)}")
-            resultados["erro"] = str(e)
-            resultados["decisao_final"] = "erro"
-            return self._finalize_journey(resultados)
+            logger.error(f"\n❌ ERRO na análise de documentos: {str(e)}", extra={"protocolo": resultado.protocolo})
+            return self._falhar(resultado, e)
 
-        print("\n" + "-"*80 + "\n")
+        logger.info("\n" + "-"*80 + "\n")
+
+        # Etapas 3 a 6 em lote, com uma decisão por item
+        if multi_item:
+            return self._run_item_stages(protocolo_data, resultado, itens, expirados, documentos)
 
         # =================================================================
         # ETAPA 3: Validação de Elegibilidade
         # =================================================================
-        print("✅ ETAPA 3/6: Validação de Elegibilidade da Troca")
-        print("-"*80)
+        logger.info("✅ ETAPA 3/6: Validação de Elegibilidade da Troca")
+        logger.info("-"*80)
 
         try:
             if not self.eligibility_validator:
-                self.eligibility_validator = EligibilityValidatorAgent()
+                self.eligibility_validator = agents.EligibilityValidatorAgent()
 
-            resultado_elegibilidade = self.eligibility_validator.validate(
-                protocolo_data,
-                resultado_documentos
+            elegibilidade = self._run_stage(
+                resultado, "validacao_elegibilidade",
+                lambda: self.eligibility_validator.validate(protocolo_data, documentos.to_dict())
             )
-            resultados["validacao_elegibilidade"] = resultado_elegibilidade
-
-            self._log_step("validacao_elegibilidade", resultado_elegibilidade["status"], resultado_elegibilidade)
 
-            print(f"\n✓ Status: {resultado_elegibilidade['status'].upper()}")
+            logger.info(f"\n✓ Status: {elegibilidade.status.upper()}")
 
-            if resultado_elegibilidade["status"] == "reprovado":
-                print("\n❌ JORNADA INTERROMPIDA: Troca não elegível")
-                resultados["decisao_final"] = "rejeitado"
-                resultados["motivo_interrupcao"] = "Validação de elegibilidade reprovada"
-                return self._finalize_journey(resultados)
+            if elegibilidade.status == "reprovado":
+                logger.info("\n❌ JORNADA INTERROMPIDA: Troca não elegível")
+                return self._interromper(resultado, "Validação de elegibilidade reprovada")
 
+        except CircuitOpenError as e:
+            return self._adiar_jornada(protocolo_data, resultado, "validacao_elegibilidade", e.retry_after)
         except Exception as e:
-            print(f"\n❌ ERRO na validação de elegibilidade: {str(e)}")
-            resultados["erro"] = str(e)
-            resultados["decisao_final"] = "erro"
-            return self._finalize_journey(resultados)
+            logger.error(f"\n❌ ERRO na validação de elegibilidade: {str(e)}", extra={"protocolo": resultado.protocolo})
+            return self._falhar(resultado, e)
 
-        print("\n" + "-"*80 + "\n")
+        logger.info("\n" + "-"*80 + "\n")
 
         # =================================================================
         # ETAPA 4: Classificação do Tipo de Troca
         # =================================================================
-        print("🏷️  ETAPA 4/6: Caracterização do Tipo de Troca")
-        print("-"*80)
+        logger.info("🏷️  ETAPA 4/6: Caracterização do Tipo de Troca")
+        logger.info("-"*80)
 
         try:
             if not self.exchange_classifier:
-                self.exchange_classifier = ExchangeClassifierAgent()
+                self.exchange_classifier = agents.ExchangeClassifierAgent()
 
-            resultado_classificacao = self.exchange_classifier.classify(protocolo_data)
-            resultados["classificacao_troca"] = resultado_classificacao
-
-            self._log_step("classificacao_troca", "concluido", resultado_classificacao)
+            classificacao = self._run_stage(
+                resultado, "classificacao_troca",
+                lambda: self.exchange_classifier.classify(protocolo_data)
+            )
 
-            print(f"\n✓ Tipo Classificado: {resultado_classificacao.get('tipo_troca_classificado', 'N/A')}")
-            print(f"✓ Requer Validação de Estoque: {'Sim' if resultado_classificacao.get('requer_validacao_estoque') else 'Não'}")
+            logger.info(f"\n✓ Tipo Classificado: {classificacao.get('tipo_troca_classificado', 'N/A')}")
+            logger.info(f"✓ Requer Validação de Estoque: {'Sim' if classificacao.get('requer_validacao_estoque') else 'Não'}")
 
+        except CircuitOpenError as e:
+            return self._adiar_jornada(protocolo_data, resultado, "classificacao_troca", e.retry_after)
         except Exception as e:
-            print(f"\n❌ ERRO na classificação: {str(e)}")
-            resultados["erro"] = str(e)
-            resultados["decisao_final"] = "erro"
-            return self._finalize_journey(resultados)
+            logger.error(f"\n❌ ERRO na classificação: {str(e)}", extra={"protocolo": resultado.protocolo})
+            return self._falhar(resultado, e)
 
-        print("\n" + "-"*80 + "\n")
+        logger.info("\n" + "-"*80 + "\n")
 
         # =================================================================
         # ETAPA 5: Validação de Estoque (CONDICIONAL)
@@ -235,108 +367,516 @@ class ExchangeJourneyOrchestrator:
         # CONCEITO - Conditional Workflow:
         # Esta etapa só executa se o tipo de troca requer validação de estoque
 
-        if resultado_classificacao.get("requer_validacao_estoque"):
-            print("📦 ETAPA 5/6: Validação de Estoque")
-            print("-"*80)
+        if classificacao.get("requer_validacao_estoque"):
+            logger.info("📦 ETAPA 5/6: Validação de Estoque")
+            logger.info("-"*80)
 
             try:
                 if not self.inventory_validator:
-                    self.inventory_validator = InventoryValidatorAgent()
-
-                resultado_estoque = self.inventory_validator.validate(protocolo_data)
-                resultados["validacao_estoque"] = resultado_estoque
+                    self.inventory_validator = agents.InventoryValidatorAgent()
 
-                self._log_step("validacao_estoque", resultado_estoque["status"], resultado_estoque)
+                estoque = self._run_stage(
+                    resultado, "validacao_estoque",
+                    lambda: self.inventory_validator.validate(protocolo_data)
+                )
 
-                print(f"\n✓ Status: {resultado_estoque['status'].upper()}")
-                if resultado_estoque.get("reserva_id"):
-                    print(f"✓ Reserva Criada: {resultado_estoque['reserva_id']}")
+                logger.info(f"\n✓ Status: {estoque.status.upper()}")
+                if estoque.get("reserva_id"):
+                    logger.info(f"✓ Reserva Criada: {estoque.get('reserva_id')}")
 
-                if resultado_estoque["status"] == "indisponivel":
-                    print("\n⚠️  Produto indisponível em estoque")
+                if estoque.status == "indisponivel":
+                    logger.info("\n⚠️  Produto indisponível em estoque")
                     # Não interrompe, mas marca para decisão final
 
+            except CircuitOpenError as e:
+                return self._adiar_jornada(protocolo_data, resultado, "validacao_estoque", e.retry_after)
             except Exception as e:
-                print(f"\n❌ ERRO na validação de estoque: {str(e)}")
-                resultados["erro"] = str(e)
-                resultados["decisao_final"] = "erro"
-                return self._finalize_journey(resultados)
+                logger.error(f"\n❌ ERRO na validação de estoque: {str(e)}", extra={"protocolo": resultado.protocolo})
+                return self._falhar(resultado, e)
 
-            print("\n" + "-"*80 + "\n")
+            logger.info("\n" + "-"*80 + "\n")
         else:
-            print("📦 ETAPA 5/6: Validação de Estoque - NÃO APLICÁVEL")
-            print("-"*80)
-            print("\n✓ Esta troca não requer validação de estoque")
-            resultados["validacao_estoque"] = None
+            logger.info("📦 ETAPA 5/6: Validação de Estoque - NÃO APLICÁVEL")
+            logger.info("-"*80)
+            logger.info("\n✓ Esta troca não requer validação de estoque")
+            resultado.etapas["validacao_estoque"] = None
             self._log_step("validacao_estoque", "nao_aplicavel", "Tipo de troca não requer validação de estoque")
-            print("\n" + "-"*80 + "\n")
+            logger.info("\n" + "-"*80 + "\n")
 
         # =================================================================
         # ETAPA 6: Decisão Final
         # =================================================================
-        print("⚖️  ETAPA 6/6: Decisão Final")
-        print("-"*80)
+        logger.info("⚖️  ETAPA 6/6: Decisão Final")
+        logger.info("-"*80)
 
         try:
             if not self.decision_agent:
-                self.decision_agent = DecisionAgent()
+                self.decision_agent = agents.DecisionAgent()
+
+            decisao = self._run_stage(
+                resultado, "decisao",
+                lambda: self.decision_agent.decide(resultado.to_dict()),
+                status_key="decisao_final"
+            )
+            resultado.decisao_final = decisao.status
 
-            resultado_decisao = self.decision_agent.decide(resultados)
-            resultados["decisao"] = resultado_decisao
-            resultados["decisao_final"] = resultado_decisao["decisao_final"]
+            logger.info(f"\n{'✅' if decisao.status == 'aprovado' else '❌'} Decisão: {decisao.status.upper()}")
 
-            self._log_step("decisao_final", resultado_decisao["decisao_final"], resultado_decisao)
+        except CircuitOpenError as e:
+            return self._adiar_jornada(protocolo_data, resultado, "decisao", e.retry_after)
+        except Exception as e:
+            logger.error(f"\n❌ ERRO na decisão final: {str(e)}", extra={"protocolo": resultado.protocolo})
+            return self._falhar(resultado, e)
+
+        logger.info("\n" + "="*80)
+
+        return self._finalize_journey(resultado)
+
+    def _run_item_stages(self, protocolo_data: dict, resultado: JourneyResult, itens: List[dict],
+                         expirados: Dict[int, tuple], documentos: StageResult) -> JourneyResult:
+        """
+        Etapas por item de um protocolo com vários itens
+
+        CONCEITO - Multi-Item Journey (journey/itens.py):
+        Cliente e documentos já foram validados uma vez para o protocolo.
+        Cada etapa seguinte executa o seu agent uma única vez para todos os
+        itens ainda em análise (agents/multi_item.py). O item reprovado numa
+        etapa sai das seguintes e fica rejeitado, sem interromper os demais;
+        a decisão do protocolo é "aprovado", "parcial" ou "rejeitado".
+        """
+        situacao: Dict[int, dict] = {
+            item["item"]: {
+                "item": item["item"],
+                "produto_original": item["produto_original"].get("codigo"),
+                "produto_desejado": item["produto_desejado"].get("codigo"),
+                "decisao": None,
+                "motivo": None
+            }
+            for item in itens
+        }
+
+        def rejeitar(numero: int, motivo: str):
+            situacao[numero].update(decisao="rejeitado", motivo=motivo)
 
-            print(f"\n{'✅' if resultado_decisao['decisao_final'] == 'aprovado' else '❌'} Decisão: {resultado_decisao['decisao_final'].upper()}")
+        def pendentes() -> List[dict]:
+            return [item for item in itens if situacao[item["item"]]["decisao"] is None]
 
+        for numero, (dias, prazo) in expirados.items():
+            rejeitar(numero, f"Prazo de troca expirado (triagem): {dias} dias, prazo de {prazo}")
+
+        etapa = "conferencia_nota"
+        try:
+            # =============================================================
+            # Conferência dos itens com as linhas da nota fiscal (sem LLM)
+            # =============================================================
+            numero_nota = itens[0]["produto_original"].get("numero_nota_fiscal")
+            cpf = (protocolo_data.get("cliente") or {}).get("cpf")
+            nota = carregar_nota_fiscal(arquivo_nota_fiscal(protocolo_data), numero_nota, cpf)
+            if nota is None:
+                # Nota inexistente ou de outro CPF: nenhum item consta nela
+                nota = {"numero_nota": numero_nota or "N/A", "produtos": []}
+                motivo_nota = f"{descrever_nota_procurada(numero_nota, cpf)} não encontrada"
+            else:
+                motivo_nota = "Item não consta na nota fiscal"
+            conferencia = conferir_itens(nota, pendentes())
+            for conferido in conferencia:
+                item = itens[conferido["item"] - 1]
+                if conferido["linha"] is None:
+                    rejeitar(item["item"], motivo_nota)
+                else:
+                    item["categoria"] = conferido["linha"].get("categoria") or documentos.get("categoria")
+                    item["data_compra"] = documentos.get("data_compra") or item["produto_original"].get("data_compra")
+
+            na_nota = sum(conferido["linha"] is not None for conferido in conferencia)
+            resultado.etapas[etapa] = StageResult(
+                etapa=etapa,
+                agent="Conferência da Nota Fiscal",
+                status="aprovado" if na_nota else "reprovado",
+                output=f"{na_nota} de {len(conferencia)} itens constam na nota fiscal {nota.get('numero_nota', 'N/A')}",
+                dados={"itens": [
+                    {"item": c["item"], "codigo": c["codigo"], "na_nota": c["linha"] is not None} for c in conferencia
+                ]}
+            )
+            self._log_step(etapa, resultado.etapas[etapa].status, {"itens_na_nota": na_nota})
+
+            # =============================================================
+            # ETAPA 3: Validação de Elegibilidade (todos os itens)
+            # =============================================================
+            etapa = "validacao_elegibilidade"
+            lote = pendentes()
+            if lote:
+                logger.info(f"✅ ETAPA 3/6: Validação de Elegibilidade ({len(lote)} itens)")
+                if not self.eligibility_validator:
+                    self.eligibility_validator = agents.EligibilityValidatorAgent()
+
+                elegibilidade = self._run_stage(
+                    resultado, etapa,
+                    lambda: self.eligibility_validator.validate_itens(protocolo_data, lote, documentos.to_dict())
+                )
+                for item in lote:
+                    status = elegibilidade.get("itens")[item["item"]]["status"]
+                    situacao[item["item"]]["elegibilidade"] = status
+                    if status == "reprovado":
+                        rejeitar(item["item"], "Validação de elegibilidade reprovada")
+
+            # =============================================================
+            # ETAPA 4: Classificação do Tipo de Troca (todos os itens)
+            # =============================================================
+            etapa = "classificacao_troca"
+            lote = pendentes()
+            if lote:
+                logger.info(f"🏷️  ETAPA 4/6: Caracterização do Tipo de Troca ({len(lote)} itens)")
+                if not self.exchange_classifier:
+                    self.exchange_classifier = agents.ExchangeClassifierAgent()
+
+                classificacao = self._run_stage(
+                    resultado, etapa,
+                    lambda: self.exchange_classifier.classify_itens(protocolo_data, lote)
+                )
+                for item in lote:
+                    classificado = classificacao.get("itens")[item["item"]]
+                    situacao[item["item"]]["tipo_troca"] = classificado["tipo_troca_classificado"]
+                    situacao[item["item"]]["requer_estoque"] = classificado["requer_validacao_estoque"]
+
+            # =============================================================
+            # ETAPA 5: Validação de Estoque (itens que requerem)
+            # =============================================================
+            etapa = "validacao_estoque"
+            lote = [item for item in pendentes() if situacao[item["item"]].get("requer_estoque")]
+            if lote:
+                logger.info(f"📦 ETAPA 5/6: Validação de Estoque ({len(lote)} itens)")
+                if not self.inventory_validator:
+                    self.inventory_validator = agents.InventoryValidatorAgent()
+
+                estoque = self._run_stage(
+                    resultado, etapa,
+                    lambda: self.inventory_validator.validate_itens(protocolo_data, lote)
+                )
+                # Item indisponível não é rejeitado aqui: a decisão final avalia
+                for item in lote:
+                    verificado = estoque.get("itens")[item["item"]]
+                    situacao[item["item"]]["estoque"] = verificado["status"]
+                    situacao[item["item"]]["reserva_id"] = verificado["reserva_id"]
+            else:
+                resultado.etapas[etapa] = None
+                self._log_step(etapa, "nao_aplicavel", "Nenhum item requer validação de estoque")
+
+            # =============================================================
+            # ETAPA 6: Decisão Final (uma por item)
+            # =============================================================
+            etapa = "decisao"
+            lote = pendentes()
+            if lote:
+                logger.info(f"⚖️  ETAPA 6/6: Decisão Final ({len(lote)} itens)")
+                if not self.decision_agent:
+                    self.decision_agent = agents.DecisionAgent()
+
+                decisao = self._run_stage(
+                    resultado, etapa,
+                    lambda: self.decision_agent.decide_itens(
+                        resultado.to_dict(), [situacao[item["item"]] for item in lote]
+                    ),
+                    status_key="decisao_final"
+                )
+                for item in lote:
+                    if decisao.get("itens")[item["item"]]["decisao_final"] == "aprovado":
+                        situacao[item["item"]]["decisao"] = "aprovado"
+                    else:
+                        rejeitar(item["item"], "Rejeitado na decisão final")
+
+        except CircuitOpenError as e:
+            return self._adiar_jornada(protocolo_data, resultado, etapa, e.retry_after)
         except Exception as e:
-            print(f"\n❌ ERRO na decisão final: {str(e)}")
-            resultados["erro"] = str(e)
-            resultados["decisao_final"] = "erro"
-            return self._finalize_journey(resultados)
+            logger.error(f"\n❌ ERRO na etapa {etapa}: {str(e)}", extra={"protocolo": resultado.protocolo})
+            return self._falhar(resultado, e)
+
+        resultado.extras["itens"] = list(situacao.values())
+        resultado.decisao_final = decisao_agregada(s["decisao"] for s in situacao.values())
+        if resultado.etapas.get("decisao") is None:
+            resultado.motivo_interrupcao = "Todos os itens reprovados antes da decisão final"
+
+        aprovados = sum(s["decisao"] == "aprovado" for s in situacao.values())
+        logger.info(f"\n⚖️  Decisão: {resultado.decisao_final.upper()} ({aprovados} de {len(itens)} itens aprovados)")
+        logger.info("\n" + "="*80)
+
+        return self._finalize_journey(resultado)
+
+    def _iniciar_resultado(self, protocolo_data: dict) -> JourneyResult:
+        """Cria o log e o resultado da jornada nesta thread"""
+        log = JourneyLog(protocolo_data.get("protocolo"), self.log_sink)
+        self._local.log = log
+        self._local.coletar_raw = self.raw_retention.collect()
+
+        return JourneyResult(
+            protocolo=protocolo_data.get("protocolo"),
+            data_inicio=datetime.now().isoformat(),
+            protocolo_resumo=resumir_protocolo(protocolo_data),
+            log=log.entries,
+            protocolo_data=protocolo_data if self._local.coletar_raw else None
+        )
+
+    def _triagem_prazo(self, protocolo_data: dict) -> Optional[tuple]:
+        """
+        (dias decorridos, prazo) se o protocolo estiver claramente fora do prazo
+
+        Sem data de compra válida não há triagem: a análise de documentos decide.
+        """
+        data_compra, categoria, tipo_troca, motivo = campos_triagem(protocolo_data)
+        try:
+            dias = (date.today() - date.fromisoformat(data_compra)).days
+        except (TypeError, ValueError):
+            return None
+
+        prazo = prazo_triagem(categoria, tipo_troca, motivo)
+        return (dias, prazo) if dias > prazo + self.prescreen_margin else None
+
+    def _rejeitar_na_admissao(self, resultado: JourneyResult, motivo: str, erros: List[dict]) -> JourneyResult:
+        """Encerra a jornada como rejeitada pela validação do protocolo"""
+        resultado.etapas["admissao"] = StageResult(
+            etapa="admissao",
+            agent="Admissão de Protocolo",
+            status="reprovado",
+            output=motivo,
+            dados={"erros": erros}
+        )
+        self._log_step("admissao", "reprovado", {"erros": erros})
+
+        logger.info(f"\n❌ JORNADA INTERROMPIDA: {motivo}")
+        return self._interromper(resultado, motivo)
+
+    def _rejeitar_na_triagem(self, resultado: JourneyResult, dias: int, prazo: int) -> JourneyResult:
+        """Encerra a jornada como rejeitada pela triagem de prazo"""
+        resultado.etapas["triagem_prazo"] = StageResult(
+            etapa="triagem_prazo",
+            agent="Triagem de Prazo",
+            status="reprovado",
+            output=f"Prazo de troca expirado: {dias} dias desde a compra, prazo de {prazo} dias",
+            dados={"dias_decorridos": dias, "prazo_limite": prazo}
+        )
+        self._log_step("triagem_prazo", "reprovado", {"dias_decorridos": dias, "prazo_limite": prazo})
+
+        logger.info(f"\n❌ JORNADA INTERROMPIDA: fora do prazo ({dias} dias, prazo de {prazo})")
+        return self._interromper(resultado, "Prazo de troca expirado (triagem)")
+
+    def executar_lote(self, protocolos: List[dict]) -> List[dict]:
+        """
+        Executa um lote de protocolos com triagem vetorizada de prazo
+
+        CONCEITO - Vectorized Pre-Screen:
+        A validação dos protocolos (journey/admission.py) e os prazos
+        (tools/prazos.py) de todo o lote são calculados em passadas NumPy;
+        os protocolos inválidos ou expirados são rejeitados sem nenhuma
+        etapa com LLM e os demais seguem a jornada sem repetir essas
+        verificações. Protocolos com itens são triados item a item na
+        própria jornada (a triagem do lote olha só `produto_original`).
+
+        Returns:
+            Resultados na mesma ordem dos protocolos
+        """
+        admissao = None
+        if self.admission and protocolos:
+            admissao = validar_lote(protocolos)
+            logger.info(f"🔎 Admissão: {int((~admissao['valido']).sum())} de {len(protocolos)} protocolos inválidos")
+
+        triagem = None
+        if self.prescreen and protocolos:
+            triagem = triar_protocolos(protocolos, margem_dias=self.prescreen_margin)
+            logger.info(f"🔎 Triagem de prazo: {int(triagem['expirado'].sum())} de {len(protocolos)} protocolos expirados")
+
+        resultados = []
+        for i, protocolo_data in enumerate(protocolos):
+            if admissao is not None and not admissao["valido"][i]:
+                resultado = self._iniciar_resultado(protocolo_data)
+                resultado = self._rejeitar_na_admissao(resultado, admissao["motivo"][i], admissao["erros"][i])
+                resultados.append(resultado.to_dict())
+            elif triagem is not None and triagem["expirado"][i]:
+                resultado = self._iniciar_resultado(protocolo_data)
+                resultado = self._rejeitar_na_triagem(resultado, int(triagem["dias"][i]), int(triagem["prazo"][i]))
+                resultados.append(resultado.to_dict())
+            else:
+                resultados.append(self.execute_journey(
+                    protocolo_data,
+                    admitido=admissao is not None,
+                    triado=triagem is not None and not protocolo_data.get("itens")
+                ))
+        return resultados
+
+    def _run_stage(self, resultado: JourneyResult, etapa: str, executar: Callable[[], dict],
+                   status_key: str = "status") -> StageResult:
+        """
+        Executa um agent, mede a duração e registra a etapa
+
+        CONCEITO - Single Copy:
+        O payload da etapa fica apenas no JourneyResult; o log recebe
+        só o status e a duração.
+        """
+        inicio = time.perf_counter()
+        bruto = executar()
+        stage = StageResult.from_agent(etapa, bruto, (time.perf_counter() - inicio) * 1000, status_key)
+
+        if not self._local.coletar_raw:
+            stage.raw = None
+
+        resultado.etapas[etapa] = stage
+        self._log_step(etapa, stage.status, {"duracao_ms": stage.duracao_ms})
+        return stage
+
+    def _interromper(self, resultado: JourneyResult, motivo: str) -> JourneyResult:
+        """Encerra a jornada como rejeitada antes da decisão final"""
+        resultado.decisao_final = "rejeitado"
+        resultado.motivo_interrupcao = motivo
+        return self._finalize_journey(resultado)
+
+    def _falhar(self, resultado: JourneyResult, erro: Exception) -> JourneyResult:
+        """Encerra a jornada com erro"""
+        resultado.erro = str(erro)
+        resultado.decisao_final = "erro"
+        return self._finalize_journey(resultado)
+
+    def _adiar_jornada(self, protocolo_data: dict, resultado: JourneyResult, etapa: str,
+                       retry_after: float) -> JourneyResult:
+        """
+        Adia a jornada enquanto o provedor de LLM estiver indisponível
+
+        CONCEITO - Graceful Degradation:
+        Em vez de marcar a jornada como erro após longos timeouts, ela é
+        devolvida na hora como "adiada" e registrada na fila de reprocessamento.
+        """
+        enfileirada = self.deferred_queue.put(protocolo_data, motivo=f"circuito aberto na etapa {etapa}")
+
+        logger.warning(f"\n⏸️  JORNADA ADIADA: provedor de LLM indisponível (etapa: {etapa})",
+                       extra={"protocolo": resultado.protocolo})
 
-        print("\n" + "="*80)
+        if enfileirada:
+            resultado.decisao_final = "adiado"
+            resultado.motivo_interrupcao = "Provedor de LLM indisponível (circuit breaker aberto)"
+            resultado.extras["reprocessar_apos_segundos"] = round(retry_after, 1)
+        else:
+            resultado.erro = "Provedor de LLM indisponível e fila de adiamento cheia"
+            resultado.decisao_final = "erro"
+
+        resultado.extras["etapa_adiamento"] = etapa
+        self._log_step("adiamento", resultado.decisao_final, {"etapa": etapa, "enfileirada": enfileirada})
+
+        return self._finalize_journey(resultado)
+
+    def reprocessar_adiadas(self, max_jornadas: Optional[int] = None) -> List[dict]:
+        """
+        Reexecuta jornadas adiadas enquanto o circuito estiver aceitando chamadas
+
+        Args:
+            max_jornadas: Limite de jornadas reprocessadas nesta chamada
+
+        Returns:
+            Resultados das jornadas reprocessadas
+        """
+        resultados = []
 
-        return self._finalize_journey(resultados)
+        while max_jornadas is None or len(resultados) < max_jornadas:
+            if self.circuit_breaker and not self.circuit_breaker.is_available():
+                break
 
-    def _finalize_journey(self, resultados: dict) -> dict:
+            item = self.deferred_queue.pop()
+            if item is None:
+                break
+
+            resultado = self.execute_journey(item["protocolo_data"])
+            resultados.append(resultado)
+
+            # Circuito abriu de novo: a jornada já voltou para a fila
+            if resultado.get("decisao_final") == "adiado":
+                break
+
+        return resultados
+
+    def _finalize_journey(self, resultado: JourneyResult) -> JourneyResult:
         """
         Finaliza a jornada e gera relatório
 
         CONCEITO - Journey Completion:
         Consolida todos os resultados e gera um relatório completo
         """
-        resultados["data_fim"] = datetime.now().isoformat()
-        resultados["journey_log"] = self.journey_log
+        # CONCEITO - Saga:
+        # Reserva feita na etapa 5 não fica presa quando a jornada não é aprovada
+        saga = current_saga()
+        if saga is not None:
+            compensacoes = []
+            if resultado.decisao_final in DECISOES_COMPENSADAS:
+                compensacoes = saga.compensar(f"jornada {resultado.decisao_final}")
+            elif resultado.decisao_final == "parcial":
+                # Só as reservas dos itens aprovados permanecem
+                mantidas = {s.get("reserva_id") for s in resultado.extras.get("itens", []) if s["decisao"] == "aprovado"}
+                compensacoes = saga.compensar(
+                    "itens rejeitados", filtro=lambda efeito: efeito.get("reserva_id") not in mantidas
+                )
+            saga.concluir()
+
+            if compensacoes:
+                resultado.extras["compensacoes"] = compensacoes
+                self._log_step("compensacao", resultado.decisao_final, {"efeitos": compensacoes})
+
+        resultado.data_fim = datetime.now().isoformat()
+
+        uso = current_llm_usage()
+        if uso is not None:
+            resultado.llm_chamadas = uso.chamadas
+            resultado.llm_tokens = uso.tokens
+
+        # CONCEITO - Raw Retention:
+        # Dados brutos só permanecem no resultado se a política mandar
+        if not self.raw_retention.keep(resultado, self._local.coletar_raw):
+            resultado.drop_raw()
+
+        self.history.record(resultado)
+
+        # A base analítica é opcional: falha nela não altera a decisão da jornada
+        if self.analytics is not None:
+            try:
+                self.analytics.record(resultado)
+            except Exception as e:
+                logger.warning(f"⚠️  Falha ao gravar jornada na base analítica: {str(e)}", extra={"protocolo": resultado.protocolo})
 
-        # Calcula duração (simplificado)
-        # Em produção, calcularia tempo real de execução
+        logger.info("\n🏁 JORNADA CONCLUÍDA")
+        logger.info("="*80)
+        logger.info(f"\nDecisão Final: {(resultado.decisao_final or 'N/A').upper()}")
+        logger.info(f"Total de Etapas Executadas: {len(resultado.log)}")
+        logger.info("\n" + "="*80 + "\n")
 
-        print("\n🏁 JORNADA CONCLUÍDA")
-        print("="*80)
-        print(f"\nDecisão Final: {resultados.get('decisao_final', 'N/A').upper()}")
-        print(f"Total de Etapas Executadas: {len(self.journey_log)}")
-        print("\n" + "="*80 + "\n")
+        return resultado
 
-        return resultados
+    @property
+    def report_store(self) -> SegmentedReportStore:
+        if self._report_store is None:
+            self._report_store = get_report_store()
+        return self._report_store
 
     def save_journey_report(self, resultados: dict, output_path: str = None):
         """
-        Salva relatório completo da jornada em JSON
+        Salva relatório completo da jornada
 
         CONCEITO - Audit Trail:
         Mantém registro completo para auditoria e análise
+
+        Sem `output_path`, o relatório é acrescentado ao store de segmentos
+        comprimidos (JOURNEY_REPORT_DIR) e pode ser recuperado com
+        `carregar_relatorio`. Com `output_path`, é exportado como um arquivo
+        JSON avulso.
         """
         if not output_path:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = f"journey_report_{resultados.get('protocolo', 'unknown')}_{timestamp}.json"
+            local = self.report_store.append(resultados)
+            logger.info(f"📊 Relatório registrado em: {local}")
+            return local
 
         with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(resultados, f, indent=2, ensure_ascii=False, default=str)
 
-        print(f"📊 Relatório salvo em: {output_path}")
+        logger.info(f"📊 Relatório salvo em: {output_path}")
         return output_path
 
+    def carregar_relatorio(self, protocolo: str) -> Optional[dict]:
+        """Recupera o relatório mais recente de um protocolo no store"""
+        return self.report_store.get(protocolo)
+
 
 # Função helper para uso simplificado
 def executar_jornada_troca(protocolo_data: dict) -> dict:
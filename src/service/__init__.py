@@ -0,0 +1,26 @@
+"""
+Serviço de jornadas assíncrono
+
+CONCEITO - Queue-Based Architecture:
+O front end (HTTP) e a execução das jornadas (workers) são separados por
+uma fila durável. A submissão responde em milissegundos e a capacidade de
+processamento cresce subindo mais workers.
+
+Execução (a partir de src/):
+    python -m service --port 8080 --workers 2
+"""
+
+from .job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from .http_server import JourneyHTTPService
+from .worker import run_worker, start_workers
+
+__all__ = [
+    'JobQueue',
+    'QUEUED',
+    'RUNNING',
+    'DONE',
+    'FAILED',
+    'JourneyHTTPService',
+    'run_worker',
+    'start_workers'
+]
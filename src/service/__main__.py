@@ -0,0 +1,64 @@
+"""
+Sobe o serviço HTTP e os workers de jornada
+
+Uso (a partir de src/):
+    python -m service --port 8080 --workers 2
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from bootstrap import load_env
+from observability import configure_logging
+from service.http_server import JourneyHTTPService
+from service.job_queue import JobQueue
+from service.worker import start_workers
+
+
+def main():
+    load_env()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("SERVICE_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("SERVICE_PORT", "8080")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVICE_WORKERS", "2")),
+                        help="Processos worker (0 = apenas o serviço HTTP)")
+    parser.add_argument("--db", default=os.getenv("JOB_QUEUE_DB", "data/jobs.db"))
+    args = parser.parse_args()
+
+    # Serviço: perfil server por padrão (sem saída por etapa no console)
+    configure_logging(os.getenv("LOG_PROFILE", "server"))
+
+    fila = JobQueue(args.db)
+    parar = multiprocessing.Event()
+    workers = start_workers(
+        args.db,
+        args.workers,
+        poll_interval=float(os.getenv("WORKER_POLL_SECONDS", "0.5")),
+        lease_seconds=float(os.getenv("WORKER_LEASE_SECONDS", "300")),
+        stop_event=parar
+    )
+
+    servico = JourneyHTTPService(fila, args.host, args.port)
+    print(f"🚀 Serviço de jornadas em http://{args.host}:{args.port} ({args.workers} workers, fila: {args.db})")
+
+    try:
+        asyncio.run(servico.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        parar.set()
+        for worker in workers:
+            worker.join(timeout=30)
+        fila.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Serviço HTTP assíncrono de submissão de jornadas
+
+CONCEITO - Asynchronous Submission:
+Executar a jornada dentro da requisição HTTP prende o cliente por 15-25s.
+Aqui a requisição só valida o protocolo, grava na fila durável e devolve
+um job id (HTTP 202) em milissegundos. O resultado é consultado depois:
+
+    POST /jornadas                    -> 202 {"job_id": ...}
+    GET  /jornadas/<job_id>           -> estado do job
+    GET  /jornadas/<job_id>/resultado -> resultado da jornada (202 enquanto executa)
+    GET  /health                      -> contagem da fila e espera p50/p95 por prioridade
+
+CONCEITO - Event Loop:
+O servidor usa apenas asyncio da biblioteca padrão. As operações na fila
+SQLite são bloqueantes, então rodam no executor padrão para não travar o
+loop que atende as demais conexões.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from functools import partial
+from typing import Any, Optional, Tuple
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from journey.admission import validar_protocolo
+from journey.scheduler import normalizar_prioridade
+from service.job_queue import DONE, FAILED, JobQueue
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class JourneyHTTPService:
+    """
+    Servidor HTTP/1.1 mínimo sobre asyncio para a fila de jornadas
+    """
+
+    def __init__(self, queue: JobQueue, host: str = "127.0.0.1", port: int = 8080,
+                 request_timeout: float = 10.0):
+        """
+        Args:
+            queue: Fila durável de jobs
+            host / port: Endereço de escuta
+            request_timeout: Tempo máximo para receber uma requisição completa
+        """
+        self.queue = queue
+        self.host = host
+        self.port = port
+        self.request_timeout = request_timeout
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _run_blocking(self, fn, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(fn, *args, **kwargs))
+
+    # ------------------------------------------------------------------
+    # Protocolo HTTP
+    # ------------------------------------------------------------------
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, bytes]:
+        linha = await reader.readline()
+        if not linha:
+            raise ConnectionResetError
+        try:
+            metodo, caminho, _ = linha.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Linha de requisição inválida")
+
+        tamanho = 0
+        while True:
+            cabecalho = await reader.readline()
+            if cabecalho in (b"\r\n", b"\n", b""):
+                break
+            nome, _, valor = cabecalho.decode("latin-1").partition(":")
+            if nome.strip().lower() == "content-length":
+                try:
+                    tamanho = int(valor.strip() or 0)
+                except ValueError:
+                    raise HTTPError(400, "Content-Length inválido")
+
+        if tamanho > MAX_BODY_BYTES:
+            raise HTTPError(413, "Corpo da requisição muito grande")
+
+        corpo = await reader.readexactly(tamanho) if tamanho else b""
+        return metodo.upper(), caminho.split("?", 1)[0], corpo
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: Any):
+        corpo = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        cabecalhos = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        writer.write(cabecalhos.encode("latin-1") + corpo)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            metodo, caminho, corpo = await asyncio.wait_for(self._read_request(reader), self.request_timeout)
+            status, payload = await self._route(metodo, caminho, corpo)
+        except (ConnectionResetError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            writer.close()
+            return
+        except HTTPError as e:
+            status, payload = e.status, {"erro": str(e)}
+        except Exception as e:
+            logger.exception("Erro ao atender requisição")
+            status, payload = 500, {"erro": str(e)}
+
+        self._write_response(writer, status, payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    # ------------------------------------------------------------------
+    # Rotas
+    # ------------------------------------------------------------------
+
+    async def _route(self, metodo: str, caminho: str, corpo: bytes) -> Tuple[int, Any]:
+        partes = [p for p in caminho.split("/") if p]
+
+        if partes == ["health"]:
+            self._require(metodo, "GET")
+            return 200, {
+                "status": "ok",
+                "fila": await self._run_blocking(self.queue.stats),
+                "espera_fila_ms": await self._run_blocking(self.queue.queue_wait)
+            }
+
+        if partes == ["jornadas"]:
+            self._require(metodo, "POST")
+            return await self._submit(corpo)
+
+        if len(partes) == 2 and partes[0] == "jornadas":
+            self._require(metodo, "GET")
+            job = await self._run_blocking(self.queue.get, partes[1])
+            if job is None:
+                raise HTTPError(404, "Job não encontrado")
+            return 200, job
+
+        if len(partes) == 3 and partes[0] == "jornadas" and partes[2] == "resultado":
+            self._require(metodo, "GET")
+            job = await self._run_blocking(self.queue.get, partes[1], include_result=True)
+            if job is None:
+                raise HTTPError(404, "Job não encontrado")
+            if job["status"] == DONE:
+                return 200, job["resultado"]
+            if job["status"] == FAILED:
+                return 200, {"job_id": job["id"], "status": FAILED, "erro": job["erro"]}
+            return 202, {"job_id": job["id"], "status": job["status"]}
+
+        raise HTTPError(404, "Rota não encontrada")
+
+    @staticmethod
+    def _require(metodo: str, esperado: str):
+        if metodo != esperado:
+            raise HTTPError(405, f"Método {metodo} não permitido (use {esperado})")
+
+    async def _submit(self, corpo: bytes) -> Tuple[int, Any]:
+        try:
+            protocolo_data = json.loads(corpo or b"null")
+        except json.JSONDecodeError as e:
+            raise HTTPError(400, f"JSON inválido: {e}")
+
+        if not isinstance(protocolo_data, dict) or not protocolo_data.get("protocolo"):
+            raise HTTPError(400, "Envie um objeto JSON de protocolo com o campo 'protocolo'")
+
+        # Protocolo inválido nem entra na fila (ver journey/admission.py)
+        invalido = validar_protocolo(protocolo_data)
+        if invalido is not None:
+            return 400, {"erro": invalido["motivo"], "erros": invalido["erros"]}
+
+        job_id, novo = await self._run_blocking(self.queue.enqueue_unique, protocolo_data)
+        if novo:
+            logger.info(f"Job {job_id} enfileirado", extra={"protocolo": protocolo_data["protocolo"]})
+        else:
+            logger.info(f"Reenvio idêntico: job {job_id} reaproveitado", extra={"protocolo": protocolo_data["protocolo"]})
+
+        return 202, {
+            "job_id": job_id,
+            "protocolo": protocolo_data["protocolo"],
+            "prioridade": normalizar_prioridade(protocolo_data.get("prioridade")),
+            "status": "queued" if novo else "duplicado",
+            "status_url": f"/jornadas/{job_id}",
+            "resultado_url": f"/jornadas/{job_id}/resultado"
+        }
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------------------------------
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serviço de jornadas ouvindo em http://{self.host}:{self.port}")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
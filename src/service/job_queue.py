@@ -0,0 +1,380 @@
+"""
+Fila durável de jornadas em SQLite
+
+CONCEITO - Durable Work Queue:
+O serviço HTTP só grava o protocolo na fila e responde com um job id; os
+workers retiram jobs da fila e executam a jornada. Como a fila é um arquivo
+SQLite em modo WAL:
+- jobs sobrevivem a reinícios do serviço e dos workers
+- vários processos (serviço + N workers) compartilham a fila na mesma máquina
+- leitores (consulta de status) não bloqueiam quem está gravando
+
+CONCEITO - Atomic Claim:
+Um worker "reivindica" um job com uma transação IMMEDIATE (lock de escrita):
+seleciona o job mais antigo na fila e o marca como em execução na mesma
+transação, então dois workers nunca pegam o mesmo job.
+
+CONCEITO - Priority Claim:
+A escolha do job segue a mesma SchedulingPolicy do escalonador em memória
+(journey/scheduler.py): filas por prioridade com round robin ponderado,
+aging e quota de jobs em execução por prioridade, contada entre todos os
+workers.
+
+CONCEITO - Deduplication:
+Cada job guarda a chave da jornada (protocolo + hash do conteúdo, ver
+journey/single_flight.py). Um reenvio idêntico enquanto o job está na fila
+ou em execução, ou concluído há menos de JOURNEY_DEDUP_TTL_SECONDS, recebe
+o job existente em vez de gerar uma segunda jornada.
+
+CONCEITO - Lease:
+Um job em execução guarda o horário em que foi reivindicado. Se o worker
+morrer, `requeue_stale` devolve à fila os jobs parados há mais que o prazo.
+A tentativa interrompida pode ter deixado reservas de estoque: cada uma
+guarda a sua origem ("<job>:<tentativa>"), e `reserva_orfa` diz se aquela
+tentativa terminou sem mantê-la.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from journey.compensation import DECISOES_COMPENSADAS
+from journey.scheduler import PRIORIDADES, SchedulingPolicy, normalizar_prioridade
+from journey.single_flight import chave_jornada
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    protocolo TEXT,
+    chave TEXT,
+    prioridade TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    criado_em REAL NOT NULL,
+    disponivel_em REAL NOT NULL DEFAULT 0,
+    iniciado_em REAL,
+    concluido_em REAL,
+    decisao TEXT,
+    resultado TEXT,
+    erro TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs(status, criado_em);
+CREATE INDEX IF NOT EXISTS idx_jobs_protocolo ON jobs(protocolo);
+CREATE INDEX IF NOT EXISTS idx_jobs_prioridade ON jobs(status, prioridade, criado_em);
+"""
+
+
+class JobQueue:
+    """
+    Fila de jobs de jornada compartilhada entre processos
+
+    Cada processo deve criar a sua instância (a conexão SQLite não é
+    compartilhada entre processos); dentro do processo ela é thread-safe.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 5.0, max_attempts: int = 3,
+                 policy: Optional[SchedulingPolicy] = None, dedup_ttl: Optional[float] = None):
+        """
+        Args:
+            path: Arquivo do banco SQLite da fila
+            busy_timeout: Espera máxima por um lock de outro processo, em segundos
+            max_attempts: Tentativas de um job antes de marcá-lo como falho
+            policy: Política de escolha por prioridade (padrão: variáveis SCHEDULER_*)
+            dedup_ttl: Segundos em que um job concluído atende reenvios (padrão: JOURNEY_DEDUP_TTL_SECONDS)
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.policy = policy if policy is not None else SchedulingPolicy.from_env()
+        self.dedup_ttl = dedup_ttl if dedup_ttl is not None else float(os.getenv("JOURNEY_DEDUP_TTL_SECONDS", "60"))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        # isolation_level=None: transações controladas explicitamente (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            # Filas criadas antes da deduplicação não têm a coluna da chave
+            colunas = {linha["name"] for linha in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "chave" not in colunas:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN chave TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_chave ON jobs(chave)")
+
+    # ------------------------------------------------------------------
+    # Produtor (serviço HTTP)
+    # ------------------------------------------------------------------
+
+    def enqueue(self, protocolo_data: dict) -> str:
+        """
+        Enfileira um protocolo para execução
+
+        Returns:
+            Id do job (o existente, se for um reenvio idêntico)
+        """
+        return self.enqueue_unique(protocolo_data)[0]
+
+    def enqueue_unique(self, protocolo_data: dict) -> Tuple[str, bool]:
+        """
+        Enfileira um protocolo, a menos que um job idêntico esteja ativo ou seja recente
+
+        Returns:
+            (id do job, True se um novo job foi criado)
+        """
+        chave = chave_jornada(protocolo_data)
+        agora = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                existente = self._conn.execute(
+                    "SELECT id FROM jobs WHERE chave = ? AND (status IN (?, ?) OR "
+                    "(status = ? AND concluido_em >= ? AND decisao NOT IN ('adiado', 'erro'))) "
+                    "ORDER BY criado_em DESC LIMIT 1",
+                    (chave, QUEUED, RUNNING, DONE, agora - self.dedup_ttl)
+                ).fetchone()
+                if existente is not None:
+                    self._conn.execute("COMMIT")
+                    return existente["id"], False
+
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO jobs (id, protocolo, chave, prioridade, payload, status, criado_em) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        protocolo_data.get("protocolo"),
+                        chave,
+                        normalizar_prioridade(protocolo_data.get("prioridade")),
+                        json.dumps(protocolo_data, ensure_ascii=False),
+                        QUEUED,
+                        agora
+                    )
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id, True
+
+    def get(self, job_id: str, include_result: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Estado de um job
+
+        Args:
+            job_id: Id retornado por `enqueue`
+            include_result: Inclui o resultado completo da jornada
+        """
+        colunas = ("id, protocolo, prioridade, status, tentativas, worker, "
+                   "criado_em, iniciado_em, concluido_em, decisao, erro")
+        if include_result:
+            colunas += ", resultado"
+
+        with self._lock:
+            linha = self._conn.execute(f"SELECT {colunas} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        if linha is None:
+            return None
+
+        job = dict(linha)
+        if include_result:
+            job["resultado"] = json.loads(job["resultado"]) if job["resultado"] else None
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Quantidade de jobs por status"""
+        with self._lock:
+            linhas = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        contagem = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        contagem.update({status: total for status, total in linhas})
+        return contagem
+
+    def queue_wait(self, janela_segundos: float = 900.0) -> Dict[str, Dict[str, Optional[float]]]:
+        """
+        Espera na fila (ms) por prioridade dos jobs iniciados na janela
+
+        Returns:
+            {prioridade: {"count", "p50", "p95", "p99"}}
+        """
+        with self._lock:
+            linhas = self._conn.execute(
+                "SELECT prioridade, (iniciado_em - criado_em) * 1000 FROM jobs "
+                "WHERE iniciado_em >= ? ORDER BY 2",
+                (time.time() - janela_segundos,)
+            ).fetchall()
+
+        esperas: Dict[str, list] = {p: [] for p in PRIORIDADES}
+        for prioridade, espera in linhas:
+            esperas[normalizar_prioridade(prioridade)].append(espera)
+
+        resumo = {}
+        for prioridade, valores in esperas.items():
+            resumo[prioridade] = {"count": len(valores)}
+            for p in (50, 95, 99):
+                indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+                resumo[prioridade][f"p{p}"] = round(valores[indice], 1) if valores else None
+        return resumo
+
+    # ------------------------------------------------------------------
+    # Consumidor (workers)
+    # ------------------------------------------------------------------
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Reivindica o próximo job: a prioridade vem da SchedulingPolicy e,
+        dentro dela, o job mais antigo
+
+        Returns:
+            {"id", "protocolo_data", "tentativas"} ou None se a fila estiver vazia
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                agora = time.time()
+                esperas = {
+                    normalizar_prioridade(prioridade): agora - criado_em
+                    for prioridade, criado_em in self._conn.execute(
+                        "SELECT prioridade, MIN(criado_em) FROM jobs "
+                        "WHERE status = ? AND disponivel_em <= ? GROUP BY prioridade",
+                        (QUEUED, agora)
+                    )
+                }
+                em_execucao = dict(self._conn.execute(
+                    "SELECT prioridade, COUNT(*) FROM jobs WHERE status = ? GROUP BY prioridade",
+                    (RUNNING,)
+                ).fetchall())
+
+                prioridade = self.policy.choose(esperas, em_execucao)
+                if prioridade is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                linha = self._conn.execute(
+                    "SELECT id, payload, tentativas FROM jobs "
+                    "WHERE status = ? AND prioridade = ? AND disponivel_em <= ? ORDER BY criado_em LIMIT 1",
+                    (QUEUED, prioridade, agora)
+                ).fetchone()
+
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, iniciado_em = ?, tentativas = tentativas + 1 "
+                    "WHERE id = ?",
+                    (RUNNING, worker_id, time.time(), linha["id"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        return {
+            "id": linha["id"],
+            "protocolo_data": json.loads(linha["payload"]),
+            "tentativas": linha["tentativas"] + 1
+        }
+
+    def complete(self, job_id: str, resultado: dict):
+        """Marca o job como concluído e guarda o resultado da jornada"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, concluido_em = ?, decisao = ?, resultado = ? WHERE id = ?",
+                (
+                    DONE,
+                    time.time(),
+                    resultado.get("decisao_final"),
+                    json.dumps(resultado, ensure_ascii=False, default=str),
+                    job_id
+                )
+            )
+
+    def fail(self, job_id: str, erro: str, retry: bool = True):
+        """
+        Registra a falha de um job
+
+        Com `retry`, o job volta para a fila até esgotar `max_attempts`.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN ? AND tentativas < ? THEN ? ELSE ? END, "
+                "erro = ?, concluido_em = ? WHERE id = ?",
+                (retry, self.max_attempts, QUEUED, FAILED, erro, time.time(), job_id)
+            )
+
+    def defer(self, job_id: str, delay: float, motivo: str):
+        """
+        Devolve o job à fila para nova execução após `delay` segundos
+
+        Usado quando a jornada foi adiada (provedor de LLM indisponível):
+        não conta como falha, então a tentativa é devolvida.
+        """
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, disponivel_em = ?, tentativas = tentativas - 1, erro = ? "
+                "WHERE id = ?",
+                (QUEUED, time.time() + delay, motivo, job_id)
+            )
+
+    def requeue_stale(self, lease_seconds: float) -> int:
+        """
+        Devolve à fila jobs em execução há mais de `lease_seconds` (worker morto)
+
+        Returns:
+            Quantidade de jobs devolvidos
+        """
+        limite = time.time() - lease_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN tentativas < ? THEN ? ELSE ? END, "
+                "erro = 'lease expirado' WHERE status = ? AND iniciado_em < ?",
+                (self.max_attempts, QUEUED, FAILED, RUNNING, limite)
+            )
+            return cursor.rowcount
+
+    def reserva_orfa(self, origem: str) -> bool:
+        """
+        A reserva feita pela tentativa `origem` ficou sem dono?
+
+        Não é órfã enquanto aquela tentativa é a execução ativa do job, nem
+        se ela concluiu o job com uma decisão que mantém as reservas. Uma
+        origem de outra fila (job desconhecido) nunca é órfã.
+
+        Args:
+            origem: "<id do job>:<tentativa>"
+        """
+        job_id, _, tentativa = origem.rpartition(":")
+        if not job_id or not tentativa.isdigit():
+            return False
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT status, tentativas, decisao FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if linha is None:
+            return False
+        if linha["tentativas"] == int(tentativa):
+            if linha["status"] == RUNNING:
+                return False
+            if linha["status"] == DONE and linha["decisao"] not in DECISOES_COMPENSADAS:
+                return False
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,135 @@
+"""
+Workers que executam as jornadas da fila
+
+CONCEITO - Worker Processes:
+Cada worker é um processo independente com o seu próprio orquestrador:
+reivindica um job, executa a jornada e grava o resultado. Para processar
+mais jornadas em paralelo na mesma máquina basta subir mais workers, pois
+a fila SQLite garante que cada job é executado por um único worker.
+
+Reservas de estoque feitas durante um job levam a origem "<job>:<tentativa>".
+Ao iniciar, antes de reexecutar um job e junto com a verificação de leases,
+o worker libera as reservas de tentativas que terminaram sem mantê-las
+(worker morto, lease expirado), no próprio livro e nos livros de workers
+encerrados. Uma tentativa ainda em execução em outro worker (lease expirado,
+mas o processo vivo) continua com o livro travado e não é tocada.
+"""
+
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import time
+from typing import List, Optional
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from observability import configure_logging
+from service.job_queue import JobQueue
+
+logger = logging.getLogger(__name__)
+
+# Intervalo (segundos) da verificação de jobs de workers mortos; medido no
+# relógio, não em ciclos ociosos: sob carga constante o worker nunca fica ocioso
+STALE_CHECK_SECONDS = 10.0
+
+
+def run_worker(db_path: str, worker_id: Optional[str] = None, poll_interval: float = 0.5,
+               lease_seconds: float = 300.0, max_jobs: Optional[int] = None, stop_event=None) -> int:
+    """
+    Loop de um worker: reivindica jobs e executa as jornadas
+
+    Args:
+        db_path: Banco SQLite da fila
+        worker_id: Identificação do worker (padrão: host:pid)
+        poll_interval: Espera entre consultas quando a fila está vazia
+        lease_seconds: Tempo após o qual um job em execução é considerado abandonado
+        max_jobs: Encerra após N jobs (None = até `stop_event`)
+        stop_event: Evento (multiprocessing) que encerra o loop
+
+    Returns:
+        Quantidade de jobs processados
+    """
+    # Importado aqui: cada processo worker carrega agents e LLM, o serviço HTTP não
+    from journey.compensation import liberar_reservas_orfas
+    from journey.deferred_queue import DeferredJourneyQueue
+    from mocks.api_estoque import origem_das_reservas
+    from orchestrator import ExchangeJourneyOrchestrator
+
+    configure_logging(os.getenv("LOG_PROFILE", "server"))
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    fila = JobQueue(db_path)
+    # Adiamentos voltam para a fila durável; a fila em memória do worker é só de passagem
+    orchestrator = ExchangeJourneyOrchestrator(deferred_queue=DeferredJourneyQueue())
+
+    processados = 0
+    # A verificação acontece pelo menos duas vezes por lease
+    intervalo_verificacao = min(STALE_CHECK_SECONDS, lease_seconds / 2)
+    proxima_verificacao = time.monotonic() + intervalo_verificacao
+    logger.info(f"Worker {worker_id} iniciado (fila: {db_path})")
+    # Recupera o livro de reservas (talvez o de um worker morto) e libera o que ficou sem dono
+    liberar_reservas_orfas(fila.reserva_orfa)
+
+    while not (stop_event is not None and stop_event.is_set()):
+        if max_jobs is not None and processados >= max_jobs:
+            break
+
+        if time.monotonic() >= proxima_verificacao:
+            proxima_verificacao = time.monotonic() + intervalo_verificacao
+            devolvidos = fila.requeue_stale(lease_seconds)
+            if devolvidos:
+                logger.warning(f"{devolvidos} job(s) com lease expirado devolvidos à fila")
+            liberar_reservas_orfas(fila.reserva_orfa)
+
+        job = fila.claim(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        try:
+            # Tentativa anterior interrompida (worker morto, lease expirado) pode ter deixado reservas
+            if job["tentativas"] > 1:
+                liberar_reservas_orfas(fila.reserva_orfa)
+            with origem_das_reservas(f"{job['id']}:{job['tentativas']}"):
+                resultado = orchestrator.execute_journey(job["protocolo_data"])
+        except Exception as e:
+            logger.exception(f"Falha no job {job['id']}", extra={"job_id": job["id"]})
+            fila.fail(job["id"], str(e))
+        else:
+            if resultado.get("decisao_final") == "adiado":
+                while orchestrator.deferred_queue.pop() is not None:
+                    pass
+                fila.defer(job["id"], resultado.get("reprocessar_apos_segundos", 30.0),
+                           resultado.get("motivo_interrupcao", "adiado"))
+            else:
+                fila.complete(job["id"], resultado)
+        processados += 1
+
+    fila.close()
+    logger.info(f"Worker {worker_id} encerrado ({processados} jobs)")
+    return processados
+
+
+def start_workers(db_path: str, quantidade: int, **kwargs) -> List[multiprocessing.Process]:
+    """
+    Sobe `quantidade` processos worker
+
+    Returns:
+        Processos iniciados (encerre com terminate() ou pelo stop_event em kwargs)
+    """
+    processos = []
+    for i in range(quantidade):
+        processo = multiprocessing.Process(
+            target=run_worker,
+            args=(db_path,),
+            kwargs=kwargs,
+            name=f"journey-worker-{i + 1}",
+            daemon=True
+        )
+        processo.start()
+        processos.append(processo)
+    return processos
@@ -4,11 +4,21 @@ Módulo de Tools do LangChain
 CONCEITO - Tool Organization:
 Organizamos as tools em módulos temáticos (customer, inventory, document)
 para facilitar manutenção e reutilização em diferentes agents.
+
+CONCEITO - Lazy Loading (PEP 562):
+Os módulos de tools (e os mocks de API que eles instanciam) só são
+carregados no primeiro acesso a uma das funções exportadas.
 """
 
-from .customer_tools import get_customer_tools
-from .inventory_tools import get_inventory_tools
-from .document_tools import get_document_tools
+import importlib
+
+# Nome exportado -> módulo que o define
+_EXPORTS = {
+    'get_customer_tools': 'customer_tools',
+    'get_inventory_tools': 'inventory_tools',
+    'get_document_tools': 'document_tools',
+}
+
 
 def get_all_tools():
     """
@@ -17,6 +27,10 @@ def get_all_tools():
     CONCEITO: Função helper que agrega todas as tools.
     Útil para agents que precisam de acesso completo ao sistema.
     """
+    from .customer_tools import get_customer_tools
+    from .inventory_tools import get_inventory_tools
+    from .document_tools import get_document_tools
+
     return (
         get_customer_tools() +
         get_inventory_tools() +
@@ -29,3 +43,15 @@ __all__ = [
     'get_document_tools',
     'get_all_tools'
 ]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    valor = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = valor  # próximos acessos não passam por aqui
+    return valor
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
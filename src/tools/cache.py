@@ -0,0 +1,125 @@
+"""
+Cache read-through das consultas das tools
+
+CONCEITO - Read-Through Cache:
+Os mesmos CPFs e os SKUs mais procurados são consultados em quase toda
+jornada. Com as APIs reais atrás das tools, cada consulta é uma chamada de
+rede. O cache fica entre a tool e a API: na falta, consulta a API e guarda
+o resultado; no acerto, responde da memória até o TTL da entidade vencer.
+
+CONCEITO - Negative Caching:
+"CPF não encontrado" também é uma resposta cara de obter e muito repetida
+(protocolos com dados inválidos são reenviados). Ela fica em cache por um
+TTL próprio, mais curto, para que um cliente recém-cadastrado apareça logo.
+
+CONCEITO - Explicit Invalidation:
+Entradas cujo dado foi alterado (ex: estoque após uma reserva) são removidas
+na hora pela função `invalidate`, sem esperar o TTL. Uma consulta que estava
+em andamento durante a invalidação não é guardada, pois pode ter lido o
+valor anterior à alteração.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from metrics import get_metrics_registry
+
+
+class TTLCache:
+    """
+    Cache em memória com TTL, TTL negativo e limite de entradas (LRU)
+
+    Thread-safe. Acertos e faltas vão para o registro de métricas com o
+    nome do cache.
+    """
+
+    def __init__(self, nome: str, ttl: float, negative_ttl: Optional[float] = None,
+                 max_entries: int = 4096):
+        """
+        Args:
+            nome: Nome do cache no registro de métricas (ex: tools.cliente)
+            ttl: Segundos de validade de um resultado encontrado (0 desliga o cache)
+            negative_ttl: Segundos de validade de um "não encontrado" (padrão: igual a ttl)
+            max_entries: Máximo de entradas (as menos usadas saem primeiro)
+        """
+        self.nome = nome
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl if negative_ttl is not None else ttl
+        self.max_entries = max_entries
+        self.stats = get_metrics_registry().cache(nome)
+        self._entradas: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._invalidacoes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, nome: str, prefixo: str, ttl: float, negative_ttl: Optional[float] = None) -> "TTLCache":
+        """
+        Lê <prefixo>_TTL_SECONDS, <prefixo>_NEGATIVE_TTL_SECONDS e TOOLS_CACHE_MAX_ENTRIES
+
+        Args:
+            prefixo: Prefixo das variáveis de ambiente (ex: TOOLS_CACHE_CLIENTE)
+            ttl / negative_ttl: Valores padrão
+        """
+        negativo = os.getenv(f"{prefixo}_NEGATIVE_TTL_SECONDS")
+        return cls(
+            nome,
+            ttl=float(os.getenv(f"{prefixo}_TTL_SECONDS", str(ttl))),
+            negative_ttl=float(negativo) if negativo is not None else negative_ttl,
+            max_entries=int(os.getenv("TOOLS_CACHE_MAX_ENTRIES", "4096"))
+        )
+
+    def get_or_load(self, chave: Hashable, carregar: Callable[[], Any],
+                    encontrado: Callable[[Any], bool] = lambda _: True) -> Any:
+        """
+        Retorna o valor em cache ou carrega da origem e guarda
+
+        Args:
+            chave: Chave normalizada da entidade (ex: CPF só com dígitos)
+            carregar: Consulta à origem, chamada na falta
+            encontrado: Diz se o valor é um resultado positivo (False usa o TTL negativo)
+        """
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] > agora:
+                self._entradas.move_to_end(chave)
+                self.stats.hit()
+                return entrada[1]
+            invalidacoes = self._invalidacoes
+
+        self.stats.miss()
+        valor = carregar()
+
+        validade = self.ttl if encontrado(valor) else self.negative_ttl
+        if validade > 0:
+            with self._lock:
+                if self._invalidacoes != invalidacoes:
+                    return valor
+                self._entradas[chave] = (time.monotonic() + validade, valor)
+                self._entradas.move_to_end(chave)
+                while len(self._entradas) > self.max_entries:
+                    self._entradas.popitem(last=False)
+        return valor
+
+    def invalidate(self, chave: Hashable):
+        """Remove a entrada da chave (se existir)"""
+        with self._lock:
+            self._invalidacoes += 1
+            self._entradas.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidacoes += 1
+            self._entradas.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
@@ -18,9 +18,34 @@ import sys
 import os
 
 # Adiciona o diretório raiz ao path para imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
 from mocks.api_cliente import APICliente
+from tools.cache import TTLCache
+
+# CONCEITO - Read-Through Cache:
+# Cadastro de cliente muda pouco: TTL longo. "Não encontrado" fica em cache
+# por menos tempo, para que um cadastro novo apareça logo (ver tools/cache.py)
+_clientes_cache = TTLCache.from_env("tools.cliente", "TOOLS_CACHE_CLIENTE", ttl=300.0, negative_ttl=60.0)
+
+
+def _consultar_cliente_cache(cpf: str) -> dict:
+    """Consulta o cliente passando pelo cache (chave: CPF só com dígitos)"""
+    return _clientes_cache.get_or_load(
+        ''.join(filter(str.isdigit, cpf)),
+        lambda: APICliente.consultar_cliente(cpf),
+        encontrado=lambda resposta: resposta["status"] == "success"
+    )
+
+
+def invalidar_cliente(cpf: str):
+    """Remove o cliente do cache (ex: após atualização cadastral)"""
+    _clientes_cache.invalidate(''.join(filter(str.isdigit, cpf)))
+
+
+APICliente.registrar_listener(invalidar_cliente)
 
 
 # Schemas
@@ -37,7 +62,7 @@ class ValidarDadosClienteInput(BaseModel):
 # Funções das tools
 def _consultar_cliente(cpf: str) -> str:
     """Consulta dados do cliente no sistema"""
-    resultado = APICliente.consultar_cliente(cpf)
+    resultado = _consultar_cliente_cache(cpf)
 
     if resultado["status"] == "success":
         cliente = resultado["data"]
@@ -57,7 +82,7 @@ Cliente encontrado:
 
 def _validar_dados_cliente(cpf: str, nome: str, email: str) -> str:
     """Valida se os dados fornecidos conferem com o cadastro"""
-    resultado = APICliente.validar_dados(cpf, nome, email)
+    resultado = APICliente.comparar_dados(_consultar_cliente_cache(cpf), nome, email)
 
     if resultado["valido"]:
         return f"""
@@ -4,14 +4,22 @@ Tools do LangChain para análise de documentos
 
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
-import json
 import os
-from datetime import datetime
+import sys
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from tools.nota_fiscal import carregar_nota_fiscal, descrever_nota_procurada
+from tools.prazos import verificar_prazo
 
 
 # Schemas
 class AnalisarNotaFiscalInput(BaseModel):
-    arquivo_nota: str = Field(description="Nome/caminho do arquivo da nota fiscal")
+    arquivo_nota: str = Field(description="Nome/caminho do arquivo da nota fiscal (JSON ou NF-e em XML)")
+    numero_nota: str = Field(default="", description="Número da nota fiscal informado no protocolo")
+    cpf: str = Field(default="", description="CPF do cliente do protocolo (a nota precisa ser dele)")
 
 
 class ConsultarRegrasInput(BaseModel):
@@ -26,18 +34,18 @@ class ValidarPrazoInput(BaseModel):
 
 
 # Funções
-def _analisar_nota_fiscal(arquivo_nota: str) -> str:
+def _analisar_nota_fiscal(arquivo_nota: str, numero_nota: str = "", cpf: str = "") -> str:
     """Extrai informações de nota fiscal"""
     try:
-        if "exemplo" in arquivo_nota.lower() or not os.path.exists(arquivo_nota):
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            arquivo_nota = os.path.join(base_path, "data", "synthetic_docs", "nota_fiscal_exemplo.json")
-
-        with open(arquivo_nota, 'r', encoding='utf-8') as f:
-            nota = json.load(f)
+        # Com o número, a nota vem do índice de notas ingeridas (tools/nota_fiscal.py),
+        # e só uma nota emitida para o CPF do protocolo é aceita
+        nota = carregar_nota_fiscal(arquivo_nota, numero_nota or None, cpf or None)
+        if nota is None:
+            return f"NOTA FISCAL NÃO ENCONTRADA: {descrever_nota_procurada(numero_nota, cpf)} não consta em {arquivo_nota}"
 
         produtos_str = "\n".join([
             f"  - {p['descricao']} (Cód: {p['codigo']}) - Qtd: {p['quantidade']} - R$ {p['valor_total']:.2f}"
+            + (f" - Categoria: {p['categoria']}" if p.get("categoria") else "")
             for p in nota['produtos']
         ])
 
@@ -77,18 +85,8 @@ Tipo: {tipo_troca}
 def _validar_prazo_troca(data_compra: str, categoria: str, tipo_troca: str) -> str:
     """Valida prazo de troca"""
     try:
-        data_compra_dt = datetime.strptime(data_compra, "%Y-%m-%d")
-        hoje = datetime.now()
-        dias_passados = (hoje - data_compra_dt).days
-
-        prazos = {
-            "eletrônicos": {"produto_defeituoso": 90, "troca_outro_produto": 30, "vale_compra": 30},
-            "áudio": {"produto_defeituoso": 90, "troca_outro_produto": 15, "vale_compra": 15},
-            "informática": {"produto_defeituoso": 90, "troca_outro_produto": 30, "vale_compra": 30}
-        }
-
-        categoria_lower = categoria.lower().replace("ô", "o").replace("á", "a")
-        prazo_limite = prazos.get(categoria_lower, {}).get(tipo_troca, 30)
+        # Tabela de prazos e normalização da categoria em tools/prazos.py
+        dias_passados, prazo_limite = verificar_prazo(data_compra, categoria, tipo_troca)
         dentro_prazo = dias_passados <= prazo_limite
 
         if dentro_prazo:
@@ -116,7 +114,7 @@ ATENÇÃO: Troca não pode ser aprovada.
 analisar_nota_fiscal = StructuredTool.from_function(
     func=_analisar_nota_fiscal,
     name="analisar_nota_fiscal",
-    description="Útil para extrair informações de nota fiscal. Retorna número, data, cliente, produtos e valores.",
+    description="Útil para extrair informações de nota fiscal (JSON ou NF-e em XML). Retorna número, data, cliente, produtos e valores.",
     args_schema=AnalisarNotaFiscalInput,
     return_direct=False
 )
@@ -7,9 +7,37 @@ from pydantic import BaseModel, Field
 import sys
 import os
 
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
 
 from mocks.api_estoque import APIEstoque
+from tools.cache import TTLCache
+from journey.compensation import registrar_reserva
+from tools.customer_tools import _consultar_cliente_cache
+
+# CONCEITO - Read-Through Cache:
+# A consulta de produto traz quantidades, então o TTL é curto e toda reserva
+# ou cancelamento invalida o SKU na hora. Verificação de disponibilidade e
+# reserva nunca passam pelo cache: a decisão de reservar usa o estoque atual.
+_produtos_cache = TTLCache.from_env("tools.produto", "TOOLS_CACHE_PRODUTO", ttl=10.0, negative_ttl=60.0)
+APIEstoque.registrar_listener(_produtos_cache.invalidate)
+
+
+def uf_entrega(protocolo_data: dict) -> str:
+    """
+    UF de entrega do protocolo, que define o CD da reserva
+
+    Usa a UF informada no protocolo ou, na falta dela, a do endereço
+    cadastrado do cliente (consulta via cache). "" se desconhecida.
+    """
+    cliente = protocolo_data.get("cliente") or {}
+    uf = cliente.get("estado") or (cliente.get("endereco") or {}).get("estado")
+    if not uf and cliente.get("cpf"):
+        resposta = _consultar_cliente_cache(cliente["cpf"])
+        if resposta["status"] == "success":
+            uf = resposta["data"].get("endereco", {}).get("estado")
+    return (uf or "").strip().upper()
 
 
 # Schemas
@@ -20,18 +48,24 @@ class ConsultarProdutoInput(BaseModel):
 class VerificarDisponibilidadeInput(BaseModel):
     codigo_produto: str = Field(description="Código do produto")
     quantidade: int = Field(default=1, description="Quantidade desejada")
+    uf_entrega: str = Field(default="", description="UF de entrega do cliente (ex: SP)")
 
 
 class ReservarProdutoInput(BaseModel):
     codigo_produto: str = Field(description="Código do produto a reservar")
     quantidade: int = Field(description="Quantidade a reservar")
     protocolo: str = Field(description="Número do protocolo de troca")
+    uf_entrega: str = Field(default="", description="UF de entrega do cliente (ex: SP)")
 
 
 # Funções
 def _consultar_produto(codigo_produto: str) -> str:
     """Busca informações de um produto"""
-    resultado = APIEstoque.consultar_produto(codigo_produto)
+    resultado = _produtos_cache.get_or_load(
+        codigo_produto,
+        lambda: APIEstoque.consultar_produto(codigo_produto),
+        encontrado=lambda resposta: resposta["status"] == "success"
+    )
 
     if resultado["status"] == "success":
         produto = resultado["data"]
@@ -45,15 +79,16 @@ Produto encontrado:
 - Quantidade reservada: {produto['quantidade_reservada']} unidades
 - Quantidade livre: {produto['quantidade_livre']} unidades
 - Localização: {produto['localizacao']}
+- Livre por CD: {', '.join(f"{cd}: {q['livre']}" for cd, q in produto['estoque_por_cd'].items() if q['disponivel']) or 'nenhum'}
 - Status: {'Ativo' if produto['ativo'] else 'Inativo'}
 """
     else:
         return f"Produto não encontrado. {resultado.get('message', '')}"
 
 
-def _verificar_disponibilidade(codigo_produto: str, quantidade: int = 1) -> str:
+def _verificar_disponibilidade(codigo_produto: str, quantidade: int = 1, uf_entrega: str = "") -> str:
     """Verifica disponibilidade de estoque"""
-    resultado = APIEstoque.verificar_disponibilidade(codigo_produto, quantidade)
+    resultado = APIEstoque.verificar_disponibilidade(codigo_produto, quantidade, uf_entrega)
 
     if resultado["disponivel"]:
         return f"""
@@ -61,6 +96,7 @@ DISPONÍVEL ✓
 Produto: {resultado['produto']['nome']}
 Quantidade solicitada: {quantidade}
 Quantidade livre em estoque: {resultado['quantidade_livre']}
+CD mais próximo com estoque: {resultado['centro_distribuicao']}
 Preço unitário: R$ {resultado['produto']['preco']:.2f}
 """
     else:
@@ -71,16 +107,19 @@ Quantidade livre: {resultado.get('quantidade_livre', 0)}
 """
 
 
-def _reservar_produto(codigo_produto: str, quantidade: int, protocolo: str) -> str:
-    """Reserva um produto no estoque"""
-    resultado = APIEstoque.reservar_produto(codigo_produto, quantidade, protocolo)
+def _reservar_produto(codigo_produto: str, quantidade: int, protocolo: str, uf_entrega: str = "") -> str:
+    """Reserva um produto no estoque do CD mais próximo"""
+    resultado = APIEstoque.reservar_produto(codigo_produto, quantidade, protocolo, uf_entrega)
 
     if resultado["status"] == "success":
+        # A jornada cancela a reserva se não terminar aprovada (ver journey/compensation.py)
+        registrar_reserva(resultado["reserva_id"], codigo_produto)
         return f"""
 RESERVA CRIADA COM SUCESSO ✓
 - ID da Reserva: {resultado['reserva_id']}
 - Produto: {resultado['codigo_produto']}
 - Quantidade: {resultado['quantidade']}
+- Centro de distribuição: {resultado['centro_distribuicao']}
 - Protocolo: {protocolo}
 - Validade: {resultado['validade']}
 - Data: {resultado['timestamp']}
@@ -112,7 +151,7 @@ verificar_disponibilidade = StructuredTool.from_function(
 reservar_produto = StructuredTool.from_function(
     func=_reservar_produto,
     name="reservar_produto",
-    description="Útil para reservar um produto no estoque. ATENÇÃO: Esta ação modifica o estoque. Use apenas após validar elegibilidade e disponibilidade.",
+    description="Útil para reservar um produto no estoque do CD mais próximo da UF de entrega. ATENÇÃO: Esta ação modifica o estoque. Use apenas após validar elegibilidade e disponibilidade.",
     args_schema=ReservarProdutoInput,
     return_direct=False
 )
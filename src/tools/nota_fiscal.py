@@ -0,0 +1,435 @@
+"""
+Leitura da nota fiscal e conferência dos itens do protocolo
+
+CONCEITO - Streaming NF-e Parser:
+Notas fiscais reais são NF-e em XML (nfeProc/NFe/infNFe), e exportações
+em lote juntam milhares de notas num arquivo. `ler_nfe_xml` lê o arquivo
+com `iterparse`: cada `infNFe` vira um dict no formato da nota sintética
+(nota_fiscal_exemplo.json) assim que termina, e a árvore já lida é
+descartada. A memória fica limitada a uma nota, qualquer que seja o
+tamanho do arquivo.
+
+CONCEITO - Invoice Index:
+`IndiceNotasFiscais` guarda as notas ingeridas em lote (NOTAS_FISCAIS_DIR)
+por número, por chave de acesso e por CPF do destinatário. A análise de
+documentos consulta a nota num dict, em vez de abrir e interpretar um
+arquivo a cada jornada. Notas lidas de um arquivo fora do lote também
+entram no índice.
+
+CONCEITO - Invoice Line Match:
+Num protocolo com vários itens, cada item precisa constar na nota fiscal
+da compra. A conferência é feita aqui, sem LLM: os itens são comparados
+pelo código às linhas (`produtos`) da nota, cada linha atende no máximo a
+sua quantidade, e a linha encontrada informa a categoria que a validação
+de elegibilidade usa para o item.
+
+Sem LangChain nem pydantic: o orquestrador usa este módulo diretamente.
+"""
+
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import xml.etree.ElementTree as ET
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Union
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+from metrics import get_metrics_registry
+
+logger = logging.getLogger(__name__)
+
+DOCS_DIR = os.path.join(_SRC_DIR, "data", "synthetic_docs")
+NOTA_EXEMPLO = os.path.join(DOCS_DIR, "nota_fiscal_exemplo.json")
+
+# A NF-e não traz a categoria do produto: ela sai do capítulo/posição do NCM
+CATEGORIAS_NCM = {
+    "8517": "Eletrônicos",   # telefones e smartphones
+    "8528": "Eletrônicos",   # monitores e televisores
+    "8518": "Áudio",         # fones de ouvido e alto-falantes
+    "8519": "Áudio",         # aparelhos de som
+    "8471": "Informática",   # computadores e periféricos
+    "8473": "Informática",   # partes e acessórios de computadores
+}
+
+# Meio de pagamento (tPag) da NF-e
+FORMAS_PAGAMENTO = {
+    "01": "Dinheiro",
+    "03": "Cartão de Crédito",
+    "04": "Cartão de Débito",
+    "05": "Crédito Loja",
+    "15": "Boleto Bancário",
+    "17": "PIX",
+    "99": "Outros",
+}
+
+
+def _digitos(valor: Optional[str]) -> str:
+    return re.sub(r"\D", "", str(valor or ""))
+
+
+def chave_numero(numero: Optional[str]) -> str:
+    """
+    Número da nota normalizado para o índice
+
+    Usa o último grupo de dígitos, sem zeros à esquerda: "NF-2024-456789",
+    "456789" e "000456789" (nNF da NF-e) têm a mesma chave.
+    """
+    grupos = re.findall(r"\d+", str(numero or ""))
+    if not grupos:
+        return str(numero or "").strip()
+    return grupos[-1].lstrip("0") or "0"
+
+
+# ----------------------------------------------------------------------
+# NF-e (XML)
+# ----------------------------------------------------------------------
+
+def _local(tag: str) -> str:
+    """Nome da tag sem o namespace ({http://www.portalfiscal.inf.br/nfe}nNF -> nNF)"""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _filho(elem: Optional[ET.Element], *caminho: str) -> Optional[ET.Element]:
+    for nome in caminho:
+        if elem is None:
+            return None
+        elem = next((filho for filho in elem if _local(filho.tag) == nome), None)
+    return elem
+
+
+def _valor(elem: Optional[ET.Element], *caminho: str) -> Optional[str]:
+    filho = _filho(elem, *caminho)
+    if filho is None or filho.text is None:
+        return None
+    return filho.text.strip()
+
+
+def _numero(elem: Optional[ET.Element], *caminho: str) -> float:
+    valor = _valor(elem, *caminho)
+    return float(valor) if valor else 0.0
+
+
+def _endereco(elem: Optional[ET.Element]) -> str:
+    if elem is None:
+        return ""
+    rua = ", ".join(p for p in (_valor(elem, "xLgr"), _valor(elem, "nro")) if p)
+    cidade = "/".join(p for p in (_valor(elem, "xMun"), _valor(elem, "UF")) if p)
+    return " - ".join(p for p in (rua, _valor(elem, "xBairro"), cidade) if p)
+
+
+def _formatar_cpf(cpf: str) -> str:
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}" if len(cpf) == 11 else cpf
+
+
+def _nota_nfe(inf: ET.Element) -> Dict[str, Any]:
+    """Converte um infNFe no formato da nota sintética"""
+    ide = _filho(inf, "ide")
+    emit = _filho(inf, "emit")
+    dest = _filho(inf, "dest")
+    total = _filho(inf, "total", "ICMSTot")
+
+    produtos = []
+    for det in inf:
+        if _local(det.tag) != "det":
+            continue
+        prod = _filho(det, "prod")
+        quantidade = _numero(prod, "qCom")
+        ncm = _valor(prod, "NCM") or ""
+        produtos.append({
+            "codigo": _valor(prod, "cProd"),
+            "descricao": _valor(prod, "xProd"),
+            "ncm": ncm,
+            "quantidade": int(quantidade) if quantidade.is_integer() else quantidade,
+            "unidade": _valor(prod, "uCom"),
+            "valor_unitario": _numero(prod, "vUnCom"),
+            "valor_total": _numero(prod, "vProd"),
+            "categoria": CATEGORIAS_NCM.get(ncm[:4])
+        })
+
+    pagamento = _filho(inf, "pag", "detPag")
+    forma = _valor(pagamento, "tPag")
+
+    return {
+        "numero_nota": _valor(ide, "nNF"),
+        "serie": _valor(ide, "serie"),
+        # NF-e 4.0 usa dhEmi (data e hora); versões antigas, dEmi
+        "data_emissao": (_valor(ide, "dhEmi") or _valor(ide, "dEmi") or "")[:10],
+        "chave_acesso": _digitos(inf.get("Id")),
+        "emitente": {
+            "razao_social": _valor(emit, "xNome"),
+            "cnpj": _valor(emit, "CNPJ"),
+            "inscricao_estadual": _valor(emit, "IE"),
+            "endereco": _endereco(_filho(emit, "enderEmit"))
+        },
+        "destinatario": {
+            "nome": _valor(dest, "xNome"),
+            "cpf": _formatar_cpf(_valor(dest, "CPF") or ""),
+            "cnpj": _valor(dest, "CNPJ"),
+            "endereco": _endereco(_filho(dest, "enderDest")),
+            "cep": _valor(dest, "enderDest", "CEP")
+        },
+        "produtos": produtos,
+        "totais": {
+            "valor_produtos": _numero(total, "vProd"),
+            "valor_frete": _numero(total, "vFrete"),
+            "valor_desconto": _numero(total, "vDesc"),
+            "valor_total": _numero(total, "vNF")
+        },
+        "pagamento": {
+            "forma": FORMAS_PAGAMENTO.get(forma, forma),
+            "valor": _numero(pagamento, "vPag")
+        },
+        "informacoes_adicionais": _valor(inf, "infAdic", "infCpl") or ""
+    }
+
+
+def ler_nfe_xml(fonte: Union[str, IO[bytes]]) -> Iterator[Dict[str, Any]]:
+    """
+    Notas de um arquivo NF-e, uma de cada vez
+
+    Aceita uma nota (NFe ou nfeProc) ou um lote com várias, com ou sem o
+    namespace da NF-e.
+
+    Args:
+        fonte: Caminho ou arquivo binário aberto
+    """
+    contexto = ET.iterparse(fonte, events=("start", "end"))
+    _, raiz = next(contexto)
+    for evento, elem in contexto:
+        if evento == "end" and _local(elem.tag) == "infNFe":
+            yield _nota_nfe(elem)
+            # Descarta tudo o que já foi lido (inclusive esta nota)
+            raiz.clear()
+
+
+# ----------------------------------------------------------------------
+# Índice
+# ----------------------------------------------------------------------
+
+def _nota_do_cpf(nota: Dict[str, Any], cpf: str) -> bool:
+    """A nota foi emitida para o CPF"""
+    return _digitos((nota.get("destinatario") or {}).get("cpf")) == _digitos(cpf)
+
+
+class IndiceNotasFiscais:
+    """
+    Notas fiscais por número, chave de acesso e CPF do destinatário
+
+    Thread-safe; compartilhado pelo processo via `get_indice_notas()`.
+    """
+
+    def __init__(self, nome: str = "notas_fiscais.indice"):
+        """
+        Args:
+            nome: Nome do índice no registro de métricas (acertos e falhas)
+        """
+        self._por_numero: Dict[str, List[Dict[str, Any]]] = {}
+        self._por_chave: Dict[str, Dict[str, Any]] = {}
+        self._por_cpf: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.stats = get_metrics_registry().cache(nome)
+
+    def adicionar(self, nota: Dict[str, Any]) -> bool:
+        """
+        Indexa uma nota (uma nota já indexada, pela chave de acesso, é ignorada)
+
+        Returns:
+            True se a nota entrou no índice
+        """
+        emitente = (nota.get("emitente") or {}).get("cnpj")
+        chave = nota.get("chave_acesso") or f"{nota.get('numero_nota')}:{nota.get('serie')}:{emitente}"
+        cpf = _digitos((nota.get("destinatario") or {}).get("cpf"))
+
+        with self._lock:
+            if chave in self._por_chave:
+                return False
+            self._por_chave[chave] = nota
+            self._por_numero.setdefault(chave_numero(nota.get("numero_nota")), []).append(nota)
+            if cpf:
+                self._por_cpf.setdefault(cpf, []).append(nota)
+        return True
+
+    def ingerir(self, caminhos: Iterable[str]) -> int:
+        """
+        Ingestão em lote
+
+        Args:
+            caminhos: Arquivos .xml (NF-e, lidos em streaming), .json (formato
+                da nota sintética) ou diretórios com esses arquivos
+
+        Returns:
+            Número de notas novas no índice
+        """
+        novas = 0
+        for caminho in caminhos:
+            if os.path.isdir(caminho):
+                novas += self.ingerir(
+                    os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho))
+                    if nome.lower().endswith((".xml", ".json"))
+                )
+                continue
+            try:
+                if caminho.lower().endswith(".xml"):
+                    novas += sum(self.adicionar(nota) for nota in ler_nfe_xml(caminho))
+                else:
+                    with open(caminho, 'r', encoding='utf-8') as f:
+                        nota = json.load(f)
+                    # JSONs que não são notas (protocolos, regras) ficam de fora
+                    if isinstance(nota, dict) and "numero_nota" in nota:
+                        novas += self.adicionar(nota)
+            except (OSError, ET.ParseError, ValueError) as e:
+                logger.warning(f"⚠️  Nota fiscal ignorada na ingestão ({caminho}): {e}")
+        return novas
+
+    def buscar(self, numero: str, cpf: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Nota pelo número (ou pela chave de acesso de 44 dígitos)
+
+        Com CPF, só valem notas emitidas para ele: a nota de outro cliente
+        com o mesmo número não é resultado. Números de emitentes diferentes
+        podem coincidir; sem CPF (ou ainda ambíguo), não há resultado.
+        """
+        digitos = _digitos(numero)
+        if len(digitos) == 44 and digitos in self._por_chave:
+            candidatas = [self._por_chave[digitos]]
+        else:
+            candidatas = self._por_numero.get(chave_numero(numero), [])
+        if cpf:
+            candidatas = [c for c in candidatas if _nota_do_cpf(c, cpf)]
+        nota = candidatas[0] if len(candidatas) == 1 else None
+
+        if nota is None:
+            self.stats.miss()
+        else:
+            self.stats.hit()
+        return nota
+
+    def por_cpf(self, cpf: str) -> List[Dict[str, Any]]:
+        """Notas emitidas para o CPF, na ordem de ingestão"""
+        return list(self._por_cpf.get(_digitos(cpf), []))
+
+    def __len__(self) -> int:
+        return len(self._por_chave)
+
+
+_indice: Optional[IndiceNotasFiscais] = None
+_indice_lock = threading.Lock()
+
+
+def get_indice_notas() -> IndiceNotasFiscais:
+    """Índice de notas do processo; a ingestão de NOTAS_FISCAIS_DIR acontece no primeiro uso"""
+    global _indice
+
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                indice = IndiceNotasFiscais()
+                diretorio = os.getenv("NOTAS_FISCAIS_DIR", "")
+                if diretorio:
+                    novas = indice.ingerir([diretorio])
+                    logger.info(f"🧾 {novas} notas fiscais indexadas de {diretorio}")
+                _indice = indice
+    return _indice
+
+
+# ----------------------------------------------------------------------
+# Nota do protocolo
+# ----------------------------------------------------------------------
+
+def arquivo_nota_fiscal(protocolo_data: dict) -> str:
+    """Arquivo da nota fiscal anexada ao protocolo (padrão: a nota de exemplo)"""
+    arquivo = "nota_fiscal_exemplo.json"
+    for doc in protocolo_data.get("documentos_anexados") or []:
+        if doc.get("tipo") == "nota_fiscal":
+            arquivo = doc.get("arquivo", arquivo)
+    return arquivo
+
+
+def carregar_nota_fiscal(arquivo_nota: str, numero_nota: Optional[str] = None,
+                         cpf: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Nota fiscal em dict
+
+    Ordem de busca:
+    1. Índice de notas, pelo número informado (sem abrir arquivo)
+    2. NF-e em XML (caminho ou nome em data/synthetic_docs), lida em streaming
+       até a nota do número informado; as notas lidas entram no índice
+    3. JSON; arquivos de exemplo ou inexistentes usam a nota sintética
+
+    Com `numero_nota` e `cpf`, só é aceita a nota com esse número emitida
+    para esse CPF, em qualquer das três fontes.
+
+    Returns:
+        A nota, ou None se não houver nota do número e CPF informados
+    """
+    if numero_nota:
+        nota = get_indice_notas().buscar(numero_nota, cpf)
+        if nota is not None:
+            return nota
+
+    if arquivo_nota.lower().endswith(".xml"):
+        caminho = arquivo_nota if os.path.exists(arquivo_nota) else os.path.join(DOCS_DIR, os.path.basename(arquivo_nota))
+        if os.path.exists(caminho):
+            indice = get_indice_notas()
+            for nota in ler_nfe_xml(caminho):
+                indice.adicionar(nota)
+                if _nota_procurada(nota, numero_nota, cpf):
+                    return nota
+            return None
+
+    if "exemplo" in arquivo_nota.lower() or not os.path.exists(arquivo_nota):
+        arquivo_nota = NOTA_EXEMPLO
+
+    with open(arquivo_nota, 'r', encoding='utf-8') as f:
+        nota = json.load(f)
+    return nota if _nota_procurada(nota, numero_nota, cpf) else None
+
+
+def _nota_procurada(nota: Dict[str, Any], numero_nota: Optional[str], cpf: Optional[str]) -> bool:
+    """A nota tem o número (se informado) e foi emitida para o CPF (se informado)"""
+    if numero_nota and chave_numero(nota.get("numero_nota")) != chave_numero(numero_nota):
+        return False
+    return not cpf or _nota_do_cpf(nota, cpf)
+
+
+def descrever_nota_procurada(numero_nota: Optional[str] = None, cpf: Optional[str] = None) -> str:
+    """Descrição da nota procurada nas mensagens de nota não encontrada"""
+    procurada = f"Nota fiscal {numero_nota}" if numero_nota else "Nota fiscal"
+    if cpf:
+        procurada += f" do CPF {cpf}"
+    return procurada
+
+
+def conferir_itens(nota: Dict[str, Any], itens: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Linha da nota fiscal de cada item do protocolo
+
+    Args:
+        nota: Nota fiscal (formato de `carregar_nota_fiscal`)
+        itens: Itens do protocolo (journey/itens.py)
+
+    Returns:
+        [{"item", "codigo", "linha": dict | None}] na ordem dos itens; linha
+        None quando o produto não consta na nota ou a quantidade já foi usada
+    """
+    linhas: Dict[str, Dict[str, Any]] = {}
+    restantes: Dict[str, int] = {}
+    for produto in nota.get("produtos", []):
+        codigo = produto.get("codigo")
+        linhas.setdefault(codigo, produto)
+        restantes[codigo] = restantes.get(codigo, 0) + int(produto.get("quantidade") or 1)
+
+    conferidos = []
+    for item in itens:
+        codigo = (item.get("produto_original") or {}).get("codigo")
+        linha: Optional[Dict[str, Any]] = None
+        if restantes.get(codigo, 0) > 0:
+            restantes[codigo] -= 1
+            linha = linhas[codigo]
+        conferidos.append({"item": item["item"], "codigo": codigo, "linha": linha})
+    return conferidos
@@ -0,0 +1,214 @@
+"""
+Prazos de troca e triagem vetorizada
+
+CONCEITO - Rule Table:
+A tabela de prazos por categoria e tipo de troca existe uma única vez, no
+nível do módulo. Antes, `_validar_prazo_troca` reconstruía o dict e
+normalizava a categoria com `.replace` encadeados a cada chamada.
+
+CONCEITO - Vectorized Pre-Screen:
+Para lotes (importações, reprocessamentos), a triagem recebe arrays de datas
+de compra, categorias e tipos de troca e calcula dias decorridos, prazo e
+veredito de todos os protocolos numa única passada NumPy (datetime64 e
+códigos inteiros de categoria). Protocolos claramente fora do prazo são
+rejeitados antes de qualquer etapa com LLM.
+
+A triagem é conservadora: usa o maior prazo aplicável (motivo ou tipo de
+troca, e o maior entre as categorias quando a categoria é desconhecida),
+então só rejeita o que o agent de elegibilidade também rejeitaria.
+
+NumPy só é importado pela triagem em lote; a consulta de um prazo é Python puro.
+"""
+
+import unicodedata
+from datetime import date
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Prazo (dias) por categoria normalizada e tipo de troca
+PRAZOS: Dict[str, Dict[str, int]] = {
+    "eletronicos": {"produto_defeituoso": 90, "troca_outro_produto": 30, "vale_compra": 30},
+    "audio": {"produto_defeituoso": 90, "troca_outro_produto": 15, "vale_compra": 15},
+    "informatica": {"produto_defeituoso": 90, "troca_outro_produto": 30, "vale_compra": 30},
+}
+
+# Prazo usado quando a categoria ou o tipo de troca não estão na tabela
+PRAZO_PADRAO = 30
+
+CATEGORIAS: Tuple[str, ...] = tuple(PRAZOS)
+TIPOS_TROCA: Tuple[str, ...] = tuple(sorted({tipo for prazos in PRAZOS.values() for tipo in prazos}))
+
+
+@lru_cache(maxsize=256)
+def normalizar_categoria(categoria: str) -> str:
+    """'Eletrônicos' -> 'eletronicos' (minúsculas, sem acentos nem espaços nas pontas)"""
+    decomposta = unicodedata.normalize("NFKD", categoria or "")
+    return "".join(c for c in decomposta if not unicodedata.combining(c)).strip().lower()
+
+
+def prazo_limite(categoria: str, tipo_troca: str) -> int:
+    """Prazo em dias para a categoria e o tipo de troca"""
+    return PRAZOS.get(normalizar_categoria(categoria), {}).get(tipo_troca, PRAZO_PADRAO)
+
+
+def verificar_prazo(data_compra: str, categoria: str, tipo_troca: str,
+                    hoje: Optional[date] = None) -> Tuple[int, int]:
+    """
+    Dias decorridos desde a compra e prazo aplicável
+
+    Args:
+        data_compra: Data no formato YYYY-MM-DD
+        hoje: Data de referência (padrão: hoje)
+
+    Returns:
+        (dias_decorridos, prazo_limite)
+    """
+    dias = ((hoje or date.today()) - date.fromisoformat(data_compra)).days
+    return dias, prazo_limite(categoria, tipo_troca)
+
+
+def prazo_triagem(categoria: Optional[str], tipo_troca: Optional[str], motivo: Optional[str] = None) -> int:
+    """
+    Maior prazo aplicável ao protocolo (mesma regra da triagem em lote)
+
+    Categoria desconhecida usa o maior prazo entre as categorias; um motivo
+    com prazo próprio (ex: produto_defeituoso) vale se for maior que o do tipo.
+    """
+    normalizada = normalizar_categoria(categoria or "")
+    categorias = [normalizada] if normalizada in PRAZOS else list(CATEGORIAS)
+
+    def _prazo(tipo: Optional[str]) -> int:
+        if tipo not in TIPOS_TROCA:
+            return PRAZO_PADRAO
+        return max(PRAZOS[c].get(tipo, PRAZO_PADRAO) for c in categorias)
+
+    prazo = _prazo(tipo_troca)
+    if motivo in TIPOS_TROCA:
+        prazo = max(prazo, _prazo(motivo))
+    return prazo
+
+
+def campos_triagem(protocolo_data: dict) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """(data_compra, categoria, tipo_troca, motivo) de um protocolo"""
+    original = protocolo_data.get("produto_original") or {}
+    return (
+        original.get("data_compra"),
+        original.get("categoria"),
+        protocolo_data.get("tipo_troca_desejado"),
+        protocolo_data.get("motivo_troca")
+    )
+
+
+# ----------------------------------------------------------------------
+# Triagem em lote
+# ----------------------------------------------------------------------
+
+def _tabela_prazos() -> "np.ndarray":
+    """
+    Matriz categoria x tipo de troca com uma linha e uma coluna extras
+
+    A última linha (categoria desconhecida) usa o maior prazo entre as
+    categorias; a última coluna (tipo desconhecido) usa PRAZO_PADRAO.
+    """
+    import numpy as np
+
+    tabela = np.full((len(CATEGORIAS) + 1, len(TIPOS_TROCA) + 1), PRAZO_PADRAO, dtype=np.int32)
+    for i, categoria in enumerate(CATEGORIAS):
+        for j, tipo in enumerate(TIPOS_TROCA):
+            tabela[i, j] = PRAZOS[categoria].get(tipo, PRAZO_PADRAO)
+    tabela[-1, :-1] = tabela[:-1, :-1].max(axis=0)
+    return tabela
+
+
+def codificar(valores: Iterable[Optional[str]], vocabulario: Sequence[str], normalizar=lambda v: v) -> "np.ndarray":
+    """
+    Converte valores em códigos inteiros (posição no vocabulário, -1 se ausente)
+
+    Normaliza apenas os valores distintos: num lote de 100 mil protocolos há
+    poucas categorias diferentes. Arrays inteiros já são códigos e passam direto.
+    """
+    import numpy as np
+
+    if isinstance(valores, np.ndarray) and valores.dtype.kind in "iu":
+        return valores
+
+    indices = {nome: i for i, nome in enumerate(vocabulario)}
+    distintos, inverso = np.unique(np.asarray([v or "" for v in valores], dtype=str), return_inverse=True)
+    codigos = np.array([indices.get(normalizar(v), -1) for v in distintos], dtype=np.int32)
+    return codigos[inverso.reshape(-1)] if len(distintos) else np.empty(0, dtype=np.int32)
+
+
+def converter_datas(datas_compra: Iterable[Optional[str]]) -> "np.ndarray":
+    """Datas ISO em datetime64[D]; datas ausentes ou inválidas viram NaT"""
+    import numpy as np
+
+    if isinstance(datas_compra, np.ndarray) and datas_compra.dtype.kind == "M":
+        return datas_compra.astype("datetime64[D]")
+
+    valores = [d or "NaT" for d in datas_compra]
+    try:
+        return np.array(valores, dtype="datetime64[D]")
+    except ValueError:
+        convertidas = []
+        for valor in valores:
+            try:
+                convertidas.append(np.datetime64(valor, "D"))
+            except ValueError:
+                convertidas.append(np.datetime64("NaT"))
+        return np.array(convertidas, dtype="datetime64[D]")
+
+
+def triagem_prazos(datas_compra: Iterable[Optional[str]], categorias: Iterable[Optional[str]],
+                   tipos_troca: Iterable[Optional[str]], motivos: Optional[Iterable[Optional[str]]] = None,
+                   hoje: Optional[date] = None, margem_dias: int = 0) -> Dict[str, "np.ndarray"]:
+    """
+    Calcula os vereditos de prazo de um lote numa passada vetorizada
+
+    Aceita tanto listas de strings quanto arrays já convertidos (datetime64
+    e códigos de `codificar`), que pulam a conversão.
+
+    Args:
+        datas_compra: Datas de compra (YYYY-MM-DD ou datetime64)
+        categorias: Categorias dos produtos (None = desconhecida) ou códigos em CATEGORIAS
+        tipos_troca: Tipos de troca desejados ou códigos em TIPOS_TROCA
+        motivos: Motivos da troca; quando o motivo tem prazo próprio (ex:
+            produto_defeituoso), vale o maior entre ele e o do tipo
+        hoje: Data de referência (padrão: hoje)
+        margem_dias: Dias de tolerância antes de considerar expirado
+
+    Returns:
+        {"dias": dias decorridos (-1 sem data), "prazo": prazo aplicável,
+         "expirado": bool (False sem data válida)}
+    """
+    import numpy as np
+
+    tabela = _tabela_prazos()
+    datas = converter_datas(datas_compra)
+    cat = codificar(categorias, CATEGORIAS, normalizar_categoria)
+    tipo = codificar(tipos_troca, TIPOS_TROCA)
+
+    # -1 (desconhecido) aponta para a linha/coluna extra da tabela
+    prazo = tabela[cat, tipo]
+    if motivos is not None:
+        motivo = codificar(motivos, TIPOS_TROCA)
+        prazo = np.where(motivo >= 0, np.maximum(prazo, tabela[cat, motivo]), prazo)
+
+    referencia = np.datetime64(hoje or date.today(), "D")
+    validas = ~np.isnat(datas)
+    dias = np.where(validas, (referencia - datas).astype("timedelta64[D]").astype(np.int64), -1)
+
+    return {
+        "dias": dias,
+        "prazo": prazo,
+        "expirado": validas & (dias > prazo + margem_dias)
+    }
+
+
+def triar_protocolos(protocolos: Sequence[dict], hoje: Optional[date] = None,
+                     margem_dias: int = 0) -> Dict[str, "np.ndarray"]:
+    """Triagem de prazo de uma lista de protocolos (ver `triagem_prazos`)"""
+    datas, categorias, tipos, motivos = zip(*map(campos_triagem, protocolos)) if protocolos else ((), (), (), ())
+    return triagem_prazos(datas, categorias, tipos, motivos, hoje=hoje, margem_dias=margem_dias)
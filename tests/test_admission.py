@@ -0,0 +1,101 @@
+"""
+Validação em lote (validar_lote) com o mesmo resultado da validação escalar
+"""
+
+import copy
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+
+from journey.admission import validar_lote, validar_protocolo
+
+VALIDO = {
+    "protocolo": "TRC-2024-0001",
+    "cliente": {"cpf": "123.456.789-09", "nome": "Maria Silva", "email": "maria@example.com"},
+    "produto_original": {"codigo": "PROD-001", "data_compra": "2024-01-15", "valor_pago": 199.9},
+    "motivo_troca": "defeito",
+    "tipo_troca_desejado": "mesmo_produto",
+}
+
+_REMOVER = object()
+
+
+def _com(caminho: str, valor):
+    protocolo = copy.deepcopy(VALIDO)
+    *pais, campo = caminho.split(".")
+    alvo = protocolo
+    for pai in pais:
+        alvo = alvo[pai]
+    if valor is _REMOVER:
+        del alvo[campo]
+    else:
+        alvo[campo] = valor
+    return protocolo
+
+
+FIXTURES = [
+    VALIDO,
+    _com("cliente.cpf", "12345678900"),
+    _com("cliente.cpf", "111.111.111-11"),
+    _com("cliente.cpf", 12345678909),
+    _com("cliente.cpf", "123abc456.789-09"),
+    _com("cliente.nome", "  ab "),
+    _com("cliente.nome", "ab"),
+    _com("cliente.email", "maria@"),
+    _com("produto_original.codigo", ""),
+    _com("produto_original.codigo", 123),
+    _com("produto_original.valor_pago", -5),
+    _com("produto_original.valor_pago", "caro"),
+    _com("produto_original.valor_pago", None),
+    _com("produto_original.data_compra", "2024-13-40"),
+    _com("produto_original.data_compra", "2024-01-15T10:30:00"),
+    _com("produto_original.data_compra", (date.today() + timedelta(days=3)).isoformat()),
+    _com("produto_original.data_compra", _REMOVER),
+    _com("motivo_troca", ""),
+    _com("cliente", "não é objeto"),
+    {"protocolo": "TRC-2024-0002"},
+    # Vários erros: CPF e data no futuro junto com erro do schema
+    _com("cliente.cpf", "12345678900") | {"motivo_troca": ""},
+    _com("cliente.cpf", "12345678900") | {"produto_original": {"codigo": "P", "data_compra": "2999-01-01"}},
+    {
+        **VALIDO,
+        "itens": [
+            {"produto_original": VALIDO["produto_original"]},
+            {"produto_original": {"codigo": "", "data_compra": "2024-01-15"}},
+        ],
+    },
+]
+
+
+def test_lote_e_escalar_concordam():
+    lote = validar_lote(FIXTURES)
+
+    for i, protocolo in enumerate(FIXTURES):
+        escalar = validar_protocolo(protocolo)
+        assert lote["valido"][i] == (escalar is None), protocolo
+        if escalar is None:
+            assert lote["motivo"][i] == "" and lote["erros"][i] == []
+        else:
+            assert lote["erros"][i] == escalar["erros"], protocolo
+            assert lote["motivo"][i] == escalar["motivo"]
+            assert (lote["campo"][i], lote["erro"][i]) == (escalar["erros"][0]["campo"], escalar["erros"][0]["erro"])
+
+
+@pytest.mark.parametrize("caminho,valor", [
+    ("produto_original.valor_pago", -5),
+    ("produto_original.valor_pago", "caro"),
+    ("cliente.cpf", 12345678909),
+    ("produto_original.codigo", 123),
+    ("produto_original.data_compra", "2024-01-15T10:30:00"),
+])
+def test_lote_reprova_o_que_o_schema_reprova(caminho, valor):
+    assert not validar_lote([_com(caminho, valor)])["valido"][0]
+
+
+def test_lote_vazio():
+    lote = validar_lote([])
+    assert len(lote["valido"]) == 0 and lote["erros"] == []
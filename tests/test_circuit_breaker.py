@@ -0,0 +1,56 @@
+"""
+Circuit breaker: só falhas do provedor abrem o circuito
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+
+from llm.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class ErroProvedor(Exception):
+    status_code = 503
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+def _falhar(breaker: CircuitBreaker, erro: Exception):
+    def chamada():
+        raise erro
+
+    with pytest.raises(type(erro)):
+        breaker.call(chamada)
+
+
+def test_erros_que_nao_sao_do_provedor_nao_abrem_o_circuito():
+    breaker = CircuitBreaker(min_requests=2, clock=Relogio())
+    for _ in range(5):
+        _falhar(breaker, ValueError("resposta fora do formato"))
+    assert breaker.state == CLOSED
+
+    for _ in range(2):
+        _falhar(breaker, ErroProvedor("503"))
+    assert breaker.state == OPEN
+
+
+def test_erro_que_nao_e_do_provedor_devolve_a_vaga_de_teste():
+    relogio = Relogio()
+    breaker = CircuitBreaker(min_requests=1, open_seconds=1, clock=relogio)
+    _falhar(breaker, ErroProvedor("503"))
+    relogio.agora = 2
+
+    _falhar(breaker, ValueError("bug no parser"))
+    assert breaker.state == HALF_OPEN
+
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
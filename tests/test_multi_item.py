@@ -0,0 +1,109 @@
+"""
+Chamada em lote de um agent com vários itens e o corte antecipado da geração
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from langchain.agents import AgentExecutor, create_react_agent
+from langchain.prompts import PromptTemplate
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+
+from agents.multi_item import dividir_por_item, invocar_por_item
+from llm.early_stop import StructuredAnswerDetector, blocos_esperados
+from llm.guarded_chat_model import GuardedChatModel
+
+RESPOSTA = """Thought: Avaliei os dois itens.
+Final Answer:
+ITEM: 1
+---
+STATUS: APROVADO
+PODE_PROSSEGUIR: SIM
+---
+ITEM: 2
+---
+STATUS: REPROVADO
+PODE_PROSSEGUIR: NAO
+---
+Texto excedente que o corte antecipado descarta.
+"""
+
+PROMPT = PromptTemplate.from_template(
+    "Ferramentas:\n{tools}\n{tool_names}\n\nEntrada: {input}\n{agent_scratchpad}"
+)
+
+
+@tool
+def consultar(texto: str) -> str:
+    """Ferramenta sem uso no teste"""
+    return texto
+
+
+def _modelo(detector: StructuredAnswerDetector) -> GuardedChatModel:
+    # GenericFakeChatModel gera em streaming, um pedaço por palavra/espaço
+    fake = GenericFakeChatModel(messages=iter([AIMessage(content=RESPOSTA)]))
+    return GuardedChatModel(inner=fake, early_stop=detector, agent_name="Teste")
+
+
+def test_detector_corta_apos_o_ultimo_bloco():
+    detector = StructuredAnswerDetector(required_keys=("STATUS", "PODE_PROSSEGUIR"))
+
+    um_bloco = RESPOSTA[:detector.cut_position(RESPOSTA)]
+    assert "ITEM: 2" not in um_bloco
+
+    dois_blocos = RESPOSTA[:detector.cut_position(RESPOSTA, blocos=2)]
+    assert dois_blocos.rstrip().endswith("PODE_PROSSEGUIR: NAO\n---")
+    assert "excedente" not in dois_blocos
+
+
+def test_detector_por_chaves_espera_todos_os_blocos():
+    detector = StructuredAnswerDetector(required_keys=("STATUS",))
+    parcial = "Final Answer:\nITEM: 1\nSTATUS: APROVADO\nITEM: 2\n"
+    assert detector.cut_position(parcial) is not None
+    assert detector.cut_position(parcial, blocos=2) is None
+    assert detector.cut_position(parcial + "STATUS: REPROVADO\n", blocos=2) is not None
+
+
+def test_perfil_de_estoque_nao_corta_antes_das_observacoes():
+    from llm.factory import AGENT_LLM_PROFILES
+
+    detector = StructuredAnswerDetector(required_keys=AGENT_LLM_PROFILES["InventoryValidator"]["required_keys"])
+    resposta = (
+        "Final Answer:\n---\nSTATUS: INDISPONIVEL\nPRODUTO_CODIGO: PROD-999\nRESERVA_ID: N/A\n"
+        "MOTIVO: Produto não encontrado\nPODE_PROSSEGUIR: NAO\n"
+    )
+    assert detector.cut_position(resposta) is None
+
+    completa = resposta + "OBSERVACOES: Sugerir vale compra\n"
+    assert completa[:detector.cut_position(completa)].endswith("OBSERVACOES: Sugerir vale compra\n")
+
+
+def test_streaming_em_lote_mantem_todos_os_itens():
+    modelo = _modelo(StructuredAnswerDetector())
+    with blocos_esperados(2):
+        resultado = modelo.invoke([HumanMessage(content="avaliar")])
+
+    blocos = dividir_por_item(str(resultado.content))
+    assert set(blocos) == {1, 2}
+    assert "REPROVADO" in blocos[2]
+    assert "excedente" not in str(resultado.content)
+
+
+def test_invocar_por_item_recebe_um_bloco_por_item():
+    modelo = _modelo(StructuredAnswerDetector(required_keys=("STATUS", "PODE_PROSSEGUIR")))
+    executor = AgentExecutor(
+        agent=create_react_agent(modelo, [consultar], PROMPT),
+        tools=[consultar],
+        handle_parsing_errors=True,
+        max_iterations=2,
+        early_stopping_method="force"
+    )
+
+    _, blocos = invocar_por_item(executor, "dois itens", [1, 2], max_iterations=4)
+
+    assert "APROVADO" in blocos[1]
+    assert "PODE_PROSSEGUIR: NAO" in blocos[2]
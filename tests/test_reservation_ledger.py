@@ -0,0 +1,150 @@
+"""
+Livro de reservas: recuperação, registro parcial, group commit, snapshot e expiração
+"""
+
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+
+from mocks.reservation_ledger import SNAPSHOT_FILE, LedgerLockedError, ReservationLedger
+
+
+def _reserva(reserva_id: str, quantidade: int = 1, expira_em: datetime = None) -> dict:
+    return {
+        "op": "reservar",
+        "reserva": {
+            "id": reserva_id,
+            "codigo_produto": "PROD-001",
+            "quantidade": quantidade,
+            "centro_distribuicao": "CD-SP",
+            "protocolo": "TRC-1",
+            "status": "ativa",
+            "expira_em": (expira_em or datetime.now() + timedelta(hours=48)).isoformat(),
+        },
+    }
+
+
+def _gravar(livro: ReservationLedger, *registros: dict):
+    seq = None
+    for registro in registros:
+        seq = livro.registrar(registro)
+    livro.aguardar(seq)
+
+
+def _reabrir(livro: ReservationLedger, **kwargs) -> ReservationLedger:
+    livro.close()
+    novo = ReservationLedger(livro.directory, fsync=False, **kwargs)
+    novo.recuperar()
+    return novo
+
+
+def test_recupera_reservas_e_cancelamentos(tmp_path):
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    _gravar(livro, _reserva("RES-1", 2), _reserva("RES-2", 3), {"op": "cancelar", "id": "RES-1"})
+
+    livro = _reabrir(livro)
+    assert livro.reservas["RES-1"]["status"] == "cancelada"
+    assert livro.reservas["RES-2"]["status"] == "ativa"
+    assert livro.reservado[("PROD-001", "CD-SP")] == 3
+    livro.close()
+
+
+def test_registro_parcial_e_descartado(tmp_path):
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    _gravar(livro, _reserva("RES-1"), _reserva("RES-2"))
+    segmento = livro._segment_path(1)
+    livro.close()
+
+    # Queda no meio da gravação do terceiro registro
+    with open(segmento, "a", encoding="utf-8") as f:
+        f.write('{"seq": 3, "op": "reservar", "reserva": {"id": "RES-')
+    tamanho_valido = os.path.getsize(segmento) - len('{"seq": 3, "op": "reservar", "reserva": {"id": "RES-')
+
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    livro.recuperar()
+    assert set(livro.reservas) == {"RES-1", "RES-2"}
+    assert os.path.getsize(segmento) == tamanho_valido
+
+    # O próximo registro continua a sequência sem o parcial
+    _gravar(livro, _reserva("RES-3"))
+    livro = _reabrir(livro)
+    assert set(livro.reservas) == {"RES-1", "RES-2", "RES-3"}
+    livro.close()
+
+
+def test_group_commit_divide_o_fsync(tmp_path):
+    livro = ReservationLedger(str(tmp_path), fsync=True)
+    barreira = threading.Barrier(16)
+
+    def reservar(n: int):
+        barreira.wait()
+        for i in range(10):
+            livro.aguardar(livro.registrar(_reserva(f"RES-{n}-{i}")))
+
+    threads = [threading.Thread(target=reservar, args=(n,)) for n in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert livro.num_fsyncs < 160
+    livro = _reabrir(livro)
+    assert len(livro.reservas) == 160
+    assert livro.reservado[("PROD-001", "CD-SP")] == 160
+    livro.close()
+
+
+def test_snapshot_so_com_reservas_ativas(tmp_path):
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    _gravar(livro, _reserva("RES-1"), _reserva("RES-2"), {"op": "cancelar", "id": "RES-1"})
+    livro.snapshot()
+
+    with open(tmp_path / SNAPSHOT_FILE, encoding="utf-8") as f:
+        assert set(json.load(f)["reservas"]) == {"RES-2"}
+
+    _gravar(livro, _reserva("RES-3"))
+    livro = _reabrir(livro)
+    assert set(livro.reservas) == {"RES-2", "RES-3"}
+    assert livro.reservado[("PROD-001", "CD-SP")] == 2
+    livro.close()
+
+
+def test_reservas_vencidas_expiram(tmp_path):
+    agora = datetime.now()
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    _gravar(livro, _reserva("RES-1", 2, agora + timedelta(hours=1)), _reserva("RES-2", 3, agora + timedelta(hours=72)))
+
+    assert not livro.ha_vencidas(agora)
+    assert livro.expirar(agora) == []
+
+    depois = agora + timedelta(hours=2)
+    assert livro.ha_vencidas(depois)
+    assert [r["id"] for r in livro.expirar(depois)] == ["RES-1"]
+    assert livro.reservas["RES-1"]["status"] == "expirada"
+    assert livro.reservado[("PROD-001", "CD-SP")] == 3
+    assert not livro.ha_vencidas(depois)
+    livro.close()
+
+
+def test_recuperacao_expira_as_vencidas(tmp_path):
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    _gravar(livro, _reserva("RES-1", 2, datetime.now() - timedelta(minutes=1)), _reserva("RES-2", 3))
+
+    livro = _reabrir(livro)
+    assert livro.ha_vencidas()
+    assert [r["id"] for r in livro.expirar()] == ["RES-1"]
+    assert livro.reservado[("PROD-001", "CD-SP")] == 3
+    livro.close()
+
+
+def test_diretorio_travado(tmp_path):
+    livro = ReservationLedger(str(tmp_path), fsync=False)
+    with pytest.raises(LedgerLockedError):
+        ReservationLedger(str(tmp_path), fsync=False)
+    livro.close()